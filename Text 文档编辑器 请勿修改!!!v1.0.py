@@ -1,1098 +1,5803 @@
-import sys
-import os
-import json
-import platform
-import base64
-import re
-import imghdr
-from urllib.parse import unquote, urlparse
-from functools import partial
-
-from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QTextEdit, QAction, QFileDialog, QToolBar,
-    QFontComboBox, QComboBox, QSpinBox, QWidget, QHBoxLayout, QVBoxLayout,
-    QPushButton, QLabel, QListWidget, QLineEdit, QMessageBox, QListWidgetItem,
-    QInputDialog, QColorDialog
-)
-from PyQt5.QtGui import (
-    QIcon, QFont, QTextCharFormat, QTextCursor, QTextBlockFormat,
-    QTextImageFormat, QImage, QTextTableFormat, QColor, QBrush
-)
-from PyQt5.QtCore import Qt, QSize
-
-# ---------------------------
-# Combo popup & menu QSS (hover/selected styles)
-# ---------------------------
-COMBO_POPUP_QSS = """
-QListView {
-  background-color: #FFFFFF;
-  outline: 0;
-}
-QListView::item {
-  height: 28px;
-  padding: 4px 10px;
-  color: #213447;
-}
-QListView::item:selected, QListView::item:hover {
-  background-color: #2E8BFF;
-  color: #FFFFFF;
-}
-"""
-
-GLOBAL_QSS_MENU = """
-QMenu {
-  background-color: #FFFFFF;
-  border: 1px solid #cfe8fb;
-}
-QMenu::item {
-  padding: 6px 24px;
-  color: #213447;
-}
-QMenu::item:selected {
-  background-color: #2E8BFF;
-  color: #FFFFFF;
-}
-QComboBox QAbstractItemView {
-  background-color: #FFFFFF;
-  selection-background-color: #2E8BFF;
-  selection-color: #FFFFFF;
-}
-"""
-
-# ---------------------------
-# Translations (expanded)
-# ---------------------------
-TRANSLATIONS = {
-    "en-US": {
-        "app_title": "Text Editor",
-        "menu_file": "File",
-        "menu_edit": "Edit",
-        "menu_insert": "Insert",
-        "new": "New",
-        "open": "Open",
-        "save": "Save",
-        "save_as": "Save As",
-        "exit": "Exit",
-        "bold": "Bold",
-        "italic": "Italic",
-        "underline": "Underline",
-        "align_left": "Align Left",
-        "align_center": "Align Center",
-        "align_right": "Align Right",
-        "search": "Search .voc",
-        "desktop_search": "Desktop",
-        "filename_prompt": "Filename (without extension):",
-        "saved": "Saved.",
-        "open_error": "Failed to open file.",
-        "not_windows": "Not running on Windows. Desktop save will instead use your home directory.",
-        "no_file_selected": "No file selected.",
-        "confirm_clear": "Clear editor? Unsaved changes will be lost.",
-        "insert_image": "Insert Image",
-        "insert_table": "Insert Table",
-        "style": "Style",
-        "undo": "Undo",
-        "redo": "Redo",
-        "style_label": "Style:",
-        "style_normal": "Normal",
-        "style_title": "Title",
-        "style_subtitle": "Subtitle",
-        "style_subtitle2": "Subtitle 2",
-        "style_h1": "Heading 1",
-        "style_h2": "Heading 2",
-        "style_quote": "Quote",
-        "style_code": "Code",
-        "style_mono": "Monospace",
-        "style_small": "Small",
-        "style_large": "Large",
-        "style_emphasis": "Emphasis",
-        "rows_label": "Rows:",
-        "cols_label": "Columns:",
-        "insert_image_error": "Cannot load image:",
-        "table_title": "Insert Table",
-        "text_color": "Text Color",
-        "bg_color": "Highlight Color"
-    },
-    "en-GB": {
-        "app_title": "Text Editor",
-        "menu_file": "File",
-        "menu_edit": "Edit",
-        "menu_insert": "Insert",
-        "new": "New",
-        "open": "Open",
-        "save": "Save",
-        "save_as": "Save As",
-        "exit": "Exit",
-        "bold": "Bold",
-        "italic": "Italic",
-        "underline": "Underline",
-        "align_left": "Align Left",
-        "align_center": "Align Centre",
-        "align_right": "Align Right",
-        "search": "Search .voc",
-        "desktop_search": "Desktop",
-        "filename_prompt": "Filename (without extension):",
-        "saved": "Saved.",
-        "open_error": "Failed to open file.",
-        "not_windows": "Not running on Windows. Desktop save will instead use your home directory.",
-        "no_file_selected": "No file selected.",
-        "confirm_clear": "Clear editor? Unsaved changes will be lost.",
-        "insert_image": "Insert Image",
-        "insert_table": "Insert Table",
-        "style": "Style",
-        "undo": "Undo",
-        "redo": "Redo",
-        "style_label": "Style:",
-        "style_normal": "Normal",
-        "style_title": "Title",
-        "style_subtitle": "Subtitle",
-        "style_subtitle2": "Subtitle 2",
-        "style_h1": "Heading 1",
-        "style_h2": "Heading 2",
-        "style_quote": "Quote",
-        "style_code": "Code",
-        "style_mono": "Monospace",
-        "style_small": "Small",
-        "style_large": "Large",
-        "style_emphasis": "Emphasis",
-        "rows_label": "Rows:",
-        "cols_label": "Columns:",
-        "insert_image_error": "Cannot load image:",
-        "table_title": "Insert Table",
-        "text_color": "Text Color",
-        "bg_color": "Highlight Color"
-    },
-    "zh-CN": {
-        "app_title": "Text 文档编辑器",
-        "menu_file": "文件",
-        "menu_edit": "编辑",
-        "menu_insert": "插入",
-        "new": "新建",
-        "open": "打开",
-        "save": "保存",
-        "save_as": "另存为",
-        "exit": "退出",
-        "bold": "加粗",
-        "italic": "斜体",
-        "underline": "下划线",
-        "align_left": "左对齐",
-        "align_center": "居中",
-        "align_right": "右对齐",
-        "search": "查找 .voc",
-        "desktop_search": "桌面",
-        "filename_prompt": "文件名（不含扩展名）：",
-        "saved": "已保存。",
-        "open_error": "打开文件失败。",
-        "not_windows": "非 Windows 系统，保存目录将使用用户主目录。",
-        "no_file_selected": "未选择文件。",
-        "confirm_clear": "清空编辑区？未保存的更改将丢失。",
-        "insert_image": "插入图片",
-        "insert_table": "插入表格",
-        "style": "样式",
-        "undo": "撤销",
-        "redo": "重做",
-        "style_label": "样式：",
-        "style_normal": "正文",
-        "style_title": "标题",
-        "style_subtitle": "副标题",
-        "style_subtitle2": "副标题2",
-        "style_h1": "标题 1",
-        "style_h2": "标题 2",
-        "style_quote": "引用",
-        "style_code": "代码",
-        "style_mono": "等宽",
-        "style_small": "小号",
-        "style_large": "大号",
-        "style_emphasis": "强调",
-        "rows_label": "行数：",
-        "cols_label": "列数：",
-        "insert_image_error": "无法加载图片：",
-        "table_title": "插入表格",
-        "text_color": "文字颜色",
-        "bg_color": "背景颜色"
-    },
-    "zh-TW": {
-        "app_title": "Text 文件編輯器",
-        "menu_file": "文件",
-        "menu_edit": "編輯",
-        "menu_insert": "插入",
-        "new": "新建",
-        "open": "打開",
-        "save": "保存",
-        "save_as": "另存為",
-        "exit": "退出",
-        "bold": "加粗",
-        "italic": "斜體",
-        "underline": "底線",
-        "align_left": "靠左",
-        "align_center": "置中",
-        "align_right": "靠右",
-        "search": "查找 .voc",
-        "desktop_search": "桌面",
-        "filename_prompt": "檔名（不含副檔名）：",
-        "saved": "已保存。",
-        "open_error": "打開檔案失敗。",
-        "not_windows": "非 Windows 系統，保存目錄將使用使用者主目錄。",
-        "no_file_selected": "未選擇檔案。",
-        "confirm_clear": "清空編輯區？未保存的更改將遺失。",
-        "insert_image": "插入圖片",
-        "insert_table": "插入表格",
-        "style": "樣式",
-        "undo": "復原",
-        "redo": "重做",
-        "style_label": "樣式：",
-        "style_normal": "正文",
-        "style_title": "標題",
-        "style_subtitle": "副標題",
-        "style_subtitle2": "副標題2",
-        "style_h1": "標題 1",
-        "style_h2": "標題 2",
-        "style_quote": "引用",
-        "style_code": "程式碼",
-        "style_mono": "等寬",
-        "style_small": "小號",
-        "style_large": "大號",
-        "style_emphasis": "強調",
-        "rows_label": "行數：",
-        "cols_label": "列數：",
-        "insert_image_error": "無法載入圖片：",
-        "table_title": "插入表格",
-        "text_color": "文字顏色",
-        "bg_color": "背景顏色"
-    },
-    "ja-JP": {
-        "app_title": "Text エディタ",
-        "menu_file": "ファイル",
-        "menu_edit": "編集",
-        "menu_insert": "挿入",
-        "new": "新規",
-        "open": "開く",
-        "save": "保存",
-        "save_as": "名前を付けて保存",
-        "exit": "終了",
-        "bold": "太字",
-        "italic": "斜体",
-        "underline": "下線",
-        "align_left": "左揃え",
-        "align_center": "中央揃え",
-        "align_right": "右揃え",
-        "search": ".voc を検索",
-        "desktop_search": "デスクトップ",
-        "filename_prompt": "ファイル名（拡張子なし）：",
-        "saved": "保存しました。",
-        "open_error": "ファイルを開けませんでした。",
-        "not_windows": "Windows ではありません。保存先はホームディレクトリになります。",
-        "no_file_selected": "ファイルが選択されていません。",
-        "confirm_clear": "エディタをクリアしますか？未保存の変更は失われます。",
-        "insert_image": "画像を挿入",
-        "insert_table": "表を挿入",
-        "style": "スタイル",
-        "undo": "元に戻す",
-        "redo": "やり直し",
-        "style_label": "スタイル：",
-        "style_normal": "標準",
-        "style_title": "タイトル",
-        "style_subtitle": "サブタイトル",
-        "style_subtitle2": "サブタイトル2",
-        "style_h1": "見出し 1",
-        "style_h2": "見出し 2",
-        "style_quote": "引用",
-        "style_code": "コード",
-        "style_mono": "等幅",
-        "style_small": "小",
-        "style_large": "大",
-        "style_emphasis": "強調",
-        "rows_label": "行：",
-        "cols_label": "列：",
-        "insert_image_error": "画像を読み込めません：",
-        "table_title": "表を挿入",
-        "text_color": "文字色",
-        "bg_color": "背景色"
-    },
-    "es-ES": {
-        "app_title": "Editor Text",
-        "menu_file": "Archivo",
-        "menu_edit": "Editar",
-        "menu_insert": "Insertar",
-        "new": "Nuevo",
-        "open": "Abrir",
-        "save": "Guardar",
-        "save_as": "Guardar como",
-        "exit": "Salir",
-        "bold": "Negrita",
-        "italic": "Cursiva",
-        "underline": "Subrayado",
-        "align_left": "Alinear a la izquierda",
-        "align_center": "Centrar",
-        "align_right": "Alinear a la derecha",
-        "search": "Buscar .voc",
-        "desktop_search": "Escritorio",
-        "filename_prompt": "Nombre de archivo (sin extensión):",
-        "saved": "Guardado.",
-        "open_error": "Error al abrir el archivo.",
-        "not_windows": "No está en Windows. El guardado usará el directorio del usuario.",
-        "no_file_selected": "Ningún archivo seleccionado.",
-        "confirm_clear": "¿Borrar editor? Los cambios no guardados se perderán.",
-        "insert_image": "Insertar imagen",
-        "insert_table": "Insertar tabla",
-        "style": "Estilo",
-        "undo": "Deshacer",
-        "redo": "Rehacer",
-        "style_label": "Estilo:",
-        "style_normal": "Normal",
-        "style_title": "Título",
-        "style_subtitle": "Subtítulo",
-        "style_subtitle2": "Subtítulo2",
-        "style_h1": "Encabezado 1",
-        "style_h2": "Encabezado 2",
-        "style_quote": "Cita",
-        "style_code": "Código",
-        "style_mono": "Monospace",
-        "style_small": "Pequeño",
-        "style_large": "Grande",
-        "style_emphasis": "Énfasis",
-        "rows_label": "Filas:",
-        "cols_label": "Columnas:",
-        "insert_image_error": "No se puede cargar la imagen:",
-        "table_title": "Insertar tabla",
-        "text_color": "Color de texto",
-        "bg_color": "Color de fondo"
-    }
-}
-
-LANG_CHOICES = [
-    ("English (US)", "en-US"),
-    ("English (UK)", "en-GB"),
-    ("简体中文", "zh-CN"),
-    ("繁體中文", "zh-TW"),
-    ("日本語", "ja-JP"),
-    ("Español", "es-ES"),
-]
-def get_desktop_path():
-    if platform.system() == "Windows":
-        return os.path.join(os.path.expanduser("~"), "Desktop")
-    else:
-        return os.path.expanduser("~")
-
-
-def ensure_extension(filename):
-    if not filename.lower().endswith(".voc"):
-        return filename + ".voc"
-    return filename
-
-
-def _detect_image_mime(path):
-    t = imghdr.what(path)
-    if t:
-        if t == 'jpeg':
-            return 'image/jpeg'
-        return f'image/{t}'
-    ext = os.path.splitext(path)[1].lower()
-    if ext in ('.jpg', '.jpeg'):
-        return 'image/jpeg'
-    if ext == '.png':
-        return 'image/png'
-    if ext == '.gif':
-        return 'image/gif'
-    return 'application/octet-stream'
-
-
-def _encode_file_to_data_uri(path):
-    try:
-        with open(path, 'rb') as f:
-            data = f.read()
-        b64 = base64.b64encode(data).decode('ascii')
-        mime = _detect_image_mime(path)
-        return f"data:{mime};base64,{b64}"
-    except Exception:
-        return None
-
-
-def _replace_file_src_with_data_uris(html):
-    """
-    Replace file:// image src with data URIs
-    """
-    pattern = re.compile(r'src=(["\'])(file:///?[^"\']+)\1', re.IGNORECASE)
-
-    def repl(m):
-        quote = m.group(1)
-        file_url = m.group(2)
-        parsed = urlparse(file_url)
-        path = parsed.path
-        if platform.system() == "Windows" and re.match(r'^/[a-zA-Z]:', path):
-            path = path.lstrip('/')
-        path = unquote(path)
-        if os.path.exists(path):
-            data_uri = _encode_file_to_data_uri(path)
-            if data_uri:
-                return f'src={quote}{data_uri}{quote}'
-        return m.group(0)
-
-    return pattern.sub(repl, html)
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.current_filepath = None
-        self.lang = "en-US"
-        self.trans = TRANSLATIONS[self.lang]
-
-        self.setWindowTitle(self.trans["app_title"])
-        self.resize(1200, 780)
-
-        central = QWidget()
-        central_layout = QVBoxLayout()
-        central.setLayout(central_layout)
-        self.setCentralWidget(central)
-
-        # Toolbar
-        self.toolbar = QToolBar("Formatting")
-        self.toolbar.setIconSize(QSize(18, 18))
-        self.toolbar.setStyleSheet("background: #FFFFFF; border-bottom: 1px solid #cfe8fb;")
-        self.addToolBar(self.toolbar)
-
-        # Editor
-        self.editor = QTextEdit()
-        self.editor.setStyleSheet("background: #E7F0FA; padding: 10px;")
-        self.editor.setAcceptRichText(True)
-        central_layout.addWidget(self.editor)
-
-        # Bottom: search and file list
-        bottom_widget = QWidget()
-        bottom_layout = QHBoxLayout()
-        bottom_widget.setLayout(bottom_layout)
-        central_layout.addWidget(bottom_widget, stretch=0)
-
-        self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText(self.trans["search"])
-        bottom_layout.addWidget(self.search_input)
-
-        self.search_btn = QPushButton(self.trans["search"])
-        self.search_btn.clicked.connect(self.search_voc_files)
-        bottom_layout.addWidget(self.search_btn)
-
-        self.search_dir_combo = QComboBox()
-        self.search_dir_combo.addItem(self.trans["desktop_search"], get_desktop_path())
-        self.search_dir_combo.addItem("Home", os.path.expanduser("~"))
-        bottom_layout.addWidget(self.search_dir_combo)
-
-        self.files_list = QListWidget()
-        self.files_list.setMaximumHeight(160)
-        self.files_list.itemDoubleClicked.connect(self.open_voc_from_list)
-        central_layout.addWidget(self.files_list)
-
-        # Build actions and UI
-        self._create_actions()
-        self._create_format_toolbar()
-        self._create_menus()
-        self.retranslate_ui()
-
-    # ---------------------------
-    # Actions
-    # ---------------------------
-    def _create_actions(self):
-        # File actions
-        self.act_new = QAction("", self)
-        self.act_new.setShortcut("Ctrl+N")
-        self.act_new.triggered.connect(self.action_new)
-
-        self.act_open = QAction("", self)
-        self.act_open.setShortcut("Ctrl+O")
-        self.act_open.triggered.connect(self.action_open)
-
-        self.act_save = QAction("", self)
-        self.act_save.setShortcut("Ctrl+S")
-        self.act_save.triggered.connect(self.action_save)
-
-        self.act_save_as = QAction("", self)
-        self.act_save_as.triggered.connect(self.action_save_as)
-
-        self.act_exit = QAction("", self)
-        self.act_exit.triggered.connect(self.close)
-
-        # Formatting actions
-        self.act_bold = QAction("B", self)
-        self.act_bold.setCheckable(True)
-        self.act_bold.setShortcut("Ctrl+B")
-        self.act_bold.triggered.connect(self.toggle_bold)
-
-        self.act_italic = QAction("I", self)
-        self.act_italic.setCheckable(True)
-        self.act_italic.setShortcut("Ctrl+I")
-        self.act_italic.triggered.connect(self.toggle_italic)
-
-        self.act_underline = QAction("U", self)
-        self.act_underline.setCheckable(True)
-        self.act_underline.setShortcut("Ctrl+U")
-        self.act_underline.triggered.connect(self.toggle_underline)
-
-        self.act_align_left = QAction("L", self)
-        self.act_align_left.triggered.connect(partial(self.set_alignment, Qt.AlignLeft))
-
-        self.act_align_center = QAction("C", self)
-        self.act_align_center.setShortcut("Ctrl+E")
-        self.act_align_center.triggered.connect(partial(self.set_alignment, Qt.AlignCenter))
-
-        self.act_align_right = QAction("R", self)
-        self.act_align_right.triggered.connect(partial(self.set_alignment, Qt.AlignRight))
-
-        # Undo/Redo
-        self.act_undo = QAction("", self)
-        self.act_undo.setShortcut("Ctrl+Z")
-        self.act_undo.triggered.connect(self.editor.undo)
-
-        self.act_redo = QAction("", self)
-        self.act_redo.setShortcut("Ctrl+Y")
-        self.act_redo.triggered.connect(self.editor.redo)
-
-        # Insert image / table
-        self.act_insert_image = QAction("", self)
-        self.act_insert_image.triggered.connect(self.insert_image)
-
-        self.act_insert_table = QAction("", self)
-        self.act_insert_table.triggered.connect(self.insert_table)
-
-        # Styles
-        self.style_label = QLabel(self.trans.get("style_label", "Style:"))
-        self.style_combo = QComboBox()
-        self.style_combo.currentIndexChanged.connect(self.apply_style_from_combo)
-
-        # Color actions (use buttons)
-        self.text_color_btn = QPushButton("A")
-        self.text_color_btn.setToolTip(self.trans.get("text_color", "Text Color"))
-        self.text_color_btn.clicked.connect(self.choose_text_color)
-        self.text_color_btn.setFixedWidth(32)
-        self.text_color_btn.setStyleSheet("font-weight: bold;")
-
-        self.bg_color_btn = QPushButton("▯")
-        self.bg_color_btn.setToolTip(self.trans.get("bg_color", "Highlight Color"))
-        self.bg_color_btn.clicked.connect(self.choose_bg_color)
-        self.bg_color_btn.setFixedWidth(32)
-
-    def _create_format_toolbar(self):
-        # Font family
-        self.font_combo = QFontComboBox()
-        self.font_combo.currentFontChanged.connect(self.set_font_family)
-        self.toolbar.addWidget(self.font_combo)
-        try:
-            self.font_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-
-        # Font size
-        self.font_size = QSpinBox()
-        self.font_size.setRange(6, 96)
-        self.font_size.setValue(12)
-        self.font_size.valueChanged.connect(self.set_font_size)
-        self.toolbar.addWidget(self.font_size)
-
-        # Format buttons
-        self.toolbar.addAction(self.act_bold)
-        self.toolbar.addAction(self.act_italic)
-        self.toolbar.addAction(self.act_underline)
-
-        self.toolbar.addSeparator()
-        self.toolbar.addAction(self.act_align_left)
-        self.toolbar.addAction(self.act_align_center)
-        self.toolbar.addAction(self.act_align_right)
-
-        self.toolbar.addSeparator()
-        # Style label and combo
-        self.toolbar.addWidget(self.style_label)
-        self.toolbar.addWidget(self.style_combo)
-        try:
-            self.style_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-
-        self.toolbar.addSeparator()
-        self.toolbar.addAction(self.act_insert_image)
-        self.toolbar.addAction(self.act_insert_table)
-
-        self.toolbar.addSeparator()
-        self.toolbar.addAction(self.act_undo)
-        self.toolbar.addAction(self.act_redo)
-
-        self.toolbar.addSeparator()
-        # Color buttons
-        self.toolbar.addWidget(QLabel(" "))
-        self.toolbar.addWidget(self.text_color_btn)
-        self.toolbar.addWidget(self.bg_color_btn)
-
-        self.toolbar.addSeparator()
-        # Language combo
-        self.lang_combo = QComboBox()
-        for name, code in LANG_CHOICES:
-            self.lang_combo.addItem(name, code)
-        self.lang_combo.setCurrentIndex(0)
-        self.lang_combo.currentIndexChanged.connect(self.lang_changed)
-        self.toolbar.addWidget(QLabel(" "))
-        self.toolbar.addWidget(self.lang_combo)
-        try:
-            self.lang_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-
-        # Ensure search_dir_combo popup style
-        try:
-            self.search_dir_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-
-    def _create_menus(self):
-        menubar = self.menuBar()
-        # create menus but set titles in retranslate_ui for translation support
-        self.menu_file = menubar.addMenu("")
-        self.menu_file.addAction(self.act_new)
-        self.menu_file.addAction(self.act_open)
-        self.menu_file.addAction(self.act_save)
-        self.menu_file.addAction(self.act_save_as)
-        self.menu_file.addSeparator()
-        self.menu_file.addAction(self.act_exit)
-
-        self.menu_edit = menubar.addMenu("")
-        self.menu_edit.addAction(self.act_undo)
-        self.menu_edit.addAction(self.act_redo)
-
-        self.menu_insert = menubar.addMenu("")
-        self.menu_insert.addAction(self.act_insert_image)
-        self.menu_insert.addAction(self.act_insert_table)
-
-    # ---------------------------
-    # Formatting helpers
-    # ---------------------------
-    def toggle_bold(self):
-        fmt = QTextCharFormat()
-        current_weight = self.editor.fontWeight()
-        if current_weight == QFont.Bold:
-            fmt.setFontWeight(QFont.Normal)
-            self.act_bold.setChecked(False)
-        else:
-            fmt.setFontWeight(QFont.Bold)
-            self.act_bold.setChecked(True)
-        cursor = self.editor.textCursor()
-        cursor.mergeCharFormat(fmt)
-        self.editor.mergeCurrentCharFormat(fmt)
-
-    def toggle_italic(self):
-        cursor = self.editor.textCursor()
-        fmt = QTextCharFormat()
-        fmt.setFontItalic(not self.editor.fontItalic())
-        self.act_italic.setChecked(fmt.fontItalic())
-        cursor.mergeCharFormat(fmt)
-        self.editor.mergeCurrentCharFormat(fmt)
-
-    def toggle_underline(self):
-        cursor = self.editor.textCursor()
-        fmt = QTextCharFormat()
-        fmt.setFontUnderline(not self.editor.fontUnderline())
-        self.act_underline.setChecked(fmt.fontUnderline())
-        cursor.mergeCharFormat(fmt)
-        self.editor.mergeCurrentCharFormat(fmt)
-
-    def set_alignment(self, alignment):
-        self.editor.setAlignment(alignment)
-
-    def set_font_family(self, qfont):
-        fmt = QTextCharFormat()
-        fmt.setFontFamily(qfont.family())
-        cursor = self.editor.textCursor()
-        cursor.mergeCharFormat(fmt)
-        self.editor.mergeCurrentCharFormat(fmt)
-
-    def set_font_size(self, size):
-        fmt = QTextCharFormat()
-        fmt.setFontPointSize(size)
-        cursor = self.editor.textCursor()
-        cursor.mergeCharFormat(fmt)
-        self.editor.mergeCurrentCharFormat(fmt)
-
-    # ---------------------------
-    # Styles (extended)
-    # ---------------------------
-    def apply_style_from_combo(self, index):
-        style = self.style_combo.itemText(index)
-        self.apply_style(style)
-
-    def apply_style(self, style_name):
-        cursor = self.editor.textCursor()
-        if not cursor:
-            return
-        block_fmt = QTextBlockFormat()
-        char_fmt = QTextCharFormat()
-
-        # Match against translated labels and common English names
-        title_names = (self.trans.get("style_title"), "Title", "标题", "タイトル")
-        subtitle_names = (self.trans.get("style_subtitle"), "Subtitle", "副标题", "サブタイトル")
-        subtitle2_names = (self.trans.get("style_subtitle2"), "Subtitle 2")
-        h1_names = (self.trans.get("style_h1"), "Heading 1")
-        h2_names = (self.trans.get("style_h2"), "Heading 2")
-        quote_names = (self.trans.get("style_quote"), "Quote")
-        code_names = (self.trans.get("style_code"), "Code", "代码")
-        mono_names = (self.trans.get("style_mono"), "Monospace", "等宽")
-        small_names = (self.trans.get("style_small"), "Small")
-        large_names = (self.trans.get("style_large"), "Large")
-        emphasis_names = (self.trans.get("style_emphasis"), "Emphasis", "强调")
-
-        if style_name in title_names:
-            block_fmt.setAlignment(Qt.AlignCenter)
-            char_fmt.setFontPointSize(28)
-            char_fmt.setFontWeight(QFont.Bold)
-        elif style_name in subtitle_names:
-            block_fmt.setAlignment(Qt.AlignCenter)
-            char_fmt.setFontPointSize(20)
-            char_fmt.setFontItalic(True)
-        elif style_name in subtitle2_names:
-            block_fmt.setAlignment(Qt.AlignCenter)
-            char_fmt.setFontPointSize(16)
-        elif style_name in h1_names:
-            block_fmt.setAlignment(Qt.AlignLeft)
-            char_fmt.setFontPointSize(24)
-            char_fmt.setFontWeight(QFont.Bold)
-        elif style_name in h2_names:
-            block_fmt.setAlignment(Qt.AlignLeft)
-            char_fmt.setFontPointSize(18)
-            char_fmt.setFontWeight(QFont.Bold)
-        elif style_name in quote_names:
-            block_fmt.setLeftMargin(24)
-            char_fmt.setFontItalic(True)
-            char_fmt.setFontPointSize(12)
-        elif style_name in code_names:
-            # monospace look with gray background
-            char_fmt.setFontFamily("Courier New")
-            char_fmt.setFontPointSize(11)
-            char_fmt.setFontFixedPitch(True)
-            char_fmt.setBackground(QBrush(QColor("#F5F5F5")))
-        elif style_name in mono_names:
-            char_fmt.setFontFamily("Courier New")
-            char_fmt.setFontPointSize(12)
-        elif style_name in small_names:
-            char_fmt.setFontPointSize(10)
-        elif style_name in large_names:
-            char_fmt.setFontPointSize(16)
-        elif style_name in emphasis_names:
-            char_fmt.setFontItalic(True)
-            char_fmt.setFontWeight(QFont.DemiBold)
-        else:
-            # Normal
-            block_fmt.setAlignment(Qt.AlignLeft)
-            char_fmt.setFontPointSize(12)
-            char_fmt.setFontWeight(QFont.Normal)
-            char_fmt.setFontItalic(False)
-
-        cursor.beginEditBlock()
-        cursor.setBlockFormat(block_fmt)
-        cursor.mergeCharFormat(char_fmt)
-        self.editor.mergeCurrentCharFormat(char_fmt)
-        cursor.endEditBlock()
-
-    # ---------------------------
-    # Color features
-    # ---------------------------
-    def choose_text_color(self):
-        color = QColorDialog.getColor(parent=self, title=self.trans.get("text_color", "Text Color"))
-        if not color.isValid():
-            return
-        fmt = QTextCharFormat()
-        fmt.setForeground(QBrush(color))
-        cursor = self.editor.textCursor()
-        if cursor.hasSelection():
-            cursor.mergeCharFormat(fmt)
-        else:
-            # apply for typing forward
-            self.editor.mergeCurrentCharFormat(fmt)
-        # update button background to indicate color
-        self.text_color_btn.setStyleSheet(f"background: {color.name()}; color: white; font-weight:bold;")
-
-    def choose_bg_color(self):
-        color = QColorDialog.getColor(parent=self, title=self.trans.get("bg_color", "Highlight Color"))
-        if not color.isValid():
-            return
-        fmt = QTextCharFormat()
-        fmt.setBackground(QBrush(color))
-        cursor = self.editor.textCursor()
-        if cursor.hasSelection():
-            cursor.mergeCharFormat(fmt)
-        else:
-            self.editor.mergeCurrentCharFormat(fmt)
-        self.bg_color_btn.setStyleSheet(f"background: {color.name()}; color: white;")
-
-    # ---------------------------
-    # Insert image / table (robust)
-    # ---------------------------
-    def insert_image(self):
-        path, _ = QFileDialog.getOpenFileName(self, self.trans["insert_image"], "", "Images (*.png *.jpg *.jpeg *.bmp *.gif);;All Files (*)")
-        if not path:
-            return
-        cursor = self.editor.textCursor()
-        image = QImage(path)
-        if image.isNull():
-            QMessageBox.warning(self, self.trans["insert_image"], f"{self.trans.get('insert_image_error', 'Cannot load image:')} {path}")
-            return
-        img_fmt = QTextImageFormat()
-        file_url = 'file:///' + path.replace('\\', '/')
-        img_fmt.setName(file_url)
-        w = image.width()
-        h = image.height()
-        max_w = 600
-        if w > max_w:
-            ratio = max_w / w
-            img_fmt.setWidth(w * ratio)
-            img_fmt.setHeight(h * ratio)
-        cursor.insertImage(img_fmt)
-
-    def insert_table(self):
-        # 获取行列，使用翻译文本
-        rows, ok1 = QInputDialog.getInt(self, self.trans.get("table_title", "Insert Table"), self.trans.get("rows_label", "Rows:"), 2, 1, 50)
-        if not ok1:
-            return
-        cols, ok2 = QInputDialog.getInt(self, self.trans.get("table_title", "Insert Table"), self.trans.get("cols_label", "Columns:"), 2, 1, 20)
-        if not ok2:
-            return
-        cursor = self.editor.textCursor()
-        # 使用 QTextTableFormat 避免游标问题
-        try:
-            table_fmt = QTextTableFormat()
-            table_fmt.setBorder(1)
-            table_fmt.setCellPadding(4)
-            table_fmt.setCellSpacing(2)
-            table = cursor.createTable(rows, cols, table_fmt)
-            # 将光标定位到第一个单元格的起始位置（更安全）
-            try:
-                cell = table.cellAt(0, 0)
-                new_cursor = cell.firstCursorPosition()
-                self.editor.setTextCursor(new_cursor)
-            except Exception:
-                pass
-        except Exception as e:
-            QMessageBox.warning(self, self.trans.get("table_title", "Insert Table"), f"Failed to insert table:\n{e}")
-
-    # ---------------------------
-    # File operations
-    # ---------------------------
-    def action_new(self):
-        reply = QMessageBox.question(self, self.trans["new"], self.trans["confirm_clear"],
-                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        if reply == QMessageBox.Yes:
-            self.current_filepath = None
-            self.editor.clear()
-
-    def action_open(self):
-        desktop = get_desktop_path()
-        fname, _ = QFileDialog.getOpenFileName(self, self.trans["open"], desktop, "VOC files (*.voc);;All Files (*)")
-        if fname:
-            try:
-                with open(fname, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                html = data.get("content", "")
-                self.editor.setHtml(html)
-                self.current_filepath = fname
-            except Exception as e:
-                QMessageBox.warning(self, self.trans["open"], f"{self.trans['open_error']}\n{e}")
-
-    def action_save(self):
-        desktop = get_desktop_path()
-        if platform.system() != "Windows":
-            QMessageBox.information(self, "Info", self.trans["not_windows"])
-        if self.current_filepath:
-            try:
-                if os.path.commonpath([os.path.abspath(self.current_filepath), os.path.abspath(desktop)]) == os.path.abspath(desktop):
-                    target = self.current_filepath
-                else:
-                    name, ok = QInputDialog.getText(self, self.trans["save"], self.trans["filename_prompt"])
-                    if not ok or not name.strip():
-                        return
-                    filename = ensure_extension(name.strip())
-                    target = os.path.join(desktop, filename)
-            except Exception:
-                name, ok = QInputDialog.getText(self, self.trans["save"], self.trans["filename_prompt"])
-                if not ok or not name.strip():
-                    return
-                filename = ensure_extension(name.strip())
-                target = os.path.join(desktop, filename)
-        else:
-            name, ok = QInputDialog.getText(self, self.trans["save"], self.trans["filename_prompt"])
-            if not ok or not name.strip():
-                return
-            filename = ensure_extension(name.strip())
-            target = os.path.join(desktop, filename)
-
-        self._write_voc_file(target)
-        self.current_filepath = target
-        QMessageBox.information(self, self.trans["save"], self.trans["saved"])
-
-    def action_save_as(self):
-        desktop = get_desktop_path()
-        if platform.system() != "Windows":
-            QMessageBox.information(self, "Info", self.trans["not_windows"])
-        name, ok = QInputDialog.getText(self, self.trans["save_as"], self.trans["filename_prompt"])
-        if not ok or not name.strip():
-            return
-        filename = ensure_extension(name.strip())
-        target = os.path.join(desktop, filename)
-        self._write_voc_file(target)
-        self.current_filepath = target
-        QMessageBox.information(self, self.trans["save_as"], self.trans["saved"])
-
-    def _write_voc_file(self, path):
-        try:
-            html = self.editor.toHtml()
-            html = _replace_file_src_with_data_uris(html)
-            data = {
-                "content": html,
-                "meta": {
-                    "saved_by": "Voc Editor (Python/PyQt5)",
-                    "platform": platform.platform(),
-                }
-            }
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            QMessageBox.warning(self, self.trans["save"], f"Save failed: {e}")
-
-    # ---------------------------
-    # Search & quick open
-    # ---------------------------
-    def search_voc_files(self):
-        self.files_list.clear()
-        search_term = self.search_input.text().strip().lower()
-        dirpath = self.search_dir_combo.currentData()
-        if not dirpath:
-            dirpath = get_desktop_path()
-        results = []
-        try:
-            for entry in os.listdir(dirpath):
-                full = os.path.join(dirpath, entry)
-                if os.path.isfile(full) and entry.lower().endswith('.voc'):
-                    if not search_term or search_term in entry.lower():
-                        results.append(full)
-        except Exception:
-            pass
-
-        for p in results:
-            item = QListWidgetItem(p)
-            self.files_list.addItem(item)
-
-    def open_voc_from_list(self, item: QListWidgetItem):
-        path = item.text()
-        if not path:
-            QMessageBox.warning(self, self.trans["open"], self.trans["no_file_selected"])
-            return
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            html = data.get("content", "")
-            self.editor.setHtml(html)
-            self.current_filepath = path
-        except Exception as e:
-            QMessageBox.warning(self, self.trans["open"], f"{self.trans['open_error']}\n{e}")
-
-    # ---------------------------
-    # Language
-    # ---------------------------
-    def lang_changed(self, index):
-        code = self.lang_combo.itemData(index)
-        if not code:
-            return
-        self.lang = code
-        self.trans = TRANSLATIONS.get(self.lang, TRANSLATIONS["en-US"])
-        self.retranslate_ui()
-
-    def retranslate_ui(self):
-        # Window title and menus/actions
-        self.setWindowTitle(self.trans["app_title"])
-        self.act_new.setText(self.trans["new"])
-        self.act_open.setText(self.trans["open"])
-        self.act_save.setText(self.trans["save"])
-        self.act_save_as.setText(self.trans["save_as"])
-        self.act_exit.setText(self.trans["exit"])
-
-        # Update menu titles
-        self.menu_file.setTitle(self.trans.get("menu_file", "File"))
-        self.menu_edit.setTitle(self.trans.get("menu_edit", "Edit"))
-        self.menu_insert.setTitle(self.trans.get("menu_insert", "Insert"))
-
-        # Tooltips and buttons
-        self.act_bold.setToolTip(self.trans["bold"])
-        self.act_italic.setToolTip(self.trans["italic"])
-        self.act_underline.setToolTip(self.trans["underline"])
-        self.act_align_left.setToolTip(self.trans["align_left"])
-        self.act_align_center.setToolTip(self.trans["align_center"])
-        self.act_align_right.setToolTip(self.trans["align_right"])
-
-        self.search_input.setPlaceholderText(self.trans["search"])
-        self.search_btn.setText(self.trans["search"])
-        self.search_dir_combo.setItemText(0, self.trans["desktop_search"])
-
-        self.act_insert_image.setText(self.trans["insert_image"])
-        self.act_insert_table.setText(self.trans["insert_table"])
-
-        self.act_undo.setText(self.trans["undo"])
-        self.act_redo.setText(self.trans["redo"])
-
-        # Style label and combo items
-        self.style_label.setText(self.trans.get("style_label", "Style:"))
-        current_index = self.style_combo.currentIndex()
-        self.style_combo.blockSignals(True)
-        self.style_combo.clear()
-        self.style_combo.addItem(self.trans.get("style_normal", "Normal"))
-        self.style_combo.addItem(self.trans.get("style_title", "Title"))
-        self.style_combo.addItem(self.trans.get("style_subtitle", "Subtitle"))
-        self.style_combo.addItem(self.trans.get("style_subtitle2", "Subtitle 2"))
-        self.style_combo.addItem(self.trans.get("style_h1", "Heading 1"))
-        self.style_combo.addItem(self.trans.get("style_h2", "Heading 2"))
-        self.style_combo.addItem(self.trans.get("style_quote", "Quote"))
-        self.style_combo.addItem(self.trans.get("style_code", "Code"))
-        self.style_combo.addItem(self.trans.get("style_mono", "Monospace"))
-        self.style_combo.addItem(self.trans.get("style_small", "Small"))
-        self.style_combo.addItem(self.trans.get("style_large", "Large"))
-        self.style_combo.addItem(self.trans.get("style_emphasis", "Emphasis"))
-        if 0 <= current_index < self.style_combo.count():
-            self.style_combo.setCurrentIndex(current_index)
-        self.style_combo.blockSignals(False)
-
-        # Update color button tooltips
-        self.text_color_btn.setToolTip(self.trans.get("text_color", "Text Color"))
-        self.bg_color_btn.setToolTip(self.trans.get("bg_color", "Highlight Color"))
-
-        # Reapply popup styles
-        try:
-            self.style_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-        try:
-            self.font_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-        try:
-            self.lang_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-        try:
-            self.search_dir_combo.view().setStyleSheet(COMBO_POPUP_QSS)
-        except Exception:
-            pass
-
-
-# ---------------------------
-# Main
-# ---------------------------
-def main():
-    app = QApplication(sys.argv)
-    # App-wide style (light blue + white) + menus/combo style
-    style = """
-    QMainWindow { background: #E7F0FA; }
-    QMenuBar { background: #FFFFFF; }
-    QMenu { background: #FFFFFF; }
-    QToolBar { background: #FFFFFF; }
-    QPushButton { background: #FFFFFF; border: 1px solid #cfe8fb; padding: 4px; }
-    QListWidget { background: #FFFFFF; }
-    QLineEdit { background: #FFFFFF; padding: 4px; border: 1px solid #cfe8fb; }
-    """ + GLOBAL_QSS_MENU
-    app.setStyleSheet(style)
-
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec_())
-
-
-if __name__ == "__main__":
-    main()
+import sys
+import os
+import json
+import platform
+import base64
+import re
+import hashlib
+import io
+import tempfile
+import time
+import struct
+import zlib
+import sqlite3
+import lzma
+import bz2
+import itertools
+from array import array
+import heapq
+from bisect import bisect_left
+import math
+import fnmatch
+from collections import OrderedDict, Counter
+import threading
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import unquote, urlparse, quote
+from functools import partial
+from contextlib import contextmanager
+from html import unescape as html_unescape
+
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QTextEdit, QAction, QFileDialog, QToolBar,
+    QFontComboBox, QComboBox, QSpinBox, QWidget, QHBoxLayout, QVBoxLayout,
+    QPushButton, QLabel, QLineEdit, QMessageBox,
+    QInputDialog, QColorDialog, QProgressBar, QActionGroup, QCheckBox, QStyledItemDelegate,
+    QStyleOptionViewItem, QStyle, QListView
+)
+from PyQt5.QtGui import (
+    QIcon, QFont, QTextCharFormat, QTextCursor, QTextBlockFormat,
+    QTextImageFormat, QImage, QImageReader, QImageIOHandler, QPixmap, QTextTableFormat, QColor, QBrush, QTextDocument,
+    QTextDocumentFragment, QTextTable, QTextFormat, QTextListFormat, QTextLength, QTextFrameFormat,
+    QTextObjectInterface, QFontMetrics
+)
+from PyQt5.QtCore import (
+    Qt, QEvent, QSize, QSizeF, QRectF, QUrl, QObject, pyqtSignal, QTimer, QElapsedTimer, QBuffer, QIODevice,
+    QFileSystemWatcher, QAbstractListModel, QModelIndex,
+    QByteArray
+)
+
+# ---------------------------
+# Combo popup & menu QSS (hover/selected styles)
+# ---------------------------
+COMBO_POPUP_QSS = """
+QListView {
+  background-color: #FFFFFF;
+  outline: 0;
+}
+QListView::item {
+  height: 28px;
+  padding: 4px 10px;
+  color: #213447;
+}
+QListView::item:selected, QListView::item:hover {
+  background-color: #2E8BFF;
+  color: #FFFFFF;
+}
+"""
+
+GLOBAL_QSS_MENU = """
+QMenu {
+  background-color: #FFFFFF;
+  border: 1px solid #cfe8fb;
+}
+QMenu::item {
+  padding: 6px 24px;
+  color: #213447;
+}
+QMenu::item:selected {
+  background-color: #2E8BFF;
+  color: #FFFFFF;
+}
+QComboBox QAbstractItemView {
+  background-color: #FFFFFF;
+  selection-background-color: #2E8BFF;
+  selection-color: #FFFFFF;
+}
+"""
+
+# ---------------------------
+# Translations (expanded)
+# ---------------------------
+TRANSLATIONS = {
+    "en-US": {
+        "app_title": "Text Editor",
+        "menu_file": "File",
+        "menu_edit": "Edit",
+        "menu_insert": "Insert",
+        "new": "New",
+        "open": "Open",
+        "save": "Save",
+        "save_as": "Save As",
+        "exit": "Exit",
+        "bold": "Bold",
+        "italic": "Italic",
+        "underline": "Underline",
+        "align_left": "Align Left",
+        "align_center": "Align Center",
+        "align_right": "Align Right",
+        "search": "Search .voc",
+        "desktop_search": "Desktop",
+        "filename_prompt": "Filename (without extension):",
+        "saved": "Saved.",
+        "open_error": "Failed to open file.",
+        "not_windows": "Not running on Windows. Desktop save will instead use your home directory.",
+        "no_file_selected": "No file selected.",
+        "confirm_clear": "Clear editor? Unsaved changes will be lost.",
+        "insert_image": "Insert Image",
+        "insert_table": "Insert Table",
+        "style": "Style",
+        "undo": "Undo",
+        "redo": "Redo",
+        "style_label": "Style:",
+        "style_normal": "Normal",
+        "style_title": "Title",
+        "style_subtitle": "Subtitle",
+        "style_subtitle2": "Subtitle 2",
+        "style_h1": "Heading 1",
+        "style_h2": "Heading 2",
+        "style_quote": "Quote",
+        "style_code": "Code",
+        "style_mono": "Monospace",
+        "style_small": "Small",
+        "style_large": "Large",
+        "style_emphasis": "Emphasis",
+        "rows_label": "Rows:",
+        "cols_label": "Columns:",
+        "insert_image_error": "Cannot load image:",
+        "table_title": "Insert Table",
+        "text_color": "Text Color",
+        "bg_color": "Highlight Color",
+        "incremental_save": "Incremental Save",
+        "compact": "Compact File",
+        "saving": "Saving…",
+        "loading": "Loading…",
+        "compression": "Compression",
+        "compression_none": "None",
+        "file_summary": "{words} words · {images} images · {modified}",
+        "image_quality": "Inserted Image Quality",
+        "image_quality_original": "Original File",
+        "image_quality_high": "High (2× display size)",
+        "image_quality_standard": "Standard (display size)",
+        "keep_originals": "Keep Original Images",
+        "use_original_image": "Use Original Image",
+        "no_original_image": "No stored original for this image.",
+        "insert_images": "Insert Multiple Images",
+        "inserting_images": "Inserting {count} images…",
+        "search_count": "{count} found",
+        "searching_count": "Searching… {count}",
+        "search_depth": "Folder depth to search (0: this folder only)",
+        "search_contents": "Contents",
+        "sort_relevance": "Best match",
+        "sort_name": "Name",
+        "sort_modified": "Newest",
+        "sort_size": "Largest",
+        "find_replace": "Find and Replace",
+        "find": "Find",
+        "replace_with": "Replace with",
+        "match_case": "Match case",
+        "whole_words": "Whole words",
+        "regex": "Regex",
+        "find_previous": "Previous",
+        "find_next": "Next",
+        "replace": "Replace",
+        "replace_all": "Replace All",
+        "find_count": "{count} matches",
+        "find_position": "{current} of {count}",
+        "find_none": "No matches",
+        "find_bad_pattern": "Invalid pattern",
+        "find_replaced": "Replaced {count}"
+    },
+    "en-GB": {
+        "app_title": "Text Editor",
+        "menu_file": "File",
+        "menu_edit": "Edit",
+        "menu_insert": "Insert",
+        "new": "New",
+        "open": "Open",
+        "save": "Save",
+        "save_as": "Save As",
+        "exit": "Exit",
+        "bold": "Bold",
+        "italic": "Italic",
+        "underline": "Underline",
+        "align_left": "Align Left",
+        "align_center": "Align Centre",
+        "align_right": "Align Right",
+        "search": "Search .voc",
+        "desktop_search": "Desktop",
+        "filename_prompt": "Filename (without extension):",
+        "saved": "Saved.",
+        "open_error": "Failed to open file.",
+        "not_windows": "Not running on Windows. Desktop save will instead use your home directory.",
+        "no_file_selected": "No file selected.",
+        "confirm_clear": "Clear editor? Unsaved changes will be lost.",
+        "insert_image": "Insert Image",
+        "insert_table": "Insert Table",
+        "style": "Style",
+        "undo": "Undo",
+        "redo": "Redo",
+        "style_label": "Style:",
+        "style_normal": "Normal",
+        "style_title": "Title",
+        "style_subtitle": "Subtitle",
+        "style_subtitle2": "Subtitle 2",
+        "style_h1": "Heading 1",
+        "style_h2": "Heading 2",
+        "style_quote": "Quote",
+        "style_code": "Code",
+        "style_mono": "Monospace",
+        "style_small": "Small",
+        "style_large": "Large",
+        "style_emphasis": "Emphasis",
+        "rows_label": "Rows:",
+        "cols_label": "Columns:",
+        "insert_image_error": "Cannot load image:",
+        "table_title": "Insert Table",
+        "text_color": "Text Color",
+        "bg_color": "Highlight Color",
+        "incremental_save": "Incremental Save",
+        "compact": "Compact File",
+        "saving": "Saving…",
+        "loading": "Loading…",
+        "compression": "Compression",
+        "compression_none": "None",
+        "file_summary": "{words} words · {images} images · {modified}",
+        "image_quality": "Inserted Image Quality",
+        "image_quality_original": "Original File",
+        "image_quality_high": "High (2× display size)",
+        "image_quality_standard": "Standard (display size)",
+        "keep_originals": "Keep Original Images",
+        "use_original_image": "Use Original Image",
+        "no_original_image": "No stored original for this image.",
+        "insert_images": "Insert Multiple Images",
+        "inserting_images": "Inserting {count} images…",
+        "search_count": "{count} found",
+        "searching_count": "Searching… {count}",
+        "search_depth": "Folder depth to search (0: this folder only)",
+        "search_contents": "Contents",
+        "sort_relevance": "Best match",
+        "sort_name": "Name",
+        "sort_modified": "Newest",
+        "sort_size": "Largest",
+        "find_replace": "Find and Replace",
+        "find": "Find",
+        "replace_with": "Replace with",
+        "match_case": "Match case",
+        "whole_words": "Whole words",
+        "regex": "Regex",
+        "find_previous": "Previous",
+        "find_next": "Next",
+        "replace": "Replace",
+        "replace_all": "Replace All",
+        "find_count": "{count} matches",
+        "find_position": "{current} of {count}",
+        "find_none": "No matches",
+        "find_bad_pattern": "Invalid pattern",
+        "find_replaced": "Replaced {count}"
+    },
+    "zh-CN": {
+        "app_title": "Text 文档编辑器",
+        "menu_file": "文件",
+        "menu_edit": "编辑",
+        "menu_insert": "插入",
+        "new": "新建",
+        "open": "打开",
+        "save": "保存",
+        "save_as": "另存为",
+        "exit": "退出",
+        "bold": "加粗",
+        "italic": "斜体",
+        "underline": "下划线",
+        "align_left": "左对齐",
+        "align_center": "居中",
+        "align_right": "右对齐",
+        "search": "查找 .voc",
+        "desktop_search": "桌面",
+        "filename_prompt": "文件名（不含扩展名）：",
+        "saved": "已保存。",
+        "open_error": "打开文件失败。",
+        "not_windows": "非 Windows 系统，保存目录将使用用户主目录。",
+        "no_file_selected": "未选择文件。",
+        "confirm_clear": "清空编辑区？未保存的更改将丢失。",
+        "insert_image": "插入图片",
+        "insert_table": "插入表格",
+        "style": "样式",
+        "undo": "撤销",
+        "redo": "重做",
+        "style_label": "样式：",
+        "style_normal": "正文",
+        "style_title": "标题",
+        "style_subtitle": "副标题",
+        "style_subtitle2": "副标题2",
+        "style_h1": "标题 1",
+        "style_h2": "标题 2",
+        "style_quote": "引用",
+        "style_code": "代码",
+        "style_mono": "等宽",
+        "style_small": "小号",
+        "style_large": "大号",
+        "style_emphasis": "强调",
+        "rows_label": "行数：",
+        "cols_label": "列数：",
+        "insert_image_error": "无法加载图片：",
+        "table_title": "插入表格",
+        "text_color": "文字颜色",
+        "bg_color": "背景颜色",
+        "incremental_save": "增量保存",
+        "compact": "整理文件",
+        "saving": "正在保存…",
+        "loading": "正在加载…",
+        "compression": "压缩",
+        "compression_none": "不压缩",
+        "file_summary": "{words} 字 · {images} 张图片 · {modified}",
+        "image_quality": "插入图片质量",
+        "image_quality_original": "原始文件",
+        "image_quality_high": "高（显示尺寸的 2 倍）",
+        "image_quality_standard": "标准（显示尺寸）",
+        "keep_originals": "保留原始图片",
+        "use_original_image": "使用原始图片",
+        "no_original_image": "此图片没有保存原始文件。",
+        "insert_images": "插入多张图片",
+        "inserting_images": "正在插入 {count} 张图片…",
+        "search_count": "找到 {count} 个",
+        "searching_count": "正在搜索… {count}",
+        "search_depth": "搜索的文件夹层数（0：仅此文件夹）",
+        "search_contents": "内容",
+        "sort_relevance": "最佳匹配",
+        "sort_name": "名称",
+        "sort_modified": "最近修改",
+        "sort_size": "最大",
+        "find_replace": "查找和替换",
+        "find": "查找",
+        "replace_with": "替换为",
+        "match_case": "区分大小写",
+        "whole_words": "全字匹配",
+        "regex": "正则表达式",
+        "find_previous": "上一个",
+        "find_next": "下一个",
+        "replace": "替换",
+        "replace_all": "全部替换",
+        "find_count": "{count} 个匹配",
+        "find_position": "第 {current} 个，共 {count} 个",
+        "find_none": "无匹配",
+        "find_bad_pattern": "无效的表达式",
+        "find_replaced": "已替换 {count} 处"
+    },
+    "zh-TW": {
+        "app_title": "Text 文件編輯器",
+        "menu_file": "文件",
+        "menu_edit": "編輯",
+        "menu_insert": "插入",
+        "new": "新建",
+        "open": "打開",
+        "save": "保存",
+        "save_as": "另存為",
+        "exit": "退出",
+        "bold": "加粗",
+        "italic": "斜體",
+        "underline": "底線",
+        "align_left": "靠左",
+        "align_center": "置中",
+        "align_right": "靠右",
+        "search": "查找 .voc",
+        "desktop_search": "桌面",
+        "filename_prompt": "檔名（不含副檔名）：",
+        "saved": "已保存。",
+        "open_error": "打開檔案失敗。",
+        "not_windows": "非 Windows 系統，保存目錄將使用使用者主目錄。",
+        "no_file_selected": "未選擇檔案。",
+        "confirm_clear": "清空編輯區？未保存的更改將遺失。",
+        "insert_image": "插入圖片",
+        "insert_table": "插入表格",
+        "style": "樣式",
+        "undo": "復原",
+        "redo": "重做",
+        "style_label": "樣式：",
+        "style_normal": "正文",
+        "style_title": "標題",
+        "style_subtitle": "副標題",
+        "style_subtitle2": "副標題2",
+        "style_h1": "標題 1",
+        "style_h2": "標題 2",
+        "style_quote": "引用",
+        "style_code": "程式碼",
+        "style_mono": "等寬",
+        "style_small": "小號",
+        "style_large": "大號",
+        "style_emphasis": "強調",
+        "rows_label": "行數：",
+        "cols_label": "列數：",
+        "insert_image_error": "無法載入圖片：",
+        "table_title": "插入表格",
+        "text_color": "文字顏色",
+        "bg_color": "背景顏色",
+        "incremental_save": "增量保存",
+        "compact": "整理檔案",
+        "saving": "正在保存…",
+        "loading": "正在載入…",
+        "compression": "壓縮",
+        "compression_none": "不壓縮",
+        "file_summary": "{words} 字 · {images} 張圖片 · {modified}",
+        "image_quality": "插入圖片品質",
+        "image_quality_original": "原始檔案",
+        "image_quality_high": "高（顯示尺寸的 2 倍）",
+        "image_quality_standard": "標準（顯示尺寸）",
+        "keep_originals": "保留原始圖片",
+        "use_original_image": "使用原始圖片",
+        "no_original_image": "此圖片沒有保存原始檔案。",
+        "insert_images": "插入多張圖片",
+        "inserting_images": "正在插入 {count} 張圖片…",
+        "search_count": "找到 {count} 個",
+        "searching_count": "正在搜尋… {count}",
+        "search_depth": "搜尋的資料夾層數（0：僅此資料夾）",
+        "search_contents": "內容",
+        "sort_relevance": "最佳符合",
+        "sort_name": "名稱",
+        "sort_modified": "最近修改",
+        "sort_size": "最大",
+        "find_replace": "尋找和取代",
+        "find": "尋找",
+        "replace_with": "取代為",
+        "match_case": "區分大小寫",
+        "whole_words": "全字拼寫須相符",
+        "regex": "規則運算式",
+        "find_previous": "上一個",
+        "find_next": "下一個",
+        "replace": "取代",
+        "replace_all": "全部取代",
+        "find_count": "{count} 個相符",
+        "find_position": "第 {current} 個，共 {count} 個",
+        "find_none": "沒有相符項目",
+        "find_bad_pattern": "無效的運算式",
+        "find_replaced": "已取代 {count} 處"
+    },
+    "ja-JP": {
+        "app_title": "Text エディタ",
+        "menu_file": "ファイル",
+        "menu_edit": "編集",
+        "menu_insert": "挿入",
+        "new": "新規",
+        "open": "開く",
+        "save": "保存",
+        "save_as": "名前を付けて保存",
+        "exit": "終了",
+        "bold": "太字",
+        "italic": "斜体",
+        "underline": "下線",
+        "align_left": "左揃え",
+        "align_center": "中央揃え",
+        "align_right": "右揃え",
+        "search": ".voc を検索",
+        "desktop_search": "デスクトップ",
+        "filename_prompt": "ファイル名（拡張子なし）：",
+        "saved": "保存しました。",
+        "open_error": "ファイルを開けませんでした。",
+        "not_windows": "Windows ではありません。保存先はホームディレクトリになります。",
+        "no_file_selected": "ファイルが選択されていません。",
+        "confirm_clear": "エディタをクリアしますか？未保存の変更は失われます。",
+        "insert_image": "画像を挿入",
+        "insert_table": "表を挿入",
+        "style": "スタイル",
+        "undo": "元に戻す",
+        "redo": "やり直し",
+        "style_label": "スタイル：",
+        "style_normal": "標準",
+        "style_title": "タイトル",
+        "style_subtitle": "サブタイトル",
+        "style_subtitle2": "サブタイトル2",
+        "style_h1": "見出し 1",
+        "style_h2": "見出し 2",
+        "style_quote": "引用",
+        "style_code": "コード",
+        "style_mono": "等幅",
+        "style_small": "小",
+        "style_large": "大",
+        "style_emphasis": "強調",
+        "rows_label": "行：",
+        "cols_label": "列：",
+        "insert_image_error": "画像を読み込めません：",
+        "table_title": "表を挿入",
+        "text_color": "文字色",
+        "bg_color": "背景色",
+        "incremental_save": "増分保存",
+        "compact": "ファイルを最適化",
+        "saving": "保存中…",
+        "loading": "読み込み中…",
+        "compression": "圧縮",
+        "compression_none": "なし",
+        "file_summary": "{words} 語 · 画像 {images} 枚 · {modified}",
+        "image_quality": "挿入画像の品質",
+        "image_quality_original": "元のファイル",
+        "image_quality_high": "高（表示サイズの 2 倍）",
+        "image_quality_standard": "標準（表示サイズ）",
+        "keep_originals": "元の画像を保持",
+        "use_original_image": "元の画像を使用",
+        "no_original_image": "この画像の元ファイルは保存されていません。",
+        "insert_images": "複数の画像を挿入",
+        "inserting_images": "{count} 枚の画像を挿入中…",
+        "search_count": "{count} 件",
+        "searching_count": "検索中… {count}",
+        "search_depth": "検索するフォルダーの深さ（0：このフォルダーのみ）",
+        "search_contents": "本文",
+        "sort_relevance": "関連度順",
+        "sort_name": "名前順",
+        "sort_modified": "更新日時順",
+        "sort_size": "サイズ順",
+        "find_replace": "検索と置換",
+        "find": "検索",
+        "replace_with": "置換後の文字列",
+        "match_case": "大文字と小文字を区別",
+        "whole_words": "単語単位",
+        "regex": "正規表現",
+        "find_previous": "前へ",
+        "find_next": "次へ",
+        "replace": "置換",
+        "replace_all": "すべて置換",
+        "find_count": "{count} 件",
+        "find_position": "{current} / {count} 件",
+        "find_none": "一致なし",
+        "find_bad_pattern": "無効なパターン",
+        "find_replaced": "{count} 件置換しました"
+    },
+    "es-ES": {
+        "app_title": "Editor Text",
+        "menu_file": "Archivo",
+        "menu_edit": "Editar",
+        "menu_insert": "Insertar",
+        "new": "Nuevo",
+        "open": "Abrir",
+        "save": "Guardar",
+        "save_as": "Guardar como",
+        "exit": "Salir",
+        "bold": "Negrita",
+        "italic": "Cursiva",
+        "underline": "Subrayado",
+        "align_left": "Alinear a la izquierda",
+        "align_center": "Centrar",
+        "align_right": "Alinear a la derecha",
+        "search": "Buscar .voc",
+        "desktop_search": "Escritorio",
+        "filename_prompt": "Nombre de archivo (sin extensión):",
+        "saved": "Guardado.",
+        "open_error": "Error al abrir el archivo.",
+        "not_windows": "No está en Windows. El guardado usará el directorio del usuario.",
+        "no_file_selected": "Ningún archivo seleccionado.",
+        "confirm_clear": "¿Borrar editor? Los cambios no guardados se perderán.",
+        "insert_image": "Insertar imagen",
+        "insert_table": "Insertar tabla",
+        "style": "Estilo",
+        "undo": "Deshacer",
+        "redo": "Rehacer",
+        "style_label": "Estilo:",
+        "style_normal": "Normal",
+        "style_title": "Título",
+        "style_subtitle": "Subtítulo",
+        "style_subtitle2": "Subtítulo2",
+        "style_h1": "Encabezado 1",
+        "style_h2": "Encabezado 2",
+        "style_quote": "Cita",
+        "style_code": "Código",
+        "style_mono": "Monospace",
+        "style_small": "Pequeño",
+        "style_large": "Grande",
+        "style_emphasis": "Énfasis",
+        "rows_label": "Filas:",
+        "cols_label": "Columnas:",
+        "insert_image_error": "No se puede cargar la imagen:",
+        "table_title": "Insertar tabla",
+        "text_color": "Color de texto",
+        "bg_color": "Color de fondo",
+        "incremental_save": "Guardado incremental",
+        "compact": "Compactar archivo",
+        "saving": "Guardando…",
+        "loading": "Cargando…",
+        "compression": "Compresión",
+        "compression_none": "Ninguna",
+        "file_summary": "{words} palabras · {images} imágenes · {modified}",
+        "image_quality": "Calidad de imágenes insertadas",
+        "image_quality_original": "Archivo original",
+        "image_quality_high": "Alta (2× tamaño mostrado)",
+        "image_quality_standard": "Estándar (tamaño mostrado)",
+        "keep_originals": "Conservar imágenes originales",
+        "use_original_image": "Usar imagen original",
+        "no_original_image": "Esta imagen no tiene un original guardado.",
+        "insert_images": "Insertar varias imágenes",
+        "inserting_images": "Insertando {count} imágenes…",
+        "search_count": "{count} encontrados",
+        "searching_count": "Buscando… {count}",
+        "search_depth": "Profundidad de carpetas (0: solo esta carpeta)",
+        "search_contents": "Contenido",
+        "sort_relevance": "Relevancia",
+        "sort_name": "Nombre",
+        "sort_modified": "Más recientes",
+        "sort_size": "Más grandes",
+        "find_replace": "Buscar y reemplazar",
+        "find": "Buscar",
+        "replace_with": "Reemplazar con",
+        "match_case": "Coincidir mayúsculas",
+        "whole_words": "Palabras completas",
+        "regex": "Expresión regular",
+        "find_previous": "Anterior",
+        "find_next": "Siguiente",
+        "replace": "Reemplazar",
+        "replace_all": "Reemplazar todo",
+        "find_count": "{count} coincidencias",
+        "find_position": "{current} de {count}",
+        "find_none": "Sin coincidencias",
+        "find_bad_pattern": "Patrón no válido",
+        "find_replaced": "{count} reemplazadas"
+    }
+}
+
+LANG_CHOICES = [
+    ("English (US)", "en-US"),
+    ("English (UK)", "en-GB"),
+    ("简体中文", "zh-CN"),
+    ("繁體中文", "zh-TW"),
+    ("日本語", "ja-JP"),
+    ("Español", "es-ES"),
+]
+def get_desktop_path():
+    if platform.system() == "Windows":
+        return os.path.join(os.path.expanduser("~"), "Desktop")
+    else:
+        return os.path.expanduser("~")
+
+
+def get_app_data_path():
+    # per-user folder for the editor's own files (the search index)
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif platform.system() == "Darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, "VocEditor")
+
+
+def ensure_extension(filename):
+    if not filename.lower().endswith(".voc"):
+        return filename + ".voc"
+    return filename
+
+
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'\x00\x00\x01\x00', 'image/x-icon'),
+)
+_IMAGE_EXTENSIONS = {
+    'image/png': '.png', 'image/jpeg': '.jpg', 'image/gif': '.gif', 'image/bmp': '.bmp',
+    'image/tiff': '.tif', 'image/x-icon': '.ico', 'image/webp': '.webp',
+}
+
+
+def _sniff_image_mime(data):
+    # from the leading bytes of the image, so nothing has to be read twice
+    for signature, mime in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def _detect_image_mime(path, data=None):
+    if data is None:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(16)
+        except OSError:
+            data = b''
+    t = _sniff_image_mime(data)
+    if t:
+        return t
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jpg', '.jpeg'):
+        return 'image/jpeg'
+    if ext == '.png':
+        return 'image/png'
+    if ext == '.gif':
+        return 'image/gif'
+    return 'application/octet-stream'
+
+
+IMAGE_CACHE_BUDGET = 64 * 1024 * 1024
+
+
+class FileImageCache:
+    """
+    LRU of image files read while saving, keyed by (path, mtime, size) so a
+    file changed on disk is read again. Keeps the bytes and what was derived
+    from them (content hash, data URI) within a byte budget; hits and misses
+    count lookups. Shared by the GUI thread and the save worker.
+    """
+
+    def __init__(self, budget=IMAGE_CACHE_BUDGET):
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _entry(self, path):
+        st = os.stat(path)
+        ident = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(ident)
+            if entry is not None:
+                self._entries.move_to_end(ident)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        with open(path, 'rb') as f:
+            entry = {"ident": ident, "data": f.read()}
+        if len(entry["data"]) <= self.budget:
+            with self._lock:
+                self._entries[ident] = entry
+                self._grow(len(entry["data"]))
+        return entry
+
+    def _grow(self, size):
+        # caller holds the lock
+        self._size += size
+        while self._size > self.budget and len(self._entries) > 1:
+            _ident, old = self._entries.popitem(last=False)
+            self._size -= len(old["data"]) + len(old.get("uri", ""))
+
+    def read(self, path):
+        return self._entry(path)["data"]
+
+    def key(self, path):
+        """
+        (content hash, bytes) of the file at path.
+        """
+        entry = self._entry(path)
+        key = entry.get("key")
+        if key is None:
+            key = entry["key"] = hashlib.sha256(entry["data"]).hexdigest()
+        return key, entry["data"]
+
+    def data_uri(self, path):
+        entry = self._entry(path)
+        uri = entry.get("uri")
+        if uri is None:
+            data = entry["data"]
+            uri = f"data:{_detect_image_mime(path, data)};base64,{base64.b64encode(data).decode('ascii')}"
+            entry["uri"] = uri
+            with self._lock:
+                # only count it if the entry is still cached
+                if self._entries.get(entry["ident"]) is entry:
+                    self._grow(len(uri))
+        return uri
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._size}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+
+FILE_IMAGE_CACHE = FileImageCache()
+
+
+def _encode_file_to_data_uri(path):
+    try:
+        return FILE_IMAGE_CACHE.data_uri(path)
+    except Exception:
+        return None
+
+
+def _file_url_to_path(file_url):
+    parsed = urlparse(file_url)
+    path = parsed.path
+    if platform.system() == "Windows" and re.match(r'^/[a-zA-Z]:', path):
+        path = path.lstrip('/')
+    return unquote(path)
+
+
+_FILE_SRC_RE = re.compile(r'src=(["\'])(file:///?[^"\']+)\1', re.IGNORECASE)
+
+
+def _replace_file_src_with_data_uris(html, parallel=True):
+    """
+    Replace file:// image src with data URIs
+    """
+    # encode each distinct file once, concurrently, then substitute in one pass
+    urls = list(dict.fromkeys(m.group(2) for m in _FILE_SRC_RE.finditer(html)))
+    def encode(url):
+        return _encode_file_to_data_uri(_file_url_to_path(url))
+
+    uris = dict(zip(urls, _map_images(encode, urls) if parallel else map(encode, urls)))
+
+    def repl(m):
+        data_uri = uris.get(m.group(2))
+        if data_uri:
+            return f'src={m.group(1)}{data_uri}{m.group(1)}'
+        return m.group(0)
+
+    return _FILE_SRC_RE.sub(repl, html)
+
+
+# ---------------------------
+# .voc v2 container
+# ---------------------------
+# Layout: an 8-byte file header followed by length-prefixed chunks.
+#   header: magic "VOC2", u16 version, u16 codec (see VOC_CODECS)
+#   chunk:  4-byte tag, u64 payload length, payload
+# Chunks: META (JSON), BODY (HTML, utf-8), IMAG (u16 key length, key, raw bytes),
+# JRNL (JSON edit journal entry, appended by incremental saves, replayed in order).
+# BODY and JRNL payloads are compressed with the file's codec; META stays plain
+# so it can be read cheaply and images are stored as they are.
+# META is always the first chunk and carries a "summary" (title, preview, counts,
+# thumbnail) so file lists can read it from the first few KB. It is padded with
+# spaces, leaving room to rewrite it in place after a journal append.
+# Images are referenced from the body as voc-img:<key> and read on demand;
+# voc-img:<key>#<original key> also keeps the full-size original an inserted
+# image was downscaled from, read only if it is asked for.
+VOC_MAGIC = b"VOC2"
+VOC_VERSION = 2
+VOC_IMAGE_SCHEME = "voc-img"
+_VOC_HEADER = struct.Struct("<4sHH")
+_VOC_CHUNK = struct.Struct("<4sQ")
+_VOC_IMAGE_KEY = struct.Struct("<H")
+_VOC_META_SLACK = 1024
+# a header bigger than this is not worth reading just to list the file
+_VOC_META_MAX = 1 << 20
+
+def _identity(data):
+    return data
+
+
+# codec id -> (name, compress, decompress)
+VOC_CODECS = {
+    0: ("none", _identity, _identity),
+    1: ("zlib", partial(zlib.compress, level=6), zlib.decompress),
+    2: ("lzma", partial(lzma.compress, preset=6), lzma.decompress),
+    3: ("bz2", partial(bz2.compress, compresslevel=9), bz2.decompress),
+}
+VOC_CODEC_IDS = {name: codec_id for codec_id, (name, _c, _d) in VOC_CODECS.items()}
+VOC_DEFAULT_CODEC = "zlib"
+_VOC_COMPRESSED_TAGS = (b"BODY", b"JRNL")
+# codec name -> incremental decompressor, for reading just the start of a body
+_VOC_STREAM_DECODERS = {"zlib": zlib.decompressobj, "lzma": lzma.LZMADecompressor, "bz2": bz2.BZ2Decompressor}
+_VOC_STREAM_SLICE = 64 * 1024
+
+# an incremental save compacts the file instead once the journal grows past these
+VOC_JOURNAL_MAX_ENTRIES = 64
+VOC_JOURNAL_MAX_RATIO = 0.5
+
+_IMG_SRC_RE = re.compile(r'src=(["\'])((?:file:|data:|voc-img:)[^"\']*)\1', re.IGNORECASE)
+_DATA_URI_RE = re.compile(r'^data:([^;,]*)(;base64)?,(.*)$', re.IGNORECASE | re.DOTALL)
+
+
+def is_voc_container(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(VOC_MAGIC)) == VOC_MAGIC
+    except OSError:
+        return False
+
+
+def _pack_chunk(tag, payload):
+    return _VOC_CHUNK.pack(tag, len(payload)) + payload
+
+
+def _pack_meta_chunk(meta):
+    data = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    capacity = -(-(len(data) + _VOC_META_SLACK) // _VOC_META_SLACK) * _VOC_META_SLACK
+    return _pack_chunk(b"META", data.ljust(capacity, b" "))
+
+
+def _pack_image_chunk(key, data):
+    k = key.encode('utf-8')
+    return _pack_chunk(b"IMAG", _VOC_IMAGE_KEY.pack(len(k)) + k + data)
+
+
+_WRITE_SLICE = 1 << 20
+
+
+def _write_pieces(f, pieces, progress=None):
+    total = sum(len(p) for p in pieces)
+    done = 0
+    for piece in pieces:
+        view = memoryview(piece)
+        for i in range(0, len(view), _WRITE_SLICE):
+            f.write(view[i:i + _WRITE_SLICE])
+            done += len(view[i:i + _WRITE_SLICE])
+            if progress:
+                progress(done, total)
+
+
+# read once at import: os.umask can only be queried by setting it, which races other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path):
+    # permissions to give the file replacing path: its own, or what open() would give a new one
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write(path, pieces, progress=None):
+    """
+    Write pieces to a temp file next to path, fsync it and move it over path,
+    so readers see either the old file or the complete new one.
+    The new file keeps the permissions of the one it replaces.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".voc.tmp", dir=directory)
+    try:
+        os.chmod(tmp, _file_mode(path))
+        with os.fdopen(fd, 'wb') as f:
+            _write_pieces(f, pieces, progress)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # persist the rename itself (POSIX only)
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_voc_container(path, html, meta, images, codec="none", progress=None):
+    """
+    Atomically write a v2 .voc file. images maps key -> raw image bytes;
+    codec names the VOC_CODECS entry used for the body and journal.
+    """
+    codec_id = VOC_CODEC_IDS[codec]
+    compress = VOC_CODECS[codec_id][1]
+    pieces = [
+        _VOC_HEADER.pack(VOC_MAGIC, VOC_VERSION, codec_id),
+        _pack_meta_chunk(meta),
+        _pack_chunk(b"BODY", compress(html.encode('utf-8'))),
+    ]
+    pieces.extend(_pack_image_chunk(key, data) for key, data in images.items())
+    atomic_write(path, pieces, progress)
+
+
+def append_voc_journal(path, entry, images, codec="none", progress=None, end=None):
+    """
+    Append new image blobs and one journal entry to an existing v2 file,
+    compressed with the codec named in its header.
+    A crash mid-append leaves a truncated tail, which readers ignore.
+    end is where the last complete chunk stops (VocContainer.end); such a
+    tail past it is cut off first, so the new chunks are not written after it.
+    """
+    compress = VOC_CODECS[VOC_CODEC_IDS[codec]][1]
+    pieces = [_pack_image_chunk(key, data) for key, data in images.items()]
+    pieces.append(_pack_chunk(b"JRNL", compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))))
+    with open(path, 'r+b') as f:
+        if end is None:
+            f.seek(0, os.SEEK_END)
+        else:
+            f.seek(end)
+            f.truncate()
+        _write_pieces(f, pieces, progress)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _meta_chunk_length(f):
+    # length of the leading META chunk, with f positioned at its payload; None if there is none
+    head = f.read(_VOC_HEADER.size + _VOC_CHUNK.size)
+    if len(head) < _VOC_HEADER.size + _VOC_CHUNK.size or head[:len(VOC_MAGIC)] != VOC_MAGIC:
+        return None
+    tag, length = _VOC_CHUNK.unpack_from(head, _VOC_HEADER.size)
+    if tag != b"META" or length > _VOC_META_MAX:
+        return None
+    return length
+
+
+def read_voc_header(path):
+    """
+    META of a v2 file, read from the first chunk without indexing the rest.
+    {} for v1 files and anything unreadable.
+    """
+    try:
+        with open(path, 'rb') as f:
+            length = _meta_chunk_length(f)
+            if length is None:
+                return {}
+            meta = json.loads(f.read(length).decode('utf-8'))
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def rewrite_voc_meta(path, meta):
+    """
+    Overwrite META in place if it fits the space reserved for it.
+    Returns False (leaving the file alone) if it does not; the next full save rewrites it.
+    """
+    data = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    with open(path, 'r+b') as f:
+        length = _meta_chunk_length(f)
+        if length is None or len(data) > length:
+            return False
+        f.write(data.ljust(length, b" "))
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+class VocContainer:
+    """
+    Random-access reader for a v2 .voc file.
+    Only chunk headers are read up front; payloads are read when asked for.
+    Given data, the file's bytes already in memory, it reads those instead.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self._data = data
+        self.codec = "none"
+        # offset just past the last complete chunk
+        self.end = 0
+        self._stamp = None
+        self._chunks = []
+        self._images = {}
+        # the save worker and the GUI thread both read through the container
+        self._lock = threading.Lock()
+        self._index()
+
+    def _open(self):
+        return io.BytesIO(self._data) if self._data is not None else open(self.path, 'rb')
+
+    def _index(self):
+        size = len(self._data) if self._data is not None else os.stat(self.path).st_size
+        chunks = []
+        images = {}
+        with self._open() as f:
+            magic, version, codec_id = _VOC_HEADER.unpack(f.read(_VOC_HEADER.size))
+            if magic != VOC_MAGIC:
+                raise ValueError("not a v2 .voc file")
+            if version > VOC_VERSION:
+                raise ValueError(f"unsupported .voc version {version}")
+            if codec_id not in VOC_CODECS:
+                raise ValueError(f"unsupported .voc codec {codec_id}")
+            offset = _VOC_HEADER.size
+            while True:
+                head = f.read(_VOC_CHUNK.size)
+                if len(head) < _VOC_CHUNK.size:
+                    break
+                tag, length = _VOC_CHUNK.unpack(head)
+                start = offset + _VOC_CHUNK.size
+                if start + length > size:
+                    # truncated tail (interrupted write): ignore it
+                    break
+                if tag == b"IMAG":
+                    (klen,) = _VOC_IMAGE_KEY.unpack(f.read(_VOC_IMAGE_KEY.size))
+                    key = f.read(klen).decode('utf-8')
+                    data_start = start + _VOC_IMAGE_KEY.size + klen
+                    images[key] = (data_start, start + length - data_start)
+                chunks.append((tag, start, length))
+                offset = start + length
+                f.seek(offset)
+        self.codec = VOC_CODECS[codec_id][0]
+        self._chunks = chunks
+        self._images = images
+        self.end = offset
+        if self._data is None:
+            st = os.stat(self.path)
+            self._stamp = (st.st_mtime_ns, st.st_size)
+
+    def _ensure_fresh(self):
+        # the file may have been replaced or appended to since we indexed it
+        if self._data is not None:
+            return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if (st.st_mtime_ns, st.st_size) != self._stamp:
+            with self._lock:
+                self._index()
+
+    def _read(self, offset, length):
+        with self._open() as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def payloads(self, tag):
+        self._ensure_fresh()
+        found = [self._read(start, length) for t, start, length in self._chunks if t == tag]
+        if tag in _VOC_COMPRESSED_TAGS:
+            decompress = VOC_CODECS[VOC_CODEC_IDS[self.codec]][2]
+            found = [decompress(data) for data in found]
+        return found
+
+    def payload(self, tag):
+        found = self.payloads(tag)
+        return found[0] if found else None
+
+    def body_head(self, size):
+        """
+        The first size bytes or so of the body, decoded; only as much of
+        the file is read and decompressed as that takes. May end partway
+        through an element.
+        """
+        self._ensure_fresh()
+        loc = next(((start, length) for tag, start, length in self._chunks if tag == b"BODY"), None)
+        if loc is None:
+            return ""
+        start, length = loc
+        decoder = _VOC_STREAM_DECODERS[self.codec]() if self.codec != "none" else None
+        out = bytearray()
+        with self._open() as f:
+            f.seek(start)
+            while length > 0 and len(out) < size:
+                piece = f.read(min(length, _VOC_STREAM_SLICE))
+                if not piece:
+                    break
+                length -= len(piece)
+                out += decoder.decompress(piece) if decoder is not None else piece
+        # a character cut in two at the end is dropped
+        return bytes(out[:size]).decode('utf-8', 'ignore')
+
+    def chunk_lengths(self, tag):
+        self._ensure_fresh()
+        return [length for t, _start, length in self._chunks if t == tag]
+
+    def meta(self):
+        # rewrite_voc_meta() updates META in place, so a crash mid-write can leave
+        # it torn; it only holds the summary and settings, so fall back to defaults
+        data = self.payload(b"META")
+        try:
+            meta = json.loads(data.decode('utf-8')) if data else {}
+        except ValueError:
+            return {}
+        return meta if isinstance(meta, dict) else {}
+
+    def body(self):
+        data = self.payload(b"BODY")
+        return data.decode('utf-8') if data else ""
+
+    def journal(self):
+        return [json.loads(data.decode('utf-8')) for data in self.payloads(b"JRNL")]
+
+    def image_keys(self):
+        self._ensure_fresh()
+        return list(self._images)
+
+    def image(self, key):
+        self._ensure_fresh()
+        loc = self._images.get(key)
+        if loc is None:
+            return None
+        return self._read(*loc)
+
+
+def read_voc_file(path, data=None):
+    """
+    Open a .voc file of either version; from data, its bytes, if already read.
+    Returns (html, meta, container); container is None for v1 JSON files.
+    """
+    if data is not None:
+        if data.startswith(VOC_MAGIC):
+            container = VocContainer(path, data)
+            return container.body(), container.meta(), container
+        data = json.loads(data.decode("utf-8"))
+    elif is_voc_container(path):
+        container = VocContainer(path)
+        return container.body(), container.meta(), container
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    return data.get("content", ""), data.get("meta", {}), None
+
+
+class VocImageStore:
+    """
+    Content-addressed image blobs referenced from the document through
+    voc-img: URLs. Keys are SHA-256 digests, so identical images are stored
+    once however many times they appear. New blobs are held in memory; blobs
+    of the opened file stay on disk and are pulled from its container only
+    when needed.
+    """
+
+    def __init__(self, container=None):
+        self.container = container
+        self._blobs = {}
+
+    def add(self, data, key=None):
+        # key: the content hash when the caller already has it
+        key = key or hashlib.sha256(data).hexdigest()
+        if key not in self._blobs and not self._in_container(key):
+            self._blobs[key] = data
+        return key
+
+    def _in_container(self, key):
+        return self.container is not None and key in self.container.image_keys()
+
+    def get(self, key):
+        data = self._blobs.get(key)
+        if data is None and self.container is not None:
+            data = self.container.image(key)
+        return data
+
+    def held_bytes(self):
+        # what the blobs kept in memory take
+        return sum(len(data) for data in self._blobs.values())
+
+    def hold(self, keys):
+        # copy blobs into memory before the file holding them is replaced
+        for key in keys:
+            if key not in self._blobs:
+                data = self.get(key)
+                if data is not None:
+                    self._blobs[key] = data
+
+    def rebase(self, container, keys):
+        # keys have been written to container; drop the in-memory copies
+        self.container = container
+        for key in keys:
+            self._blobs.pop(key, None)
+
+
+def _voc_image_keys(src):
+    # voc-img:<key> or voc-img:<key>#<original key>
+    return src[len(VOC_IMAGE_SCHEME) + 1:].split('#')
+
+
+def _read_image_src(src):
+    """
+    (key, bytes) for the image behind an <img> src; bytes is None for voc-img:
+    srcs, and the result is None if the image cannot be read. Thread-safe.
+    """
+    lower = src.lower()
+    if lower.startswith(VOC_IMAGE_SCHEME + ':'):
+        return _voc_image_keys(src)[0], None
+    if lower.startswith('data:'):
+        dm = _DATA_URI_RE.match(src)
+        if not dm or not dm.group(2):
+            return None
+        try:
+            data = base64.b64decode(dm.group(3))
+        except (ValueError, TypeError):
+            return None
+        return hashlib.sha256(data).hexdigest(), data
+    try:
+        return FILE_IMAGE_CACHE.key(_file_url_to_path(src))
+    except OSError:
+        return None
+
+
+def _store_image_src(src, store):
+    """
+    Put the image behind an <img> src into store and return its key (None if unreadable).
+    """
+    found = _read_image_src(src)
+    if found is None:
+        return None
+    key, data = found
+    return key if data is None else store.add(data, key)
+
+
+IMAGE_WORKERS = min(8, os.cpu_count() or 1)
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+
+def _shared_image_pool():
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="voc-image")
+    return _image_pool
+
+
+def _map_images(func, items):
+    """
+    func over items on a shared thread pool, in order. File reads and hashing
+    release the GIL, so distinct images are read and hashed side by side.
+    """
+    items = list(items)
+    if len(items) < 2 or IMAGE_WORKERS < 2:
+        return [func(item) for item in items]
+    return list(_shared_image_pool().map(func, items))
+
+
+def _externalize_images(html, store, parallel=True):
+    """
+    Move file:// and data: images into store and point their src at voc-img: keys.
+    Returns (html, keys) where keys lists every image key the html references.
+    """
+    # the same src usually repeats many times: read and hash each distinct one once,
+    # all of them concurrently, then rewrite the html in a single pass
+    srcs = list(dict.fromkeys(m.group(2) for m in _IMG_SRC_RE.finditer(html)))
+    found = _map_images(_read_image_src, srcs) if parallel else [_read_image_src(src) for src in srcs]
+    src_keys = {}
+    for src, result in zip(srcs, found):
+        if result is not None:
+            key, data = result
+            src_keys[src] = key if data is None else store.add(data, key)
+    keys = {}
+
+    def repl(m):
+        src = m.group(2)
+        key = src_keys.get(src)
+        if key is None:
+            return m.group(0)
+        if src[:len(VOC_IMAGE_SCHEME) + 1].lower() == VOC_IMAGE_SCHEME + ':':
+            # already in the store; keep any #original part
+            keys.update(dict.fromkeys(_voc_image_keys(src)))
+            return m.group(0)
+        keys[key] = None
+        return f'src={m.group(1)}{VOC_IMAGE_SCHEME}:{key}{m.group(1)}'
+
+    html = _IMG_SRC_RE.sub(repl, html)
+    return html, list(keys)
+
+
+# ---------------------------
+# Canonical HTML serializer
+# ---------------------------
+# Qt's toHtml() repeats the full margin boilerplate on every paragraph and an
+# inline style on every span. serialize_document() writes the same formatting
+# once per distinct format as a CSS class, and leaves out block properties
+# that match what Qt assumes for a bare <p>. setHtml() of the result rebuilds
+# the same document.
+_P_DEFAULT_MARGINS = (12.0, 12.0, 0.0, 0.0)
+_ALIGN_NAMES = ((Qt.AlignHCenter, "center"), (Qt.AlignRight, "right"), (Qt.AlignJustify, "justify"))
+_SIZE_ADJUSTMENTS = {-1: "small", 0: "medium", 1: "large", 2: "x-large", 3: "xx-large"}
+_VALIGN_NAMES = {
+    QTextCharFormat.AlignSuperScript: "super",
+    QTextCharFormat.AlignSubScript: "sub",
+    QTextCharFormat.AlignMiddle: "middle",
+    QTextCharFormat.AlignTop: "top",
+    QTextCharFormat.AlignBottom: "bottom",
+}
+_CAPITALIZATIONS = {
+    QFont.SmallCaps: "font-variant:small-caps",
+    QFont.AllUppercase: "text-transform:uppercase",
+    QFont.AllLowercase: "text-transform:lowercase",
+    QFont.Capitalize: "text-transform:capitalize",
+}
+
+
+def _css_number(value):
+    return f"{value:g}"
+
+
+def _css_color(color):
+    if color.alpha() == 255:
+        return color.name()
+    return f"rgba({color.red()},{color.green()},{color.blue()},{color.alphaF():g})"
+
+
+def _html_escape(text):
+    return (text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+            .replace("\u2028", "<br />").replace("\u00a0", "&nbsp;"))
+
+
+def _char_css(fmt, default):
+    # mirrors what QTextHtmlExporter writes for a span, relative to the document default
+    css = []
+    families = fmt.fontFamilies() if fmt.hasProperty(QTextFormat.FontFamilies) else None
+    if families and len(families) > 1:
+        css.append("font-family:" + ",".join(f"'{family}'" for family in families))
+    elif fmt.fontFamily() and fmt.fontFamily() != default.fontFamily():
+        css.append(f"font-family:'{fmt.fontFamily()}'")
+    if fmt.hasProperty(QTextFormat.FontPointSize) and fmt.fontPointSize() != default.fontPointSize():
+        css.append(f"font-size:{_css_number(fmt.fontPointSize())}pt")
+    elif fmt.hasProperty(QTextFormat.FontPixelSize):
+        css.append(f"font-size:{fmt.intProperty(QTextFormat.FontPixelSize)}px")
+    elif fmt.hasProperty(QTextFormat.FontSizeAdjustment):
+        adjustment = fmt.intProperty(QTextFormat.FontSizeAdjustment)
+        if adjustment in _SIZE_ADJUSTMENTS:
+            css.append(f"font-size:{_SIZE_ADJUSTMENTS[adjustment]}")
+    if fmt.hasProperty(QTextFormat.FontWeight) and fmt.fontWeight() != default.fontWeight():
+        css.append(f"font-weight:{fmt.fontWeight() * 8}")
+    if fmt.hasProperty(QTextFormat.FontItalic) and fmt.fontItalic() != default.fontItalic():
+        css.append("font-style:" + ("italic" if fmt.fontItalic() else "normal"))
+    decorations = []
+    has_decoration = False
+    for prop, value, flag in ((QTextFormat.FontUnderline, fmt.fontUnderline(), "underline"),
+                              (QTextFormat.FontOverline, fmt.fontOverline(), "overline"),
+                              (QTextFormat.FontStrikeOut, fmt.fontStrikeOut(), "line-through")):
+        default_value = {"underline": default.fontUnderline(), "overline": default.fontOverline(),
+                         "line-through": default.fontStrikeOut()}[flag]
+        if (fmt.hasProperty(prop) or (flag == "underline" and fmt.hasProperty(QTextFormat.TextUnderlineStyle))) \
+                and value != default_value:
+            has_decoration = True
+            if value:
+                decorations.append(flag)
+    if has_decoration:
+        css.append("text-decoration:" + (" ".join(decorations) if decorations else "none"))
+    if fmt.foreground() != default.foreground() and fmt.foreground().style() != Qt.NoBrush:
+        css.append(f"color:{_css_color(fmt.foreground().color())}")
+    if fmt.background() != default.background() and fmt.background().style() == Qt.SolidPattern:
+        css.append(f"background-color:{_css_color(fmt.background().color())}")
+    valign = fmt.verticalAlignment()
+    if valign != default.verticalAlignment() and valign in _VALIGN_NAMES:
+        css.append(f"vertical-align:{_VALIGN_NAMES[valign]}")
+    if fmt.hasProperty(QTextFormat.FontCapitalization) and fmt.fontCapitalization() in _CAPITALIZATIONS:
+        css.append(_CAPITALIZATIONS[fmt.fontCapitalization()])
+    if fmt.hasProperty(QTextFormat.FontLetterSpacing):
+        unit = "%" if fmt.fontLetterSpacingType() == QFont.PercentageSpacing else "px"
+        css.append(f"letter-spacing:{_css_number(fmt.fontLetterSpacing())}{unit}")
+    if fmt.hasProperty(QTextFormat.FontWordSpacing):
+        css.append(f"word-spacing:{_css_number(fmt.fontWordSpacing())}px")
+    return ";".join(css)
+
+
+def _block_css(block, in_list):
+    fmt = block.blockFormat()
+    css = []
+    margins = (fmt.topMargin(), fmt.bottomMargin(), fmt.leftMargin(), fmt.rightMargin())
+    defaults = (0.0, 0.0, 0.0, 0.0) if in_list else _P_DEFAULT_MARGINS
+    for name, value, default in zip(("margin-top", "margin-bottom", "margin-left", "margin-right"), margins, defaults):
+        # headings come with their own default margins, so they always spell them out
+        if value != default or (fmt.headingLevel() and name in ("margin-top", "margin-bottom")):
+            css.append(f"{name}:{_css_number(value)}px")
+    if fmt.indent():
+        css.append(f"-qt-block-indent:{fmt.indent()}")
+    if fmt.textIndent():
+        css.append(f"text-indent:{_css_number(fmt.textIndent())}px")
+    if fmt.hasProperty(QTextFormat.LineHeight) and fmt.lineHeightType() != QTextBlockFormat.SingleHeight:
+        kinds = {QTextBlockFormat.ProportionalHeight: "%", QTextBlockFormat.MinimumHeight: "px",
+                 QTextBlockFormat.FixedHeight: ";-qt-line-height-type:fixed",
+                 QTextBlockFormat.LineDistanceHeight: ";-qt-line-height-type:line-distance"}
+        unit = kinds.get(fmt.lineHeightType())
+        if unit:
+            css.append(f"line-height:{_css_number(fmt.lineHeight())}{unit}")
+    if fmt.hasProperty(QTextFormat.BackgroundBrush) and fmt.background().style() == Qt.SolidPattern:
+        css.append(f"background-color:{_css_color(fmt.background().color())}")
+    if fmt.nonBreakableLines():
+        css.append("white-space:pre")
+    if fmt.pageBreakPolicy() & QTextFormat.PageBreak_AlwaysBefore:
+        css.append("page-break-before:always")
+    if fmt.pageBreakPolicy() & QTextFormat.PageBreak_AlwaysAfter:
+        css.append("page-break-after:always")
+    return ";".join(css)
+
+
+_LIST_STYLES = {
+    QTextListFormat.ListDisc: ("ul", "disc"), QTextListFormat.ListCircle: ("ul", "circle"),
+    QTextListFormat.ListSquare: ("ul", "square"), QTextListFormat.ListDecimal: ("ol", "decimal"),
+    QTextListFormat.ListLowerAlpha: ("ol", "lower-alpha"), QTextListFormat.ListUpperAlpha: ("ol", "upper-alpha"),
+    QTextListFormat.ListLowerRoman: ("ol", "lower-roman"), QTextListFormat.ListUpperRoman: ("ol", "upper-roman"),
+}
+_BORDER_STYLES = {
+    QTextFrameFormat.BorderStyle_None: "none", QTextFrameFormat.BorderStyle_Dotted: "dotted",
+    QTextFrameFormat.BorderStyle_Dashed: "dashed", QTextFrameFormat.BorderStyle_Solid: "solid",
+    QTextFrameFormat.BorderStyle_Double: "double", QTextFrameFormat.BorderStyle_DotDash: "dot-dash",
+    QTextFrameFormat.BorderStyle_DotDotDash: "dot-dot-dash", QTextFrameFormat.BorderStyle_Groove: "groove",
+    QTextFrameFormat.BorderStyle_Ridge: "ridge", QTextFrameFormat.BorderStyle_Inset: "inset",
+}
+# per-cell padding, borders and alignment; documents using them go through toHtml()
+_CELL_STYLE_PROPERTIES = tuple(getattr(QTextFormat, f"TableCell{side}{kind}")
+                               for side in ("Top", "Bottom", "Left", "Right")
+                               for kind in ("Padding", "Border", "BorderBrush", "BorderStyle")) \
+    + (QTextFormat.TextVerticalAlignment,)
+
+
+class _Unserializable(Exception):
+    pass
+
+
+class _HtmlSerializer:
+    def __init__(self, document):
+        self.document = document
+        self.default = QTextCharFormat()
+        self.default.setFont(document.defaultFont())
+        self.classes = {}
+        self.block_markup = {}
+        self.char_markup = {}
+        self.list_items = {}
+        # closing tags of list items that stay open around a nested list, innermost last
+        self.closing = []
+        self.out = []
+
+    def _class(self, prefix, css):
+        name = self.classes.get((prefix, css))
+        if name is None:
+            name = self.classes[(prefix, css)] = f"{prefix}{len(self.classes)}"
+        return name
+
+    def _attrs(self, prefix, css):
+        return f' class="{self._class(prefix, css)}"' if css else ""
+
+    def run(self):
+        self._frame(self.document.rootFrame())
+        body = "".join(self.out)
+        rules = "".join(f".{name}{{{css}}}" for (prefix, css), name in self.classes.items())
+        # no font on <body>: setHtml() would copy it into every block's char format,
+        # which toHtml() then writes out as an empty style on each list item.
+        # Text in the default font reads back in the reader's default font.
+        return ('<html><head><meta name="qrichtext" content="1" /><style type="text/css">'
+                f'p, li {{ white-space: pre-wrap; }}{rules}</style></head>'
+                f'<body>{body}</body></html>')
+
+    def _frame(self, frame):
+        it = frame.begin()
+        while not it.atEnd():
+            child = it.currentFrame()
+            block = it.currentBlock()
+            it += 1
+            if child is not None:
+                self._child_frame(child)
+            elif block.isValid():
+                self._block(block)
+
+    def _child_frame(self, frame):
+        if not isinstance(frame, QTextTable):
+            raise _Unserializable("text frame")
+        self._table(frame)
+
+    def _cell(self, table, cell, nested):
+        block = cell.firstCursorPosition().block()
+        end = cell.lastCursorPosition().position()
+        while block.isValid() and block.position() <= end:
+            frame = QTextCursor(block).currentFrame() if nested else table
+            if frame.objectIndex() == table.objectIndex():
+                self._block(block)
+                block = block.next()
+                continue
+            # a table inside the cell: write it whole, then carry on after it
+            while frame.parentFrame().objectIndex() != table.objectIndex():
+                frame = frame.parentFrame()
+            self._child_frame(frame)
+            block = frame.lastCursorPosition().block().next()
+
+    def _list_item(self, lst, block):
+        # QTextList.itemNumber() is a linear search, so index each list once
+        items = self.list_items.get(lst.objectIndex())
+        if items is None:
+            items = self.list_items[lst.objectIndex()] = {lst.item(i).blockNumber(): i for i in range(lst.count())}
+        return items[block.blockNumber()], len(items)
+
+    def _open_list(self, lst):
+        fmt = lst.format()
+        tag, kind = _LIST_STYLES.get(fmt.style(), ("ul", "disc"))
+        css = f"margin-top:0px;margin-bottom:0px;margin-left:0px;margin-right:0px;-qt-list-indent:{fmt.indent()}"
+        if kind not in ("disc", "decimal"):
+            css += f";list-style-type:{kind}"
+        if fmt.hasProperty(QTextFormat.ListNumberPrefix):
+            css += f";-qt-list-number-prefix:'{fmt.numberPrefix()}'"
+        if fmt.hasProperty(QTextFormat.ListNumberSuffix):
+            css += f";-qt-list-number-suffix:'{fmt.numberSuffix()}'"
+        self.out.append(f'<{tag} style="{_html_escape(css)}">')
+
+    def _block(self, block):
+        it = block.begin()
+        if it.atEnd() and block.position() > 0 and \
+                self.document.characterAt(block.position() - 1) in ("\ufdd0", "\ufdd1"):
+            # the empty block Qt keeps right before/after a table; setHtml() recreates it
+            return
+        lst = block.textList()
+        key = (block.blockFormatIndex(), lst is not None)
+        markup = self.block_markup.get(key)
+        if markup is None:
+            markup = self.block_markup[key] = self._block_markup(block, lst is not None)
+        tag, attrs, css, opening = markup
+        if tag == "hr":
+            self.out.append(opening)
+            return
+        append = self.out.append
+        if lst is not None:
+            number, count = self._list_item(lst, block)
+            if number == 0:
+                self._open_list(lst)
+        if it.atEnd():
+            # Qt drops empty paragraphs unless they are marked as such; a background
+            # there would read back as the paragraph's, so leave it out like toHtml() does
+            char_fmt = block.charFormat()
+            char_fmt.clearProperty(QTextFormat.BackgroundBrush)
+            char_css = _char_css(char_fmt, self.default)
+            style = "-qt-paragraph-type:empty" + (";" + css if css else "") + (";" + char_css if char_css else "")
+            append(f'<{tag}{attrs} style="{style}"><br />')
+        else:
+            if lst is not None:
+                # the list marker is drawn with the block's char format
+                char_css = _char_css(block.charFormat(), self.default)
+                if char_css:
+                    opening = f'<{tag}{attrs} style="{char_css}"{self._attrs("b", css)}>'
+            append(opening)
+            char_markup = self.char_markup
+            while not it.atEnd():
+                frag = it.fragment()
+                index = frag.charFormatIndex()
+                markup = char_markup.get(index)
+                if markup is None:
+                    markup = char_markup[index] = self._char_markup(frag.charFormat())
+                if markup[1] is None:
+                    append(markup[0] * frag.length())
+                else:
+                    append(markup[0] + _html_escape(frag.text()) + markup[1])
+                it += 1
+        close = f"</{tag}>"
+        if lst is None:
+            append(close)
+            return
+        # same nesting as QTextHtmlExporter: an item followed by a deeper list
+        # stays open until that list has ended
+        last = number == count - 1
+        if last:
+            close += f"</{_LIST_STYLES.get(lst.format().style(), ('ul',))[0]}>"
+        following = block.next()
+        sublist = following.textList() if following.isValid() else None
+        if sublist is not None and self._list_item(sublist, following)[0] == 0 \
+                and sublist.format().indent() > lst.format().indent():
+            self.closing.append(close + (self.closing.pop() if self.closing and last else ""))
+        else:
+            append(close)
+            if last and self.closing:
+                append(self.closing.pop())
+
+    def _block_markup(self, block, in_list):
+        fmt = block.blockFormat()
+        if fmt.hasProperty(QTextFormat.BlockTrailingHorizontalRulerWidth):
+            if in_list:
+                raise _Unserializable("horizontal rule in a list")
+            width = fmt.lengthProperty(QTextFormat.BlockTrailingHorizontalRulerWidth)
+            if width.type() == QTextLength.PercentageLength:
+                return "hr", "", "", f'<hr width="{_css_number(width.rawValue())}%" />'
+            if width.type() == QTextLength.FixedLength:
+                return "hr", "", "", f'<hr width="{_css_number(width.rawValue())}" />'
+            return "hr", "", "", "<hr />"
+        tag = "li" if in_list else f"h{fmt.headingLevel()}" if fmt.headingLevel() else "p"
+        attrs = ""
+        align = fmt.alignment() & Qt.AlignHorizontal_Mask
+        for flag, name in _ALIGN_NAMES:
+            if align & flag == flag and align != Qt.AlignLeft:
+                attrs += f' align="{name}"'
+                break
+        if fmt.hasProperty(QTextFormat.LayoutDirection) and fmt.layoutDirection() != Qt.LayoutDirectionAuto:
+            attrs += ' dir="rtl"' if fmt.layoutDirection() == Qt.RightToLeft else ' dir="ltr"'
+        css = _block_css(block, in_list)
+        return tag, attrs, css, f"<{tag}{attrs}{self._attrs('b', css)}>"
+
+    def _char_markup(self, fmt):
+        # (open, close) around a fragment's text; (tag, None) for images, one tag per character
+        if fmt.isImageFormat():
+            img = fmt.toImageFormat()
+            attrs = f' src="{_html_escape(img.name())}"' if img.name() else ""
+            if img.hasProperty(QTextFormat.ImageWidth):
+                attrs += f' width="{_css_number(img.width())}"'
+            if img.hasProperty(QTextFormat.ImageHeight):
+                attrs += f' height="{_css_number(img.height())}"'
+            return f"<img{attrs} />", None
+        opening = closing = ""
+        css = _char_css(fmt, self.default)
+        if css:
+            opening, closing = f'<span class="{self._class("c", css)}">', "</span>"
+        if fmt.isAnchor():
+            if fmt.anchorHref():
+                opening, closing = f'<a href="{_html_escape(fmt.anchorHref())}">' + opening, closing + "</a>"
+            opening = "".join(f'<a name="{_html_escape(name)}"></a>' for name in fmt.anchorNames()) + opening
+        return opening, closing
+
+    def _table(self, table):
+        fmt = table.format()
+        attrs = f' border="{_css_number(fmt.border())}"'
+        align = fmt.alignment() & Qt.AlignHorizontal_Mask
+        for flag, name in _ALIGN_NAMES:
+            if align & flag == flag and align != Qt.AlignLeft:
+                attrs += f' align="{name}"'
+                break
+        width = fmt.width()
+        if width.type() == QTextLength.PercentageLength:
+            attrs += f' width="{_css_number(width.rawValue())}%"'
+        elif width.type() == QTextLength.FixedLength:
+            attrs += f' width="{_css_number(width.rawValue())}"'
+        attrs += f' cellspacing="{_css_number(fmt.cellSpacing())}" cellpadding="{_css_number(fmt.cellPadding())}"'
+        if fmt.hasProperty(QTextFormat.BackgroundBrush) and fmt.background().style() == Qt.SolidPattern:
+            attrs += f' bgcolor="{_css_color(fmt.background().color())}"'
+        css = []
+        if fmt.hasProperty(QTextFormat.FrameBorderBrush) and fmt.borderBrush().style() == Qt.SolidPattern:
+            css.append(f"border-color:{_css_color(fmt.borderBrush().color())}")
+        if fmt.hasProperty(QTextFormat.FrameBorderStyle) and fmt.borderStyle() in _BORDER_STYLES:
+            css.append(f"border-style:{_BORDER_STYLES[fmt.borderStyle()]}")
+        if fmt.position() == QTextFrameFormat.FloatLeft:
+            css.append("float:left")
+        elif fmt.position() == QTextFrameFormat.FloatRight:
+            css.append("float:right")
+        margins = (fmt.topMargin(), fmt.bottomMargin(), fmt.leftMargin(), fmt.rightMargin())
+        css.extend(f"{n}:{_css_number(v)}px" for n, v in
+                   zip(("margin-top", "margin-bottom", "margin-left", "margin-right"), margins) if v)
+        if fmt.pageBreakPolicy() & QTextFormat.PageBreak_AlwaysBefore:
+            css.append("page-break-before:always")
+        if fmt.pageBreakPolicy() & QTextFormat.PageBreak_AlwaysAfter:
+            css.append("page-break-after:always")
+        if fmt.borderCollapse():
+            css.append("border-collapse:collapse")
+        self.out.append(f"<table{attrs}{self._attrs('t', ';'.join(css))}>")
+        column_widths = [w if w.type() != QTextLength.VariableLength else None
+                         for w in fmt.columnWidthConstraints()]
+        header_rows = fmt.headerRowCount()
+        nested = bool(table.childFrames())
+        for row in range(table.rows()):
+            if row == 0 and header_rows > 0:
+                self.out.append("<thead>")
+            self.out.append("<tr>")
+            for col in range(table.columns()):
+                cell = table.cellAt(row, col)
+                if cell.row() != row or cell.column() != col:
+                    continue
+                cell_attrs = ""
+                if cell.rowSpan() > 1:
+                    cell_attrs += f' rowspan="{cell.rowSpan()}"'
+                if cell.columnSpan() > 1:
+                    cell_attrs += f' colspan="{cell.columnSpan()}"'
+                elif col < len(column_widths) and column_widths[col] is not None:
+                    # toHtml() puts a column's width on its first unspanned cell
+                    width, column_widths[col] = column_widths[col], None
+                    unit = "%" if width.type() == QTextLength.PercentageLength else ""
+                    cell_attrs += f' width="{_css_number(width.rawValue())}{unit}"'
+                cell_fmt = cell.format()
+                if any(cell_fmt.hasProperty(prop) for prop in _CELL_STYLE_PROPERTIES):
+                    raise _Unserializable("table cell style")
+                if cell_fmt.background().style() == Qt.SolidPattern:
+                    cell_attrs += f' bgcolor="{_css_color(cell_fmt.background().color())}"'
+                self.out.append(f"<td{cell_attrs}>")
+                self._cell(table, cell, nested)
+                self.out.append("</td>")
+            self.out.append("</tr>")
+            if row == header_rows - 1:
+                self.out.append("</thead>")
+        self.out.append("</table>")
+
+
+def serialize_document(document):
+    """
+    Compact, canonical HTML for document; setHtml() of it restores the same content.
+    Documents using a construct the serializer does not write come back as toHtml().
+    """
+    try:
+        return _HtmlSerializer(document).run()
+    except _Unserializable:
+        return document.toHtml()
+
+
+# ---------------------------
+# Edit journal (incremental saves)
+# ---------------------------
+# A journal entry replaces `removed` top-level blocks starting at block `start`
+# of the previously saved document with the blocks held in `html`.
+def _copy_block_format(src_block, dst_block):
+    # inserting a fragment keeps every block format except the first one's
+    cursor = QTextCursor(dst_block)
+    if src_block.textList() is None:
+        # a list item's format points at a list object of the source document
+        cursor.setBlockFormat(src_block.blockFormat())
+    cursor.setBlockCharFormat(src_block.charFormat())
+
+
+def _select_blocks(document, first, last):
+    first_block = document.findBlockByNumber(first)
+    last_block = document.findBlockByNumber(last)
+    cursor = QTextCursor(document)
+    cursor.setPosition(first_block.position())
+    cursor.setPosition(last_block.position() + last_block.length() - 1, QTextCursor.KeepAnchor)
+    return cursor
+
+
+def make_journal_entry(document, start, removed, last):
+    # fragments drop the first block's format, so rebuild the run as a document
+    part = QTextDocument()
+    QTextCursor(part).insertFragment(QTextDocumentFragment(_select_blocks(document, start, last)))
+    _copy_block_format(document.findBlockByNumber(start), part.firstBlock())
+    return {"start": start, "removed": removed, "html": serialize_document(part)}
+
+
+def apply_journal(document, entries):
+    for entry in entries:
+        start = entry["start"]
+        part = QTextDocument()
+        part.setHtml(entry["html"])
+        cursor = _select_blocks(document, start, start + entry["removed"] - 1)
+        cursor.insertFragment(QTextDocumentFragment(part))
+        _copy_block_format(part.firstBlock(), document.findBlockByNumber(start))
+
+
+class BlockChangeTracker:
+    """
+    Follows QTextDocument.contentsChange to keep the run of top-level blocks
+    changed since the last save, as a count of untouched blocks at each end.
+    A save is only taken as the new baseline once it has reached the disk:
+    begin_save() notes the document as a save job snapshots it, and
+    commit() or invalidate() settle it when the job is done.
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self._next_token = 0
+        document.contentsChange.connect(self._on_contents_change)
+        self.reset()
+
+    def _saved_state(self):
+        # [block count, table block ranges, head, tail] of the document as it is now
+        doc = self.document
+        # block ranges of tables in the saved document; splicing into them is not safe
+        tables = []
+        for frame in doc.rootFrame().childFrames():
+            if not isinstance(frame, QTextTable):
+                continue
+            tables.append((frame.firstCursorPosition().block().blockNumber(),
+                           frame.lastCursorPosition().block().blockNumber()))
+        return [doc.blockCount(), tables, None, None]
+
+    def reset(self):
+        self.valid = True
+        self.saved_blocks, self.saved_tables, self.head, self.tail = self._saved_state()
+        # token -> saved state of each save job still in flight
+        self._pending = {}
+
+    def begin_save(self):
+        self._next_token += 1
+        self._pending[self._next_token] = self._saved_state()
+        return self._next_token
+
+    def commit(self, token):
+        # the save job behind token succeeded: what it snapshotted is now on disk
+        state = self._pending.pop(token, None)
+        if state is None:
+            # the document was reloaded meanwhile
+            return
+        for older in [t for t in self._pending if t < token]:
+            del self._pending[older]
+        self.valid = True
+        self.saved_blocks, self.saved_tables, self.head, self.tail = state
+
+    def invalidate(self, token=None):
+        # a save failed: what is on disk is unknown, so only a full save is safe
+        self._pending.pop(token, None)
+        self.valid = False
+
+    @property
+    def saving(self):
+        return bool(self._pending)
+
+    @property
+    def dirty(self):
+        return self.head is not None or not self.valid
+
+    def _on_contents_change(self, position, removed, added):
+        doc = self.document
+        first = doc.findBlock(position).blockNumber()
+        last = doc.findBlock(min(position + added, doc.characterCount() - 1)).blockNumber()
+        tail = doc.blockCount() - 1 - last
+        if self.head is None:
+            self.head, self.tail = first, tail
+        else:
+            self.head = min(self.head, first)
+            self.tail = min(self.tail, tail)
+        for state in self._pending.values():
+            if state[2] is None:
+                state[2], state[3] = first, tail
+            else:
+                state[2] = min(state[2], first)
+                state[3] = min(state[3], tail)
+
+    def span(self):
+        """
+        (start, removed, last) for the changed run, or None if it cannot be journaled.
+        """
+        if not self.valid:
+            return None
+        doc = self.document
+        start, tail = self.head, self.tail
+        removed = self.saved_blocks - start - tail
+        if removed < 1:
+            # pure insertion between blocks: widen to a neighbour so something is replaced
+            if start > 0:
+                start -= 1
+            elif tail > 0:
+                tail -= 1
+            removed = self.saved_blocks - start - tail
+        last = doc.blockCount() - 1 - tail
+        if removed < 1 or last < start:
+            return None
+        run = self._whole_lists(start, last)
+        if run is None:
+            return None
+        # the blocks taken in were not changed, so they are in the saved document too
+        removed += start - run[0] + run[1] - last
+        start, last = run
+        for first_table, last_table in self.saved_tables:
+            if first_table <= start + removed - 1 and start <= last_table:
+                return None
+        block = doc.findBlockByNumber(start)
+        while block.isValid() and block.blockNumber() <= last:
+            if QTextCursor(block).currentTable() is not None:
+                return None
+            block = block.next()
+        return start, removed, last
+
+    def _whole_lists(self, start, last):
+        # (start, last) grown to hold every list it touches whole, so the items
+        # land in one list again, and to open with a block outside any list: a
+        # fragment that opens with a list item brings an empty paragraph along.
+        # None if that would reach the start of the document.
+        doc = self.document
+        while True:
+            first, end = start, last
+            block = doc.findBlockByNumber(start)
+            while block.isValid() and block.blockNumber() <= last:
+                lst = block.textList()
+                if lst is not None:
+                    start = min(start, lst.item(0).blockNumber())
+                    last = max(last, lst.item(lst.count() - 1).blockNumber())
+                block = block.next()
+            if doc.findBlockByNumber(start).textList() is not None:
+                if start == 0:
+                    return None
+                start -= 1
+            if (start, last) == (first, end):
+                return start, last
+
+
+# ---------------------------
+# Progressive loading
+# ---------------------------
+FIRST_SCREEN_BLOCKS = 60
+LOAD_BATCH_BLOCKS = 200
+LOAD_SLICE_MS = 12
+
+_HTML_TAG_RE = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^>]*?(/?)>|<!--.*?-->', re.DOTALL)
+_HTML_VOID_TAGS = {'img', 'br', 'hr', 'meta', 'link', 'input', 'col', 'area', 'base', 'wbr'}
+_PLAIN_BLOCK_RE = re.compile(r'<(?:p|h[1-6])\b', re.IGNORECASE)
+
+
+def split_html_body(html):
+    """
+    Split Qt rich text into (head, body, tail): head runs through <body ...>,
+    tail starts at </body>.
+    """
+    m = re.search(r'<body[^>]*>', html, re.IGNORECASE)
+    end = html.lower().rfind('</body>')
+    if not m or end < m.end():
+        return "", html, ""
+    return html[:m.end()], html[m.end():end], html[end:]
+
+
+def iter_html_units(body):
+    """
+    Yield runs of top-level elements of body that can be appended to a
+    document one after another. Tables and lists stay together with the
+    paragraphs around them, since Qt pads a fragment that starts or ends
+    with one with an empty paragraph. Lazy, so the first screenful does
+    not wait for the whole body to be scanned.
+    """
+    unit = None
+    last_plain = True
+    depth = 0
+    start = None
+    for t in _HTML_TAG_RE.finditer(body):
+        name = t.group(2)
+        if name is None:
+            continue
+        element = None
+        if t.group(1):
+            depth -= 1
+            if depth == 0:
+                element = body[start:t.end()]
+        else:
+            if depth == 0:
+                start = t.start()
+            if t.group(3) or name.lower() in _HTML_VOID_TAGS:
+                if depth == 0:
+                    element = body[start:t.end()]
+            else:
+                depth += 1
+        if element is None:
+            continue
+        plain = _PLAIN_BLOCK_RE.match(element) is not None
+        if unit is not None and not (plain and last_plain):
+            unit += element
+        else:
+            if unit is not None:
+                yield unit
+            unit = element
+        last_plain = plain
+    if unit is not None:
+        yield unit
+
+
+def append_html_blocks(document, head, units, tail):
+    """
+    Append units from iter_html_units to the end of document.
+    """
+    part = QTextDocument()
+    part.setHtml(head + "".join(units) + tail)
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.End)
+    cursor.beginEditBlock()
+    cursor.insertBlock()
+    first = document.lastBlock()
+    cursor.insertFragment(QTextDocumentFragment(part))
+    _copy_block_format(part.firstBlock(), first)
+    cursor.endEditBlock()
+
+
+class ProgressiveLoader(QObject):
+    """
+    Shows the first screenful of a document at once and appends the rest in
+    time-sliced batches from the event loop, so the window stays live while
+    large documents load. The editor is read-only until loading finishes.
+    """
+    finished = pyqtSignal()
+
+    def __init__(self, editor, html, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.head, body, self.tail = split_html_body(html)
+        self._units = iter_html_units(body)
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+        self.active = False
+
+    def start(self):
+        doc = self.editor.document()
+        self.active = True
+        self.editor.setReadOnly(True)
+        doc.setUndoRedoEnabled(False)
+        self.editor.setHtml(self.head + "".join(itertools.islice(self._units, FIRST_SCREEN_BLOCKS)) + self.tail)
+        self._timer.start()
+
+    def _step(self):
+        clock = QElapsedTimer()
+        clock.start()
+        doc = self.editor.document()
+        while clock.elapsed() < LOAD_SLICE_MS:
+            batch = list(itertools.islice(self._units, LOAD_BATCH_BLOCKS))
+            if not batch:
+                self._finish()
+                return
+            append_html_blocks(doc, self.head, batch, self.tail)
+
+    def finish_now(self):
+        """
+        Load whatever is left synchronously (e.g. before a save).
+        """
+        if not self.active:
+            return
+        rest = list(self._units)
+        if rest:
+            append_html_blocks(self.editor.document(), self.head, rest, self.tail)
+        self._finish()
+
+    def cancel(self):
+        if self.active:
+            self._stop()
+
+    def _stop(self):
+        self._timer.stop()
+        self.active = False
+        self.editor.document().setUndoRedoEnabled(True)
+        self.editor.setReadOnly(False)
+
+    def _finish(self):
+        self._stop()
+        self.finished.emit()
+
+
+# ---------------------------
+# Document summary (META header)
+# ---------------------------
+VOC_SUMMARY_TITLE_CHARS = 80
+VOC_SUMMARY_PREVIEW_CHARS = 160
+VOC_THUMBNAIL_SIZE = 96
+
+# CJK has no spaces between words: count each character as one
+_CJK_CHAR_RE = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+_FIRST_LINE_RE = re.compile(r'[^\s\ufffc][^\n]*')
+
+
+def first_image_name(document):
+    # images are U+FFFC object characters in the document text
+    found = document.find("\ufffc")
+    if found.isNull():
+        return None
+    return found.charFormat().toImageFormat().name() or None
+
+
+def make_thumbnail(data, size=VOC_THUMBNAIL_SIZE):
+    """
+    A data: URI of the image scaled to fit size x size, or None if it cannot be decoded.
+    """
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    fmt = "PNG" if image.hasAlphaChannel() else "JPEG"
+    buf = QBuffer()
+    buf.open(QIODevice.WriteOnly)
+    image.save(buf, fmt, 80)
+    return f"data:image/{fmt.lower()};base64," + base64.b64encode(bytes(buf.data())).decode('ascii')
+
+
+def document_summary(text, first_image, store):
+    """
+    Summary for META from the document's plain text and its first image src.
+    Safe to run off the GUI thread.
+    """
+    images = text.count("\ufffc")
+    text = text.replace("\ufffc", " ")
+    title = ""
+    preview = ""
+    m = _FIRST_LINE_RE.search(text)
+    if m:
+        title = m.group(0).strip()[:VOC_SUMMARY_TITLE_CHARS]
+        rest = text[m.end():m.end() + VOC_SUMMARY_PREVIEW_CHARS * 8]
+        preview = " ".join(rest.split())[:VOC_SUMMARY_PREVIEW_CHARS]
+    thumbnail = None
+    if first_image:
+        key = _store_image_src(first_image, store)
+        data = store.get(key) if key else None
+        if data is not None:
+            thumbnail = make_thumbnail(data)
+    return {
+        "title": title,
+        "preview": preview,
+        "words": len(_CJK_CHAR_RE.sub(" . ", text).split()),
+        "chars": len(text) - text.count("\n") - images,
+        "images": images,
+        "modified": int(time.time()),
+        "thumbnail": thumbnail,
+    }
+
+
+# ---------------------------
+# Image ingestion
+# ---------------------------
+IMAGE_DISPLAY_WIDTH = 600
+# preset -> (stored pixels relative to the displayed size, JPEG quality); None stores the file as is
+IMAGE_QUALITY_PRESETS = {
+    "original": None,
+    "high": (2.0, 90),
+    "standard": (1.0, 82),
+}
+IMAGE_DEFAULT_QUALITY = "high"
+# upper bound on the pixels of a stored image, whatever the preset
+IMAGE_PIXEL_BUDGET = 4_000_000
+
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _header_image_size(f):
+    """
+    (width, height) from the header of a PNG, GIF, BMP or JPEG file, or None.
+    """
+    head = f.read(26)
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head.startswith(b'BM') and len(head) >= 26:
+        w, h = struct.unpack('<ii', head[18:26])
+        return w, abs(h)
+    if head.startswith(b'\xff\xd8'):
+        # walk the segments up to the first start-of-frame
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                continue
+            length = f.read(2)
+            if len(length) < 2:
+                return None
+            (length,) = struct.unpack('>H', length)
+            if marker[1] in _JPEG_SOF_MARKERS:
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None
+                h, w = struct.unpack('>HH', frame[1:5])
+                return w, h
+            f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+def probe_image_size(path):
+    """
+    (width, height) of an image file without decoding it: parsed from the
+    header for PNG/GIF/BMP/JPEG, otherwise asked of the Qt image plugin.
+    None if neither can tell.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = _header_image_size(f)
+    except (OSError, struct.error):
+        size = None
+    if size and size[0] > 0 and size[1] > 0:
+        return size
+    size = QImageReader(path).size()
+    return (size.width(), size.height()) if size.isValid() else None
+
+
+@contextmanager
+def _image_data_reader(data):
+    """
+    QImageReader over encoded image bytes. Its format handler is dropped on
+    exit, while the buffer still exists: some (TIFF) read from the device
+    as they are destroyed.
+    """
+    buffer = QBuffer()
+    buffer.setData(data)
+    reader = QImageReader(buffer)
+    try:
+        yield reader
+    finally:
+        reader.setDevice(None)
+
+
+def image_data_size(data):
+    """
+    (width, height) of encoded image bytes without decoding them, or None.
+    """
+    try:
+        size = _header_image_size(io.BytesIO(data))
+    except struct.error:
+        size = None
+    if size and size[0] > 0 and size[1] > 0:
+        return size
+    with _image_data_reader(data) as reader:
+        size = reader.size()
+    return (size.width(), size.height()) if size.isValid() else None
+
+
+def ingest_image(path, store, quality=IMAGE_DEFAULT_QUALITY, keep_original=False, max_width=IMAGE_DISPLAY_WIDTH):
+    """
+    Add the image file at path to store, resampled to its displayed size and
+    re-encoded per the quality preset. Returns (src, width, height) with the
+    size to display it at (None when it is shown at natural size), or None if
+    the file is not a readable image. With keep_original the untouched file is
+    stored as well and referenced from the src fragment.
+    """
+    if not QImageReader(path).canRead():
+        # recognises the format from the header; nothing is decoded
+        return None
+    try:
+        original_key, original = FILE_IMAGE_CACHE.key(path)
+    except OSError:
+        return None
+    return ingest_image_data(original, store, quality, keep_original, max_width, original_key)
+
+
+def ingest_image_data(original, store, quality=IMAGE_DEFAULT_QUALITY, keep_original=False,
+                      max_width=IMAGE_DISPLAY_WIDTH, original_key=None):
+    """
+    ingest_image for encoded image bytes already in memory (pasted or
+    dropped images). original_key: their SHA-256 when the caller has it.
+    """
+    with _image_data_reader(original) as reader:
+        if not reader.canRead():
+            return None
+        rotated = bool(reader.transformation() & QImageIOHandler.TransformationRotate90)
+    raw = image_data_size(original)
+    if raw is None:
+        # no header we can read: decode it once to find out
+        decoded = QImage.fromData(original)
+        if decoded.isNull():
+            return None
+        raw = decoded.width(), decoded.height()
+    w, h = (raw[1], raw[0]) if rotated else raw
+    display = (max_width, h * max_width / w) if w > max_width else None
+    shown_w, shown_h = display or (w, h)
+
+    original_key = original_key or hashlib.sha256(original).hexdigest()
+    data = original
+    preset = IMAGE_QUALITY_PRESETS[quality]
+    if preset is not None:
+        scale, jpeg_quality = preset
+        factor = min(1.0, shown_w * scale / w)
+        factor = min(factor, (IMAGE_PIXEL_BUDGET / (w * h)) ** 0.5)
+        if factor < 1.0:
+            target = QSize(max(1, round(w * factor)), max(1, round(h * factor)))
+            with _image_data_reader(original) as reader:
+                reader.setAutoTransform(True)
+                # scaled while decoding (JPEG decodes straight at the smaller size); it applies before the EXIF rotation
+                reader.setScaledSize(target.transposed() if rotated else target)
+                image = reader.read()
+            if image.isNull():
+                return None
+            fmt = "PNG" if image.hasAlphaChannel() else "JPEG"
+            buf = QBuffer()
+            buf.open(QIODevice.WriteOnly)
+            image.save(buf, fmt, jpeg_quality)
+            if buf.size() < len(original):
+                data = bytes(buf.data())
+                display = display or (w, h)
+    if data is original:
+        key = store.add(original, original_key)
+        return f"{VOC_IMAGE_SCHEME}:{key}", *(display or (None, None))
+    key = store.add(data)
+    src = f"{VOC_IMAGE_SCHEME}:{key}"
+    if keep_original:
+        src += "#" + store.add(original, original_key)
+    return src, *display
+
+
+# ---------------------------
+# Background saving
+# ---------------------------
+def _collect_images(keys, store, skip=()):
+    images = {}
+    for key in keys:
+        if key not in skip:
+            data = store.get(key)
+            if data is not None:
+                images[key] = data
+    return images
+
+
+def save_voc_job(path, html, meta, store, codec, summary_source, progress=None):
+    """
+    Encode and write a full document snapshot. Safe to run off the GUI thread.
+    summary_source is (plain text, first image src) for the META summary.
+    Returns the image keys now stored in path.
+    """
+    meta = dict(meta, summary=document_summary(*summary_source, store))
+    html, keys = _externalize_images(html, store)
+    if store.container is not None:
+        # images the snapshot no longer uses are left out of the new file,
+        # but undo can still bring them back
+        store.hold(set(store.container.image_keys()).difference(keys))
+    write_voc_container(path, html, meta, _collect_images(keys, store), codec, progress)
+    return keys
+
+
+def append_journal_job(path, entry, store, summary_source, progress=None):
+    """
+    Encode and append one journal entry, then refresh the META summary in place.
+    Safe to run off the GUI thread.
+    """
+    entry = dict(entry)
+    entry["html"], keys = _externalize_images(entry["html"], store)
+    container = VocContainer(path)
+    images = _collect_images(keys, store, skip=set(container.image_keys()))
+    append_voc_journal(path, entry, images, container.codec, progress, container.end)
+    rewrite_voc_meta(path, dict(read_voc_header(path), summary=document_summary(*summary_source, store)))
+    return keys
+
+
+class SaveSignals(QObject):
+    """
+    Signals the save worker emits; they are delivered on the GUI thread.
+    """
+    progress = pyqtSignal(int)
+    # path, image store, keys written, change tracker token
+    finished = pyqtSignal(str, object, object, int)
+    failed = pyqtSignal(str, str, int)
+
+
+# ---------------------------
+# File search
+# ---------------------------
+SEARCH_BATCH = 200
+SEARCH_FLUSH_SECONDS = 0.05
+
+
+SEARCH_MAX_DEPTH = 8
+SEARCH_EXCLUDES = (".git", ".hg", ".svn", "node_modules", "__pycache__", ".cache", ".tox", ".venv",
+                   "venv", "*.egg-info", "$RECYCLE.BIN", "System Volume Information")
+SEARCH_WORKERS = min(16, (os.cpu_count() or 1) * 4)
+_walk_pool = None
+_walk_pool_lock = threading.Lock()
+
+
+def _shared_walk_pool():
+    global _walk_pool
+    with _walk_pool_lock:
+        if _walk_pool is None:
+            # directory listing waits on the disk (or the network), not the CPU
+            _walk_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="voc-walk")
+    return _walk_pool
+
+
+def _exclude_pattern(excludes):
+    return re.compile("|".join(fnmatch.translate(glob) for glob in excludes)) if excludes else None
+
+
+def _scan_dirs(dirs, term, exclude, descend, cancelled):
+    """
+    List each (path, real path) in dirs once. Returns the .voc files whose
+    name contains term and, if descend, the subdirectories to visit next.
+    Names are tested before entry types, and scandir knows the type from
+    the directory listing, so most entries cost no stat.
+    """
+    files, subdirs = [], []
+    for path, real in dirs:
+        if cancelled.is_set():
+            break
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    try:
+                        if entry.is_dir():
+                            if descend and not (exclude and exclude.match(name)):
+                                # only symlinks need resolving; a plain subdirectory's real path is known
+                                sub = os.path.realpath(entry.path) if entry.is_symlink() else os.path.join(real, name)
+                                subdirs.append((entry.path, sub))
+                        else:
+                            lower = name.lower()
+                            if lower.endswith(".voc") and term in lower and entry.is_file():
+                                files.append(entry.path)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+    return files, subdirs
+
+
+def walk_voc_files(root, term, cancelled, max_depth=SEARCH_MAX_DEPTH, excludes=SEARCH_EXCLUDES, workers=None):
+    """
+    Yield the .voc files under root, at most max_depth folders down (0: root
+    only), whose name contains term (lower case). Folders matching an
+    exclude glob are skipped. Each folder is entered once by its real path,
+    so symlink loops end. Every level of the tree is listed in parallel on
+    the walk pool, its folders split into batches. Stops early once
+    cancelled (a threading.Event) is set.
+    """
+    workers = workers or SEARCH_WORKERS
+    pool = _shared_walk_pool()
+    exclude = _exclude_pattern(excludes)
+    real_root = os.path.realpath(root)
+    seen = {real_root}
+    level = [(root, real_root)]
+    for depth in range(max_depth + 1):
+        if not level or cancelled.is_set():
+            return
+        size = max(1, min(64, len(level) // (workers * 4)))
+        batches = [level[i:i + size] for i in range(0, len(level), size)]
+        if len(batches) == 1 or workers < 2:
+            results = (_scan_dirs(batch, term, exclude, depth < max_depth, cancelled) for batch in batches)
+        else:
+            futures = [pool.submit(_scan_dirs, batch, term, exclude, depth < max_depth, cancelled)
+                       for batch in batches]
+            results = (future.result() for future in as_completed(futures))
+        level = []
+        for files, subdirs in results:
+            yield from files
+            for path, real in subdirs:
+                if real not in seen:
+                    seen.add(real)
+                    level.append((path, real))
+
+
+def search_voc_job(generation, dirpath, term, max_depth, cancelled, signals, names=None):
+    """
+    Stream the matches of walk_voc_files, with their VOC_INFO_CACHE info, to
+    signals.found in batches, and record them in the names index if given.
+    Runs on the search worker.
+    """
+    batch = []
+    total = 0
+    found = []
+    flushed = time.monotonic()
+    for path in walk_voc_files(dirpath, term, cancelled, max_depth):
+        if cancelled.is_set():
+            # a newer search has started; its results are the only ones wanted
+            break
+        info, _thumbnail = VOC_INFO_CACHE.get(path)
+        batch.append((path, info))
+        if names is not None and info:
+            found.append((path, info["modified"]))
+        if len(batch) >= SEARCH_BATCH or time.monotonic() - flushed > SEARCH_FLUSH_SECONDS:
+            total += len(batch)
+            signals.found.emit(generation, batch)
+            batch = []
+            flushed = time.monotonic()
+    if batch and not cancelled.is_set():
+        total += len(batch)
+        signals.found.emit(generation, batch)
+    if found:
+        names.update(found)
+    signals.finished.emit(generation, total)
+
+
+class SearchSignals(QObject):
+    """
+    Signals the search worker emits; they are delivered on the GUI thread.
+    """
+    found = pyqtSignal(int, object)
+    indexed = pyqtSignal(int, int)
+    cataloged = pyqtSignal(str)
+    finished = pyqtSignal(int, int)
+
+
+# ---------------------------
+# File info for search results
+# ---------------------------
+VOC_INFO_ENTRIES = 100_000
+
+
+class VocInfoCache:
+    """
+    What the search results show of a .voc file: title, preview and counts
+    from its META summary, plus its size and mtime. LRU keyed by path and
+    checked against (mtime, size), so a changed file is read again.
+    Thumbnails are passed through, never kept. Shared by the GUI thread
+    and the workers.
+    """
+
+    def __init__(self, entries=VOC_INFO_ENTRIES):
+        self.entries = entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, thumbnail=False):
+        """
+        (info, thumbnail data URI) for path; the URI only if thumbnail is
+        set and the file has one, else None. info is {} if path is gone.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {}, None
+        ident = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == ident:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                if not (thumbnail and entry[1]["thumbnail"]):
+                    return entry[1], None
+            else:
+                self.misses += 1
+        summary = read_voc_header(path).get("summary") or {}
+        info = {
+            "title": summary.get("title") or "",
+            "preview": summary.get("preview") or "",
+            "words": summary.get("words", 0),
+            "images": summary.get("images", 0),
+            "thumbnail": bool(summary.get("thumbnail")),
+            "modified": st.st_mtime,
+            "size": st.st_size,
+        }
+        with self._lock:
+            self._entries[path] = (ident, info)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.entries:
+                self._entries.popitem(last=False)
+        return info, summary.get("thumbnail") if thumbnail else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+VOC_INFO_CACHE = VocInfoCache()
+
+
+# ---------------------------
+# Content index
+# ---------------------------
+INDEX_FILE = "index.sqlite3"
+INDEX_PATH = os.path.join(get_app_data_path(), INDEX_FILE)
+INDEX_RESULTS = 100
+INDEX_COMMIT_FILES = 200
+# inotify and friends cap watches per user; watch at most this many folders
+INDEX_WATCH_LIMIT = 2048
+# changes within this window are folded into one refresh
+INDEX_WATCH_DELAY_MS = 500
+# bm25 weights of the title and body columns
+INDEX_RANK = "bm25(docs, 10.0, 1.0)"
+
+_HTML_HIDDEN_RE = re.compile(r"<(head|style|script)\b.*?</\1\s*>", re.S | re.I)
+_HTML_BREAK_RE = re.compile(r"<(?:br|/p|/h[1-6]|/li|/tr|/td|/th|/div|/pre)\b[^>]*>", re.I)
+_HTML_MARKUP_RE = re.compile(r"<[^>]*>")
+_QUERY_TERM_RE = re.compile(r"\w+")
+# Chinese, Japanese and Korean are written without spaces between words.
+# The index sees each run of these scripts as its overlapping character
+# bigrams, so any stretch of two or more characters is a phrase of bigrams,
+# plus the run's last character, so any single character is a prefix.
+_CJK_CHARS = ("\u3040-\u30ff\u31f0-\u31ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+              "\uf900-\ufaff\uff66-\uff9f\U00020000-\U0002ebef")
+_CJK_RUN_RE = re.compile(f"[{_CJK_CHARS}]+")
+# private-use characters the tokenizer splits on: between a run's bigrams,
+# before its last character, and around the run
+_CJK_NEXT, _CJK_LAST, _CJK_EDGE = "\ue000", "\ue001", "\ue002"
+# Spelling a run back out drops each token's first character, which the
+# token before ends with. FTS highlight markers (\x01, \x02) sit right
+# inside the separators; a highlight opening on a dropped character moves
+# back onto the character kept in its place.
+_CJK_UNSPELL = [(re.compile(pattern), repl) for pattern, repl in (
+    (f"([^\x02]){_CJK_NEXT}\x01[^\x01]", "\x01\\1"),
+    (f"([^\x02]){_CJK_LAST}\x01[^\x02]\x02", "\x01\\1\x02"),
+    (f"{_CJK_LAST}\x01?[^\x02]\x02?", ""),
+    (f"{_CJK_NEXT}(\x01?)[^\x01]", "\\1"),
+    (_CJK_EDGE, ""),
+)]
+
+
+def html_to_text(html):
+    """
+    Plain text of document HTML, one line per block. Pure Python, so it is
+    safe on any thread; enough for indexing, not a faithful rendering.
+    """
+    html = _HTML_HIDDEN_RE.sub("", html)
+    html = _HTML_BREAK_RE.sub("\n", html)
+    return html_unescape(_HTML_MARKUP_RE.sub("", html))
+
+
+def _cjk_bigrams(m):
+    run = m.group(0)
+    if len(run) == 1:
+        return f"{_CJK_EDGE}{run}{_CJK_EDGE}"
+    bigrams = _CJK_NEXT.join(run[i:i + 2] for i in range(len(run) - 1))
+    return f"{_CJK_EDGE}{bigrams}{_CJK_LAST}{run[-1]}{_CJK_EDGE}"
+
+
+def cjk_index_text(text):
+    """
+    text as the index stores it: CJK runs spelled out as bigrams between
+    separators, everything else unchanged for the unicode61 tokenizer.
+    """
+    return _CJK_RUN_RE.sub(_cjk_bigrams, text)
+
+
+def cjk_display_text(text):
+    """
+    Undo cjk_index_text on a title or snippet read back from the index,
+    keeping any highlight markers.
+    """
+    if _CJK_EDGE not in text:
+        return text
+    for pattern, repl in _CJK_UNSPELL:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def voc_index_text(path, data=None):
+    """
+    (title, text) to index for a .voc file, read from data if given. Text
+    appended by journal entries is indexed after the body; text they
+    replaced stays findable until the file is next saved in full.
+    """
+    html, meta, container = read_voc_file(path, data)
+    if container is not None:
+        html += "".join(entry.get("html", "") for entry in container.journal())
+    text = html_to_text(html)
+    title = (meta.get("summary") or {}).get("title")
+    if not title:
+        m = _FIRST_LINE_RE.search(text)
+        title = m.group(0).strip()[:VOC_SUMMARY_TITLE_CHARS] if m else os.path.basename(path)
+    return title, text
+
+
+def fts_query(text):
+    """
+    FTS5 MATCH expression for what the user typed: every word must appear,
+    the last one as a prefix, since it may still be being typed. None if
+    there is nothing to search for.
+    """
+    terms = _QUERY_TERM_RE.findall(_CJK_RUN_RE.sub(r" \g<0> ", text))
+    if not terms:
+        return None
+    phrases = []
+    for n, term in enumerate(terms):
+        if len(term) > 1 and _CJK_RUN_RE.fullmatch(term):
+            term = " ".join(term[i:i + 2] for i in range(len(term) - 1))
+        # a lone CJK character is matched by the bigrams it starts
+        last = n == len(terms) - 1 or (len(term) == 1 and _CJK_RUN_RE.fullmatch(term))
+        phrases.append(f'"{term}"*' if last else f'"{term}"')
+    return " ".join(phrases)
+
+
+def _path_range(root):
+    # [low, high) bounds of the paths under root, for an index range scan
+    root = os.path.join(os.path.abspath(root), "")
+    return root, root[:-1] + chr(ord(root[-1]) + 1)
+
+
+class VocIndex:
+    """
+    Full-text index of .voc documents in an SQLite FTS5 table, kept on disk
+    so it works offline and survives restarts. Each thread gets its own
+    connection; in WAL mode the GUI queries while a worker writes.
+    Every file is recorded with its mtime, size and content hash, so a
+    refresh stats files and only reads the ones that changed.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files(
+            id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL,
+            mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL);
+        CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(title, body, tokenize='unicode61 remove_diacritics 2');
+    """
+    # PRAGMA user_version -> statements that bring an older index up to it
+    MIGRATIONS = {
+        1: "ALTER TABLE files ADD COLUMN hash TEXT;",
+        # CJK text is stored as bigrams (cjk_index_text); everything is read again
+        2: f"""
+            DROP TABLE docs;
+            CREATE VIRTUAL TABLE docs USING fts5(
+                title, body, tokenize="unicode61 remove_diacritics 2 separators '{_CJK_NEXT}{_CJK_LAST}{_CJK_EDGE}'");
+            UPDATE files SET mtime_ns = 0, hash = NULL;
+        """,
+    }
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._db()
+        db.executescript(self.SCHEMA)
+        (version,) = db.execute("PRAGMA user_version").fetchone()
+        for target in sorted(v for v in self.MIGRATIONS if v > version):
+            db.executescript(self.MIGRATIONS[target] + f"PRAGMA user_version = {target};")
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    def index_file(self, path, stat=None):
+        """
+        (Re)index one file. Returns False if it cannot be read.
+        """
+        entry = self._read(path, stat)
+        if entry is None:
+            return False
+        with self._db() as db:
+            self._write(db, *entry)
+        return True
+
+    @staticmethod
+    def _read(path, stat=None, known_hash=None):
+        """
+        (path, stat, hash, title, text) for a file, or None if it cannot be
+        read. title and text are None when the file still hashes to
+        known_hash: it was touched or copied over, not edited.
+        """
+        path = os.path.abspath(path)
+        try:
+            stat = stat or os.stat(path)
+            # hashed and parsed from one read
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == known_hash:
+                return path, stat, digest, None, None
+            title, text = voc_index_text(path, data)
+        except Exception:
+            return None
+        return path, stat, digest, title, text
+
+    @staticmethod
+    def _write(db, path, stat, digest, title, text):
+        row = db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row:
+            db.execute("UPDATE files SET mtime_ns = ?, size = ?, hash = ? WHERE id = ?",
+                       (stat.st_mtime_ns, stat.st_size, digest, row[0]))
+            if title is None:
+                return
+            db.execute("DELETE FROM docs WHERE rowid = ?", row)
+            rowid = row[0]
+        else:
+            rowid = db.execute("INSERT INTO files(path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                               (path, stat.st_mtime_ns, stat.st_size, digest)).lastrowid
+        db.execute("INSERT INTO docs(rowid, title, body) VALUES (?, ?, ?)",
+                   (rowid, cjk_index_text(title or ""), cjk_index_text(text or "")))
+
+    def remove(self, paths):
+        db = self._db()
+        with db:
+            for path in paths:
+                row = db.execute("SELECT id FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+                if row:
+                    db.execute("DELETE FROM docs WHERE rowid = ?", row)
+                    db.execute("DELETE FROM files WHERE id = ?", row)
+
+    def refresh(self, root, cancelled, max_depth=SEARCH_MAX_DEPTH):
+        """
+        Bring the index up to date with the .voc files under root: index new
+        and modified files, drop ones that are gone. Returns how many
+        entries changed.
+        """
+        low, high = _path_range(root)
+        # files deeper than max_depth are not walked, so they cannot be found missing either
+        known = {path: (mtime, size, digest) for path, mtime, size, digest in self._db().execute(
+                 "SELECT path, mtime_ns, size, hash FROM files WHERE path >= ? AND path < ?", (low, high))
+                 if path.count(os.sep, len(low)) <= max_depth}
+        changed = 0
+        pending = []
+        for path in walk_voc_files(root, "", cancelled, max_depth):
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            mtime, size, digest = known.pop(path, (None, None, None))
+            if (mtime, size) != (stat.st_mtime_ns, stat.st_size):
+                entry = self._read(path, stat, digest)
+                if entry is not None:
+                    pending.append(entry)
+            if len(pending) >= INDEX_COMMIT_FILES:
+                changed += self._write_all(pending)
+                pending = []
+        changed += self._write_all(pending)
+        if known and not cancelled.is_set():
+            self.remove(known)
+            changed += len(known)
+        return changed
+
+    def _write_all(self, entries):
+        # one transaction per batch: a commit per file would dominate indexing
+        if entries:
+            with self._db() as db:
+                for entry in entries:
+                    self._write(db, *entry)
+        return len(entries)
+
+    def directories(self, root):
+        """
+        Folders under root (root included) that hold indexed files.
+        """
+        low, high = _path_range(root)
+        return {os.path.dirname(path) for (path,) in self._db().execute(
+            "SELECT path FROM files WHERE path >= ? AND path < ?", (low, high))}
+
+    def search(self, text, root=None, limit=INDEX_RESULTS):
+        """
+        Best matches for text as (path, title, snippet html) tuples, matched
+        words in <b>. Restricted to files under root when given.
+        """
+        query = fts_query(text)
+        if query is None:
+            return []
+        low, high = _path_range(root) if root else ("", "\U0010ffff")
+        rows = self._db().execute(
+            f"SELECT f.path, docs.title, snippet(docs, 1, char(1), char(2), '…', 16) FROM docs "
+            f"JOIN files f ON f.id = docs.rowid WHERE docs MATCH ? AND f.path >= ? AND f.path < ? "
+            f"ORDER BY {INDEX_RANK} LIMIT ?", (query, low, high, limit)).fetchall()
+        return [(path, cjk_display_text(title), _snippet_html(cjk_display_text(snippet)))
+                for path, title, snippet in rows]
+
+
+def _snippet_html(snippet):
+    # FTS marks matches with \x01..\x02; escape the text before they become tags
+    text = " ".join(snippet.split())
+    return _html_escape(text).replace("\x01", "<b>").replace("\x02", "</b>")
+
+
+class IndexSignals(QObject):
+    """
+    Signals of background index upkeep; they are delivered on the GUI thread.
+    refreshed carries the folders worth watching and how many entries changed.
+    """
+    refreshed = pyqtSignal(object, int)
+
+
+def update_index_job(index, folders, max_depth, roots, signals):
+    """
+    Refresh folders in index (max_depth down), then report the folders under
+    roots that hold indexed files, for the file system watcher.
+    """
+    cancelled = threading.Event()
+    changed = 0
+    for folder in folders:
+        changed += index.refresh(folder, cancelled, max_depth)
+    watch = []
+    for root in roots:
+        watch.append(root)
+        watch.extend(sorted(index.directories(root) - {root}))
+    signals.refreshed.emit(list(dict.fromkeys(watch))[:INDEX_WATCH_LIMIT], changed)
+
+
+def refresh_index_job(generation, index, root, max_depth, cancelled, signals):
+    """
+    Refresh index for root on the search worker and report what changed.
+    """
+    changed = index.refresh(root, cancelled, max_depth)
+    if not cancelled.is_set():
+        signals.indexed.emit(generation, changed)
+    signals.finished.emit(generation, -1)
+
+
+# ---------------------------
+# File name index
+# ---------------------------
+NAMES_FILE = "names.sqlite3"
+NAMES_PATH = os.path.join(get_app_data_path(), NAMES_FILE)
+NAME_RESULTS = 200
+# share of the query's trigrams a name must contain to count as a match
+NAME_MIN_OVERLAP = 0.5
+# matches scored in full per query; past it the weakest, oldest are dropped unscored
+NAME_SCORE_LIMIT = 1000
+# postings longer than this are checked per candidate instead of being tallied
+NAME_COMMON_POSTING = 10000
+# newest names looked through when only common grams match
+NAME_RECENT_SCAN = 10000
+# a file modified just now gains this much score; half as much every NAME_RECENCY_DAYS
+NAME_RECENCY_WEIGHT = 0.3
+NAME_RECENCY_DAYS = 30
+
+_NAME_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _name_key(path):
+    # the file name's words, lowercased, each between spaces: every gram of
+    # a name is a substring of its key
+    name = os.path.basename(path).lower()
+    if name.endswith(".voc"):
+        name = name[:-4]
+    return f" {' '.join(_NAME_WORD_RE.findall(name))} "
+
+
+def _name_grams(key):
+    """
+    Trigrams of each word in a name key, padded with spaces so word starts
+    and ends count, plus each word's first letter after a space. Words are
+    never run together, so reordering them changes nothing.
+    """
+    grams = set()
+    for word in key.split():
+        padded = f" {word} "
+        grams.add(padded[:2])
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FilenameIndex:
+    """
+    Fuzzy, ranked search over the names of known .voc files. Trigram
+    postings live in memory and are saved to SQLite as they change, so a
+    new session loads them as they were instead of walking the disk or
+    rebuilding them. Thread-safe: workers feed it while the GUI queries.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS names(id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, mtime REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS grams(gram TEXT PRIMARY KEY, ids BLOB NOT NULL);
+    """
+
+    def __init__(self, path=NAMES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # held across a change and its write, so writes land in the order the changes were made
+        self._save_lock = threading.Lock()
+        self._local = threading.local()
+        self._paths = []
+        self._names = []
+        self._mtimes = []
+        self._ids = {}
+        self._grams = {}
+        # ids, newest file first
+        self._recent = []
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self.SCHEMA)
+            self._local.db = db
+        return db
+
+    def __len__(self):
+        return len(self._ids)
+
+    def load(self):
+        """
+        Read the saved names and postings; cheap enough for a worker at startup.
+        """
+        db = self._db()
+        grams = {}
+        for gram, blob in db.execute("SELECT gram, ids FROM grams"):
+            posting = array("I")
+            posting.frombytes(blob)
+            grams[gram] = posting
+        rows = db.execute("SELECT id, path, mtime FROM names").fetchall()
+        # ids only grow: postings may still hold ids of removed names, which must not be reused
+        size = max(max((p[-1] for p in grams.values() if p), default=-1),
+                   max((row[0] for row in rows), default=-1)) + 1
+        with self._lock:
+            self._paths = [None] * size
+            self._names = [None] * size
+            self._mtimes = [0.0] * size
+            self._ids = {}
+            self._grams = grams
+            for i, path, mtime in rows:
+                self._paths[i] = path
+                self._names[i] = _name_key(path)
+                self._mtimes[i] = mtime
+                self._ids[path] = i
+        self._sort_recent()
+
+    def _sort_recent(self):
+        # sorted from a copy: queries need not wait for it
+        with self._lock:
+            ids, mtimes = list(self._ids.values()), self._mtimes[:]
+        recent = sorted(ids, key=mtimes.__getitem__, reverse=True)
+        with self._lock:
+            self._recent = recent
+
+    def _add(self, path, mtime, dirty):
+        # caller holds the lock; returns the id when the name is new or changed
+        i = self._ids.get(path)
+        if i is not None:
+            if self._mtimes[i] == mtime:
+                return None
+            self._mtimes[i] = mtime
+            return i
+        i = len(self._paths)
+        name = _name_key(path)
+        self._ids[path] = i
+        self._paths.append(path)
+        self._names.append(name)
+        self._mtimes.append(mtime)
+        for gram in _name_grams(name):
+            posting = self._grams.get(gram)
+            if posting is None:
+                posting = self._grams[gram] = array("I")
+            posting.append(i)
+            dirty.add(gram)
+        return i
+
+    def _compact(self):
+        # caller holds the lock; drops the ids of removed names from every posting
+        live = [(p, self._mtimes[i]) for p, i in self._ids.items()]
+        self._paths, self._names, self._mtimes, self._ids, self._grams = [], [], [], {}, {}
+        for path, mtime in live:
+            self._add(path, mtime, set())
+
+    def update(self, entries, root=None):
+        """
+        Record (path, mtime) entries. With root, entries is everything now
+        under root, and known files under it that are missing are dropped.
+        """
+        entries = [(os.path.abspath(path), mtime) for path, mtime in entries]
+        with self._save_lock:
+            dirty = set()
+            with self._lock:
+                gone = []
+                if root is not None:
+                    low, high = _path_range(root)
+                    seen = {path for path, _mtime in entries}
+                    gone = [p for p in self._ids if low <= p < high and p not in seen]
+                    for path in gone:
+                        # postings keep the id; searches skip it
+                        self._names[self._ids.pop(path)] = None
+                    gone = [(p,) for p in gone]
+                changed = [i for i in (self._add(p, m, dirty) for p, m in entries) if i is not None]
+                rebuilt = len(self._paths) > 2 * len(self._ids) + 1000
+                if rebuilt:
+                    self._compact()
+                    changed = list(self._ids.values())
+                    dirty = set(self._grams)
+                rows = [(i, self._paths[i], self._mtimes[i]) for i in changed]
+                blobs = [(gram, self._grams[gram].tobytes()) for gram in dirty]
+            if not (rows or blobs or gone):
+                return
+            self._sort_recent()
+            db = self._db()
+            with db:
+                if rebuilt:
+                    db.execute("DELETE FROM names")
+                    db.execute("DELETE FROM grams")
+                else:
+                    db.executemany("DELETE FROM names WHERE path = ?", gone)
+                db.executemany("INSERT OR REPLACE INTO names(id, path, mtime) VALUES (?, ?, ?)", rows)
+                db.executemany("INSERT OR REPLACE INTO grams(gram, ids) VALUES (?, ?)", blobs)
+
+    def knows(self, root):
+        low, high = _path_range(root)
+        with self._lock:
+            return any(low <= p < high for p in self._ids)
+
+    def search(self, text, root=None, limit=NAME_RESULTS, now=None):
+        """
+        Paths whose names best match text, best first. Names need not
+        contain the text: enough shared trigrams survive a typo or reordered
+        words. Recently modified files rank higher.
+        """
+        words = _NAME_WORD_RE.findall(text.lower())
+        if not words:
+            return []
+        now = now or time.time()
+        low, high = _path_range(root) if root else ("", "\U0010ffff")
+        with self._lock:
+            grams = self._query_grams(words)
+            # a name must share `need` grams. Rare postings are tallied in C
+            # by Counter; common ones, which say little about a name, are
+            # checked only for the names the rare ones turn up
+            postings = sorted(((self._grams.get(g, ()), g) for g in grams), key=lambda pg: len(pg[0]))
+            rare = [posting for posting, _gram in postings if 0 < len(posting) <= NAME_COMMON_POSTING]
+            common = [g for posting, g in postings if len(posting) > NAME_COMMON_POSTING]
+            need = max(1, math.ceil(len(grams) * NAME_MIN_OVERLAP))
+            names, paths, mtimes = self._names, self._paths, self._mtimes
+            if rare:
+                shared = Counter()
+                for posting in rare:
+                    shared.update(posting)
+                candidates = self._best_candidates(shared, max(1, need - len(common)))
+            elif common:
+                # nothing rare narrows the names down, as in a query of a
+                # letter or two: the names match alike, so the newest ones
+                # with the rarest gram are the answer
+                gram = common[0]
+                candidates = itertools.islice(
+                    (i for i in itertools.islice(self._recent, NAME_RECENT_SCAN)
+                     if names[i] is not None and gram in names[i] and low <= paths[i] < high), limit)
+            else:
+                return []
+            prefix = f" {words[0]}"
+            scored = []
+            for i in candidates:
+                name = names[i]
+                if name is None or not low <= paths[i] < high:
+                    continue
+                count = sum(g in name for g in grams)
+                if count < need:
+                    continue
+                score = count / len(grams)
+                if all(word in name for word in words):
+                    score += 0.5
+                if name.startswith(prefix):
+                    score += 0.2
+                age_days = max(0.0, now - mtimes[i]) / 86400
+                score += NAME_RECENCY_WEIGHT * 0.5 ** (age_days / NAME_RECENCY_DAYS)
+                scored.append((score, i))
+            best = heapq.nlargest(limit, scored)
+            return [paths[i] for _score, i in best]
+
+    @staticmethod
+    def _query_grams(words):
+        # the last word is still being typed, so it has no closing gram, and
+        # a single letter matches the words starting with it
+        grams = {}
+        for n, word in enumerate(words):
+            padded = f" {word} " if n < len(words) - 1 and len(word) > 1 else f" {word}"
+            grams.update(dict.fromkeys([padded[i:i + 3] for i in range(len(padded) - 2)] or [padded]))
+        return list(grams)
+
+    def _best_candidates(self, shared, need):
+        # caller holds the lock. Past NAME_SCORE_LIMIT, score the best
+        # overlaps only, and of the weakest overlap admitted only the most
+        # recently modified
+        if len(shared) <= NAME_SCORE_LIMIT:
+            return [i for i, count in shared.items() if count >= need]
+        histogram = Counter(shared.values())
+        floor, kept = need, 0
+        for count in sorted(histogram, reverse=True):
+            if count < need:
+                break
+            floor = count
+            kept += histogram[count]
+            if kept >= NAME_SCORE_LIMIT:
+                break
+        above = [i for i, count in shared.items() if count > floor]
+        at_floor = [i for i, count in shared.items() if count == floor]
+        if len(above) + len(at_floor) > NAME_SCORE_LIMIT:
+            at_floor = heapq.nlargest(NAME_SCORE_LIMIT - len(above), at_floor, key=self._mtimes.__getitem__)
+        return above + at_floor
+
+
+def load_names_job(index, signals):
+    index.load()
+    signals.cataloged.emit("")
+
+
+def catalog_voc_job(index, root, max_depth, cancelled, signals):
+    """
+    Walk root for every .voc file and record them all in the name index,
+    dropping the ones that are gone.
+    """
+    entries = []
+    for path in walk_voc_files(root, "", cancelled, max_depth):
+        try:
+            entries.append((path, os.stat(path).st_mtime))
+        except OSError:
+            pass
+    if not cancelled.is_set():
+        index.update(entries, root)
+        signals.cataloged.emit(root)
+
+
+IMAGE_CACHE_BYTES = 256 * 1024 * 1024
+PLACEHOLDER_CACHE_BYTES = 32 * 1024 * 1024
+PLACEHOLDER_COLOR = QColor("#EEF1F5")
+
+
+class PixmapCache:
+    """
+    Least-recently-used pixmaps, bounded by the memory their pixels take.
+    GUI thread only.
+    """
+
+    def __init__(self, budget=IMAGE_CACHE_BYTES):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+    def get(self, key):
+        pixmap = self._entries.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self._entries:
+            self.size -= self.cost(self._entries.pop(key))
+        self._entries[key] = pixmap
+        self.size += self.cost(pixmap)
+        # always keep the newest one, even if it alone exceeds the budget
+        while self.size > self.budget and len(self._entries) > 1:
+            _old, evicted = self._entries.popitem(last=False)
+            self.size -= self.cost(evicted)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class VocDocument(QTextDocument):
+    """
+    QTextDocument that decodes voc-img: images only when they are first
+    needed. Decoding runs on the image pool; until it is done a placeholder
+    is drawn. Decoded pixmaps are kept per (key, size) in a PixmapCache
+    rather than in Qt's own resource cache, which would keep every image of
+    the document for as long as the document lives.
+    """
+    imagesDecoded = pyqtSignal()
+    _decoded = pyqtSignal(object, QImage)
+
+    def __init__(self, parent=None, cache_bytes=IMAGE_CACHE_BYTES):
+        super().__init__(parent)
+        self.image_store = VocImageStore()
+        self.pixmaps = PixmapCache(cache_bytes)
+        self._pending = set()
+        self._broken = set()
+        self._sizes = {}
+        self._placeholders = PixmapCache(PLACEHOLDER_CACHE_BYTES)
+        self._decoded.connect(self._on_decoded)
+
+    def loadResource(self, type, name):
+        if type != QTextDocument.ImageResource or name.scheme() != VOC_IMAGE_SCHEME:
+            return super().loadResource(type, name)
+        key = name.path()
+        size = self.image_size(key)
+        if size is None:
+            return None
+        pixmap = self.image(key)
+        return pixmap if pixmap is not None else self._placeholder(*size)
+
+    def image_size(self, key):
+        """
+        Natural (width, height) of image key, read from its header; None if
+        it is missing or unreadable.
+        """
+        if key not in self._sizes:
+            data = self.image_store.get(key)
+            size = image_data_size(data) if data else None
+            if size is None and data:
+                # no header we can read: decode it once to find out
+                image = QImage.fromData(data)
+                size = None if image.isNull() else (image.width(), image.height())
+            self._sizes[key] = size
+        return self._sizes[key]
+
+    def image(self, key, size=None):
+        """
+        Pixmap of image key scaled to size (width, height), or at its natural
+        size when size is None. Returns None while it is being decoded;
+        imagesDecoded is emitted once it is ready.
+        """
+        entry = (key, size)
+        pixmap = self.pixmaps.get(entry)
+        if pixmap is None and entry not in self._pending and entry not in self._broken:
+            data = self.image_store.get(key)
+            if data:
+                self._pending.add(entry)
+                _shared_image_pool().submit(self._decode, entry, data)
+            else:
+                self._broken.add(entry)
+        return pixmap
+
+    def _decode(self, entry, data):
+        # image pool thread; QImage (unlike QPixmap) may be built off the GUI thread
+        _key, size = entry
+        with _image_data_reader(data) as reader:
+            if size is not None:
+                # JPEG decodes straight to a fraction of its size; the rest is a smooth rescale
+                reader.setScaledSize(QSize(*size))
+            image = reader.read()
+        try:
+            self._decoded.emit(entry, image)
+        except RuntimeError:
+            # the document was deleted while we were decoding
+            pass
+
+    def _on_decoded(self, entry, image):
+        self._pending.discard(entry)
+        if image.isNull():
+            self._broken.add(entry)
+        else:
+            self.pixmaps.put(entry, QPixmap.fromImage(image))
+        self.imagesDecoded.emit()
+
+    def _placeholder(self, w, h):
+        pixmap = self._placeholders.get((w, h))
+        if pixmap is None:
+            pixmap = QPixmap(w, h)
+            pixmap.fill(PLACEHOLDER_COLOR)
+            self._placeholders.put((w, h), pixmap)
+        return pixmap
+
+    def decoding(self):
+        return bool(self._pending)
+
+    def reset_images(self, store):
+        self.image_store = store
+        self.pixmaps.clear()
+        self._broken.clear()
+        self._sizes.clear()
+        self._placeholders.clear()
+
+
+class VocImageHandler(QObject, QTextObjectInterface):
+    """
+    Lays out and draws the images of a VocDocument in place of Qt's own
+    image handler. voc-img: images are drawn from pixmaps decoded and scaled
+    to exactly the size they are shown at, so painting is a plain blit and
+    a large photo never has to be held at full size.
+    """
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.document = document
+
+    def intrinsicSize(self, doc, pos, format):
+        fmt = format.toImageFormat()
+        w, h = fmt.width(), fmt.height()
+        if w > 0 and h > 0:
+            return QSizeF(w, h)
+        natural = self._natural_size(fmt.name())
+        if natural is None:
+            return QSizeF(w or 16, h or 16)
+        nw, nh = natural
+        if w > 0:
+            return QSizeF(w, nh * w / nw)
+        if h > 0:
+            return QSizeF(nw * h / nh, h)
+        return QSizeF(nw, nh)
+
+    def drawObject(self, painter, rect, doc, pos, format):
+        url = QUrl(format.toImageFormat().name())
+        if url.scheme() != VOC_IMAGE_SCHEME:
+            image = self._resource(url)
+            if image.isNull():
+                painter.fillRect(rect, PLACEHOLDER_COLOR)
+            else:
+                painter.drawImage(rect, image)
+            return
+        ratio = painter.device().devicePixelRatioF()
+        size = (max(1, round(rect.width() * ratio)), max(1, round(rect.height() * ratio)))
+        pixmap = self.document.image(url.path(), size)
+        if pixmap is None:
+            painter.fillRect(rect, PLACEHOLDER_COLOR)
+        else:
+            painter.drawPixmap(rect, pixmap, QRectF(pixmap.rect()))
+
+    def _natural_size(self, name):
+        url = QUrl(name)
+        if url.scheme() == VOC_IMAGE_SCHEME:
+            return self.document.image_size(url.path())
+        image = self._resource(url)
+        return None if image.isNull() else (image.width(), image.height())
+
+    def _resource(self, url):
+        # file: and data: images the store does not hold; Qt caches these itself
+        resource = self.document.resource(QTextDocument.ImageResource, url)
+        if isinstance(resource, QImage):
+            return resource
+        if isinstance(resource, QPixmap):
+            return resource.toImage()
+        if isinstance(resource, (bytes, QByteArray)):
+            return QImage.fromData(resource)
+        return QImage()
+
+
+# an edit changing more characters than this is laid out incrementally; see VocTextEdit
+LAZY_RELAYOUT_CHARS = 500_000
+PASTED_IMAGE_FORMATS = ("image/png", "image/jpeg", "image/gif", "image/bmp", "image/webp")
+
+
+class VocTextEdit(QTextEdit):
+    """
+    QTextEdit over a VocDocument, repainted as its images finish decoding.
+    Pasted and dropped images go straight into the image store: the
+    document only ever holds voc-img: references to them.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setDocument(VocDocument(self))
+        self.image_handler = VocImageHandler(self.document())
+        self.document().documentLayout().registerHandler(QTextFormat.ImageObject, self.image_handler)
+        self.document().imagesDecoded.connect(self.viewport().update)
+        self.document().contentsChange.connect(self._relayout_lazily)
+        self._page_size = None
+        # returns ingest_image_data bound to a store and settings; MainWindow supplies its own
+        self.image_ingester = lambda: partial(ingest_image_data, store=self.image_store)
+
+    def _relayout_lazily(self, _position, removed, added):
+        # Qt lays an edited range out before the edit returns, which for one
+        # spanning a long document (replace all, or undoing it) takes minutes.
+        # Without a page size it skips that; setting it back starts the
+        # incremental layout a document gets after setHtml. contentsChange
+        # comes just before the layout is told.
+        doc = self.document()
+        if max(removed, added) < LAZY_RELAYOUT_CHARS or self._page_size is not None:
+            return
+        self._page_size = doc.pageSize()
+        doc.setPageSize(QSizeF(0, 0))
+        QTimer.singleShot(0, self._restore_page_size)
+
+    def _restore_page_size(self):
+        size, self._page_size = self._page_size, None
+        self.document().setPageSize(size)
+
+    def canInsertFromMimeData(self, source):
+        return source.hasImage() or super().canInsertFromMimeData(source)
+
+    def insertFromMimeData(self, source):
+        self._leave_image_format()
+        images = self._pasted_image_files(source) if source.hasUrls() else []
+        if not images and source.hasImage() and not self._has_text(source):
+            images = [self._pasted_image(source)]
+        if images and None not in images:
+            cursor = self.textCursor()
+            cursor.beginEditBlock()
+            for src, w, h in images:
+                fmt = QTextImageFormat()
+                fmt.setName(src)
+                if w is not None:
+                    fmt.setWidth(w)
+                    fmt.setHeight(h)
+                cursor.insertImage(fmt)
+            cursor.endEditBlock()
+            self._leave_image_format()
+            self.ensureCursorVisible()
+        elif source.hasHtml() and self.acceptRichText():
+            # data: and file: images are decoded and hashed once, here, instead of on every save
+            html, _keys = _externalize_images(source.html(), self.image_store)
+            self.textCursor().insertFragment(QTextDocumentFragment.fromHtml(html, self.document()))
+            self.ensureCursorVisible()
+        else:
+            super().insertFromMimeData(source)
+
+    def _leave_image_format(self):
+        # right after an image the cursor carries the image's format, and Qt
+        # pastes text in it: each pasted character would save as an <img>
+        fmt = self.textCursor().charFormat()
+        if fmt.isImageFormat():
+            for prop in (QTextFormat.ImageName, QTextFormat.ImageWidth, QTextFormat.ImageHeight):
+                fmt.clearProperty(prop)
+            fmt.setObjectType(QTextFormat.NoObject)
+            self.setCurrentCharFormat(fmt)
+
+    @staticmethod
+    def _has_text(source):
+        # browsers put an image's <img> markup next to its pixels; that alone is not text
+        if not source.hasHtml():
+            return bool(source.text().strip())
+        text = QTextDocumentFragment.fromHtml(source.html()).toPlainText()
+        return bool(text.replace("\ufffc", "").strip())
+
+    def _pasted_image(self, source):
+        ingest = self.image_ingester()
+        # the encoded bytes when the clipboard offers them, so nothing is re-encoded
+        for mime in PASTED_IMAGE_FORMATS:
+            if source.hasFormat(mime):
+                ingested = ingest(bytes(source.data(mime)))
+                if ingested is not None:
+                    return ingested
+        image = source.imageData()
+        if not isinstance(image, QImage) or image.isNull():
+            return None
+        buf = QBuffer()
+        buf.open(QIODevice.WriteOnly)
+        image.save(buf, "PNG")
+        return ingest(bytes(buf.data()))
+
+    def _pasted_image_files(self, source):
+        paths = [url.toLocalFile() for url in source.urls() if url.isLocalFile()]
+        if not paths or len(paths) != len(source.urls()) or not all(QImageReader(p).canRead() for p in paths):
+            return []
+        ingest_data = self.image_ingester()
+
+        def ingest(path):
+            try:
+                key, data = FILE_IMAGE_CACHE.key(path)
+            except OSError:
+                return None
+            return ingest_data(data, original_key=key)
+        return _map_images(ingest, paths)
+
+    @property
+    def image_store(self):
+        return self.document().image_store
+
+    @image_store.setter
+    def image_store(self, store):
+        self.document().reset_images(store)
+
+
+SNIPPET_ROLE = Qt.UserRole + 1
+MODIFIED_ROLE = Qt.UserRole + 2
+SIZE_ROLE = Qt.UserRole + 3
+PREVIEW_ROLE = Qt.UserRole + 4
+
+# rows the results view adds each time it scrolls to the end
+RESULT_PAGE = 500
+RESULT_ICON_SIZE = 40
+RESULT_ICON_CACHE_BYTES = 8 * 1024 * 1024
+# sorting runs on a worker in chunks this long, merged after, so it never holds the GIL for long
+RESULT_SORT_CHUNK = 4096
+# rows that stream in while sorted are sorted in after this long
+RESULT_RESORT_MS = 300
+
+
+def _result_sort_keys():
+    # key name -> (key over a row, descending); None keeps the order found in
+    return {
+        None: (lambda row: row[3], False),
+        "name": (lambda row: os.path.basename(row[0]).casefold(), False),
+        "modified": (lambda row: row[1].get("modified", 0), True),
+        "size": (lambda row: row[1].get("size", 0), True),
+    }
+
+
+def _results_info_job(generation, paths, signal):
+    """
+    Info and icons for result rows about to be drawn. Images are decoded
+    here; pixmaps are made on the GUI thread.
+    """
+    found = []
+    for path in paths:
+        info, uri = VOC_INFO_CACHE.get(path, thumbnail=True)
+        image = None
+        dm = _DATA_URI_RE.match(uri) if uri else None
+        if dm and dm.group(2):
+            image = QImage.fromData(base64.b64decode(dm.group(3)))
+            if not image.isNull():
+                image = image.scaled(RESULT_ICON_SIZE, RESULT_ICON_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        found.append((path, info, image))
+    signal.emit(generation, found)
+
+
+def _sort_results_job(generation, rows, key, signal):
+    """
+    rows sorted by one of _result_sort_keys, and the row each path is now
+    at. Files whose info was never read are read here, since they cannot
+    be placed without it.
+    """
+    key, descending = _result_sort_keys()[key]
+    # copies: the model's own rows stay the GUI thread's alone; these replace them
+    rows = [list(row) for row in rows]
+    for row in rows:
+        if row[1] is None:
+            row[1] = VOC_INFO_CACHE.get(row[0])[0]
+    chunks = [sorted(rows[i:i + RESULT_SORT_CHUNK], key=key, reverse=descending)
+              for i in range(0, len(rows), RESULT_SORT_CHUNK)]
+    rows = list(heapq.merge(*chunks, key=key, reverse=descending))
+    signal.emit(generation, (rows, {row[0]: n for n, row in enumerate(rows)}))
+
+
+class ResultsModel(QAbstractListModel):
+    """
+    Search results for files_list: one small row per hit, [path, info,
+    snippet html, order found]. Rows reach the view a page at a time
+    (fetchMore). Rows found without info get it from VOC_INFO_CACHE on a
+    worker when first drawn; sorting runs on a worker too.
+    """
+    _fetched = pyqtSignal(int, object)
+    _sorted = pyqtSignal(int, object)
+
+    def __init__(self, pool, parent=None):
+        super().__init__(parent)
+        self._pool = pool
+        self._rows = []
+        self._shown = 0
+        self._row_of = {}
+        # bumped whenever the rows change under a pending job
+        self._generation = 0
+        self._wanted = []
+        self._requested = set()
+        self._icons = PixmapCache(RESULT_ICON_CACHE_BYTES)
+        self.sort_key = None
+        # file_summary of the UI language, for tooltips
+        self.summary_format = None
+        self._sorting = False
+        self._fetch_timer = QTimer(self)
+        self._fetch_timer.setSingleShot(True)
+        self._fetch_timer.timeout.connect(self._fetch_wanted)
+        self._resort_timer = QTimer(self)
+        self._resort_timer.setSingleShot(True)
+        self._resort_timer.setInterval(RESULT_RESORT_MS)
+        self._resort_timer.timeout.connect(self._sort)
+        self._fetched.connect(self._on_fetched)
+        self._sorted.connect(self._on_sorted)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._shown
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._shown < len(self._rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(RESULT_PAGE, len(self._rows) - self._shown)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._shown, self._shown + count - 1)
+        self._shown += count
+        self.endInsertRows()
+
+    def total(self):
+        return len(self._rows)
+
+    def clear(self):
+        self.beginResetModel()
+        self._generation += 1
+        self._rows = []
+        self._shown = 0
+        self._row_of = {}
+        self._wanted = []
+        self._requested.clear()
+        self._sorting = False
+        self._resort_timer.stop()
+        self.endResetModel()
+
+    def extend(self, hits):
+        """
+        Append (path, info or None, snippet html or None) hits.
+        """
+        start = len(self._rows)
+        for n, (path, info, snippet) in enumerate(hits, start):
+            self._rows.append([path, info or None, snippet, n])
+            self._row_of[path] = n
+        if self._shown < RESULT_PAGE:
+            self.fetchMore()
+        if self.sort_key is not None:
+            self._resort_timer.start()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path, info, snippet, _order = self._rows[index.row()]
+        if role == Qt.UserRole:
+            return path
+        if role == SNIPPET_ROLE:
+            return snippet
+        if info is None and role in (Qt.DisplayRole, Qt.DecorationRole, MODIFIED_ROLE, SIZE_ROLE, PREVIEW_ROLE):
+            self._want(path)
+        info = info or {}
+        if role == Qt.DisplayRole:
+            return info.get("title") or os.path.basename(path)
+        if role == Qt.DecorationRole:
+            pixmap = self._icons.get(path)
+            if pixmap is None and info.get("thumbnail"):
+                self._want(path)
+            return pixmap
+        if role == MODIFIED_ROLE:
+            return info.get("modified")
+        if role == SIZE_ROLE:
+            return info.get("size")
+        if role == PREVIEW_ROLE:
+            return info.get("preview")
+        if role == Qt.ToolTipRole:
+            if not info or not self.summary_format:
+                return path
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["modified"]))
+            return f"{path}\n" + self.summary_format.format(
+                words=info["words"], images=info["images"], modified=modified)
+        return None
+
+    def _want(self, path):
+        if path not in self._requested:
+            self._requested.add(path)
+            self._wanted.append(path)
+            self._fetch_timer.start()
+
+    def _fetch_wanted(self):
+        paths, self._wanted = self._wanted, []
+        self._pool.submit(_results_info_job, self._generation, paths, self._fetched)
+
+    def _on_fetched(self, generation, found):
+        if generation != self._generation:
+            return
+        for path, info, image in found:
+            # asked again if its icon is evicted later
+            self._requested.discard(path)
+            n = self._row_of.get(path)
+            if n is None:
+                continue
+            if image is not None and not image.isNull():
+                self._icons.put(path, QPixmap.fromImage(image))
+            elif info.get("thumbnail"):
+                info = dict(info, thumbnail=False)
+            self._rows[n][1] = info
+            if n < self._shown:
+                index = self.index(n)
+                self.dataChanged.emit(index, index)
+
+    def sort_by(self, key):
+        """
+        Order the rows by a _result_sort_keys key; the view keeps the old
+        order until the worker is done.
+        """
+        self.sort_key = key
+        self._sort()
+
+    def _sort(self):
+        if self._sorting:
+            # one sort at a time; the rows that came in meanwhile get the next one
+            self._resort_timer.start()
+            return
+        self._sorting = True
+        self._pool.submit(_sort_results_job, self._generation, list(self._rows), self.sort_key, self._sorted)
+
+    def _on_sorted(self, generation, result):
+        if generation != self._generation:
+            return
+        self._sorting = False
+        rows, row_of = result
+        # rows found while sorting go after the sorted ones, until the next sort
+        for n, row in enumerate(self._rows[len(rows):], len(rows)):
+            rows.append(row)
+            row_of[row[0]] = n
+        self.beginResetModel()
+        self._rows = rows
+        self._row_of = row_of
+        self.endResetModel()
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ResultDelegate(QStyledItemDelegate):
+    """
+    Draws a search result in one row of fixed height: icon, title and a
+    second line (the content match, or the folder), then preview, modified
+    time and size columns. Content matches are drawn as rich text, so their
+    matched words show in bold.
+    """
+    def paint(self, painter, option, index):
+        option = QStyleOptionViewItem(option)
+        self.initStyleOption(option, index)
+        option.text = ""
+        option.icon = QIcon()
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, option, painter, option.widget)
+        selected = option.state & QStyle.State_Selected
+        text = option.palette.highlightedText() if selected else option.palette.text()
+        muted = text.color()
+        muted.setAlpha(150)
+        rect = option.rect.adjusted(4, 2, -4, -2)
+        painter.save()
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None:
+            painter.drawPixmap(rect.left() + (RESULT_ICON_SIZE - pixmap.width()) // 2,
+                               rect.top() + (rect.height() - pixmap.height()) // 2, pixmap)
+        rect.setLeft(rect.left() + RESULT_ICON_SIZE + 6)
+        fm = option.fontMetrics
+        line = fm.height()
+        size = index.data(SIZE_ROLE)
+        modified = index.data(MODIFIED_ROLE)
+        size_width = fm.horizontalAdvance("000.0 MB")
+        modified_width = fm.horizontalAdvance("0000-00-00 00:00")
+        right = QRectF(rect.right() - size_width, rect.top(), size_width, rect.height())
+        painter.setPen(muted)
+        if size is not None:
+            painter.drawText(right, Qt.AlignRight | Qt.AlignVCenter, _format_size(size))
+        right.translate(-modified_width - 12, 0)
+        right.setWidth(modified_width)
+        if modified is not None:
+            painter.drawText(right, Qt.AlignRight | Qt.AlignVCenter,
+                             time.strftime("%Y-%m-%d %H:%M", time.localtime(modified)))
+        rest = right.left() - 12 - rect.left()
+        main_width = int(rest * 0.6)
+        preview = index.data(PREVIEW_ROLE)
+        if preview:
+            box = QRectF(rect.left() + main_width + 6, rect.top(), rest - main_width - 6, rect.height())
+            painter.drawText(box, Qt.AlignLeft | Qt.AlignVCenter,
+                             fm.elidedText(preview, Qt.ElideRight, int(box.width())))
+        bold = QFont(option.font)
+        bold.setBold(True)
+        painter.setFont(bold)
+        painter.setPen(text.color())
+        title = QFontMetrics(bold).elidedText(index.data(Qt.DisplayRole) or "", Qt.ElideRight, main_width)
+        painter.drawText(QRectF(rect.left(), rect.top(), main_width, line), Qt.AlignLeft | Qt.AlignVCenter, title)
+        painter.setFont(option.font)
+        second = QRectF(rect.left(), rect.top() + line, main_width, rect.height() - line)
+        snippet = index.data(SNIPPET_ROLE)
+        if snippet:
+            doc = QTextDocument()
+            doc.setDocumentMargin(0)
+            doc.setDefaultFont(option.font)
+            doc.setHtml(f'<span style="color:{text.color().name()}">{snippet}</span>')
+            painter.translate(second.topLeft())
+            painter.setClipRect(QRectF(0, 0, second.width(), second.height()))
+            doc.drawContents(painter)
+        else:
+            painter.setPen(muted)
+            folder = os.path.dirname(index.data(Qt.UserRole) or "")
+            painter.drawText(second, Qt.AlignLeft | Qt.AlignTop, fm.elidedText(folder, Qt.ElideMiddle, main_width))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        # every row alike, so the view can use uniform item sizes
+        return QSize(400, max(RESULT_ICON_SIZE, 2 * option.fontMetrics.height()) + 8)
+
+
+# ---------------------------
+# Result preview
+# ---------------------------
+# top-level elements a preview shows, and how much of a body is read to find them
+PREVIEW_BLOCKS = FIRST_SCREEN_BLOCKS
+PREVIEW_BYTES = 256 * 1024
+PREVIEW_CACHE_BYTES = 32 * 1024 * 1024
+
+_BODY_OPEN_RE = re.compile(r'<body[^>]*>', re.IGNORECASE)
+_V1_CONTENT_RE = re.compile(r'\s*\{\s*"content"\s*:\s*"')
+
+
+def _first_blocks(html, blocks):
+    """
+    (html of the first blocks top-level elements of html, whether any were
+    left out). html may itself be cut off partway through an element.
+    """
+    m = _BODY_OPEN_RE.search(html)
+    head, body = (html[:m.end()], html[m.end():]) if m else ("", html)
+    units = list(itertools.islice(iter_html_units(body), blocks + 1))
+    if not units:
+        # not even one whole element: the start of its text will do
+        text = html_to_text(body).strip()
+        return "".join(f"<p>{_html_escape(line)}</p>" for line in text.splitlines()), bool(text)
+    return head + "".join(units[:blocks]) + ("</body></html>" if m else ""), len(units) > blocks
+
+
+def _v1_content_head(path, size):
+    """
+    About the first size bytes of a v1 file's content, without parsing the
+    rest of its JSON. None if the file does not start with its content, or
+    the content ends within them.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(size).decode('utf-8', 'ignore')
+    m = _V1_CONTENT_RE.match(raw)
+    if m is None:
+        return None
+    raw = raw[m.end():]
+    # the read may have split an escape sequence (at most a surrogate pair) in two
+    for end in range(len(raw), max(0, len(raw) - 12) - 1, -1):
+        try:
+            return json.loads(f'"{raw[:end]}"')
+        except ValueError:
+            continue
+    return None
+
+
+def read_voc_preview(path, blocks=PREVIEW_BLOCKS, size=PREVIEW_BYTES):
+    """
+    What the preview pane shows of a .voc file: (html of its first blocks
+    top-level elements, image store, journal entries cut to match, bytes
+    held). Only the start of the body is read, unless a v1 file is laid
+    out unexpectedly. Pure Python apart from the container, so it runs on
+    a worker.
+    """
+    if not is_voc_container(path):
+        html = _v1_content_head(path, size) if os.path.getsize(path) > size else None
+        if html is None:
+            html, _meta, _container = read_voc_file(path)
+        store = VocImageStore()
+        html, _keys = _externalize_images(_first_blocks(html, blocks)[0], store, parallel=False)
+        return html, store, [], 2 * len(html) + store.held_bytes()
+    container = VocContainer(path)
+    html = _first_blocks(container.body_head(size), blocks)[0]
+    journal = []
+    for entry in container.journal():
+        entry_html, cut = _first_blocks(entry["html"], blocks)
+        # an entry cut short leaves the blocks after it unknown: it runs to the end of the preview
+        journal.append(dict(entry, html=entry_html, removed=sys.maxsize if cut else entry["removed"]))
+    return html, VocImageStore(container), journal, 2 * (len(html) + sum(len(e["html"]) for e in journal))
+
+
+def preview_voc_job(generation, key, cancelled, signal):
+    # key is (path, mtime_ns, size); a newer selection makes this one moot before it starts
+    if cancelled():
+        return
+    try:
+        preview = read_voc_preview(key[0])
+    except Exception:
+        preview = None
+    try:
+        signal.emit(generation, key, preview)
+    except RuntimeError:
+        # the pane was deleted while we were reading
+        pass
+
+
+class PreviewCache(PixmapCache):
+    """
+    Least-recently-used previews from read_voc_preview, bounded by the
+    bytes they hold. GUI thread only.
+    """
+
+    @staticmethod
+    def cost(preview):
+        return preview[3]
+
+
+class PreviewPane(VocTextEdit):
+    """
+    Read-only preview of the selected search result. Files are read on a
+    worker and kept in a PreviewCache keyed by path, mtime and size, so
+    going back to one shows it at once; until a file is read its summary
+    stands in. Images decode lazily, as in the editor.
+    """
+    _loaded = pyqtSignal(int, object, object)
+
+    def __init__(self, pool, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self._pool = pool
+        self._cache = PreviewCache(PREVIEW_CACHE_BYTES)
+        self._generation = 0
+        self._key = None
+        self._loaded.connect(self._on_loaded)
+
+    def show_file(self, path, summary=""):
+        """
+        Preview path; summary (plain text) is shown until it has been read.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.clear_preview()
+            return
+        key = (path, st.st_mtime_ns, st.st_size)
+        if key == self._key:
+            return
+        self._key = key
+        self._generation += 1
+        preview = self._cache.get(key)
+        if preview is not None:
+            self._show(preview)
+            return
+        self.image_store = VocImageStore()
+        self.setPlainText(summary)
+        generation = self._generation
+        self._pool.submit(preview_voc_job, generation, key, lambda: generation != self._generation, self._loaded)
+
+    def clear_preview(self):
+        self._key = None
+        self._generation += 1
+        self.image_store = VocImageStore()
+        self.clear()
+
+    def _on_loaded(self, generation, key, preview):
+        if preview is None:
+            # unreadable: the summary stays
+            return
+        self._cache.put(key, preview)
+        if generation == self._generation:
+            self._show(preview)
+
+    def _show(self, preview):
+        html, store, journal, _cost = preview
+        self.image_store = store
+        self.setHtml(html)
+        # the preview is the start of the saved body; entries past its end change nothing in it
+        doc = self.document()
+        for entry in journal:
+            count = doc.blockCount()
+            if entry["start"] < count:
+                apply_journal(doc, [dict(entry, removed=min(entry["removed"], count - entry["start"]))])
+        self.verticalScrollBar().setValue(0)
+
+
+# ---------------------------
+# Find and replace
+# ---------------------------
+# blocks matched as one piece of text; matches are kept per chunk this long
+FIND_CHUNK_BLOCKS = 500
+FIND_SLICE_MS = 8
+# after an edit, matching starts over once the document has been still this long
+FIND_RESTART_MS = 150
+# however many matches are on screen, at most this many are highlighted
+FIND_HIGHLIGHT_LIMIT = 1000
+FIND_HIGHLIGHT_COLOR = QColor("#FFE27A")
+
+_ASTRAL_RE = re.compile("[\U00010000-\U0010ffff]")
+
+
+def find_pattern(text, case=False, words=False, regex=False):
+    """
+    Compiled pattern for what the find bar holds; None if it is empty.
+    Raises re.error for a bad regex. ^ and $ match at the ends of each
+    paragraph.
+    """
+    if not text:
+        return None
+    pattern = text if regex else re.escape(text)
+    if words:
+        pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+    return re.compile(pattern, re.MULTILINE | (0 if case else re.IGNORECASE))
+
+
+def _find_text(text):
+    # paragraph, line and table breaks all end a line for the pattern
+    for sep in ("\u2029", "\u2028", "\ufdd0", "\ufdd1"):
+        text = text.replace(sep, "\n")
+    return text
+
+
+class DocumentMatches(QObject):
+    """
+    Where a pattern matches in a QTextDocument. Matches never span
+    paragraphs. They are found a chunk of FIND_CHUNK_BLOCKS blocks at a
+    time: a chunk is matched when first asked for, and the rest in
+    time-sliced batches from the event loop, from the chunk in view
+    onwards. Any edit throws them away and matching starts over.
+    """
+    progress = pyqtSignal()
+    restarted = pyqtSignal()
+
+    def __init__(self, document, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self.pattern = None
+        self.count = 0
+        self._chunks = {}
+        self._order = iter(())
+        self._from_block = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._step)
+        self._restart_timer = QTimer(self)
+        self._restart_timer.setSingleShot(True)
+        self._restart_timer.setInterval(FIND_RESTART_MS)
+        self._restart_timer.timeout.connect(self._restart)
+        document.contentsChange.connect(self._on_change)
+
+    def set_pattern(self, pattern, from_block=0):
+        self.pattern = pattern
+        self._from_block = from_block
+        self._restart_timer.stop()
+        self._restart()
+
+    def chunk_count(self):
+        return -(-self.document.blockCount() // FIND_CHUNK_BLOCKS)
+
+    def done(self):
+        return self.pattern is None or len(self._chunks) == self.chunk_count()
+
+    def _chunk_at(self, position):
+        position = max(0, min(position, self.document.characterCount() - 1))
+        return self.document.findBlock(position).blockNumber() // FIND_CHUNK_BLOCKS
+
+    def chunk(self, k):
+        """
+        (positions, lengths) of the matches in chunk k, in document order.
+        """
+        found = self._chunks.get(k)
+        if found is None:
+            positions, lengths = array("q"), array("I")
+            for position, length, _m in self.iter_matches(k):
+                positions.append(position)
+                lengths.append(length)
+            found = self._chunks[k] = (positions, lengths)
+            self.count += len(positions)
+        return found
+
+    def iter_matches(self, k):
+        """
+        (position, length, match) for each match in chunk k.
+        """
+        for text, base in self._chunk_texts(k):
+            astral = [m.start() for m in _ASTRAL_RE.finditer(text)]
+            for m in self.pattern.finditer(_find_text(text)):
+                start, end = m.span()
+                if start == end or "\n" in m.group():
+                    continue
+                if astral:
+                    start += bisect_left(astral, start)
+                    end += bisect_left(astral, end)
+                yield base + start, end - start, m
+
+    def _chunk_texts(self, k):
+        # (text, position) runs covering chunk k: its selected text in one
+        # piece when that lines up with document positions, else block by block
+        doc = self.document
+        first = doc.findBlockByNumber(k * FIND_CHUNK_BLOCKS)
+        last = doc.findBlockByNumber(min(doc.blockCount(), (k + 1) * FIND_CHUNK_BLOCKS) - 1)
+        if not first.isValid():
+            return
+        start = first.position()
+        end = last.position() + last.length() - 1
+        cursor = QTextCursor(doc)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        text = cursor.selectedText()
+        if len(text) + len(_ASTRAL_RE.findall(text)) == end - start:
+            yield text, start
+            return
+        # a selection into a table grows to whole cells
+        block = first
+        while block.isValid() and block.blockNumber() <= last.blockNumber():
+            yield block.text(), block.position()
+            block = block.next()
+
+    def match_at(self, position):
+        """
+        The match object of the match starting at position, matched against
+        the same text the positions were found in; None if none starts there.
+        """
+        if self.pattern is None:
+            return None
+        for start, _length, m in self.iter_matches(self._chunk_at(position)):
+            if start >= position:
+                return m if start == position else None
+        return None
+
+    def next_match(self, position, backward=False):
+        """
+        (position, length) of the first match starting at or after position,
+        or the last one before it if backward, wrapping around the document;
+        None if there is none.
+        """
+        if self.pattern is None:
+            return None
+        n = self.chunk_count()
+        k = self._chunk_at(position)
+        if backward:
+            order = [(c, True) for c in range(k, -1, -1)] + [(c, False) for c in range(n - 1, k - 1, -1)]
+        else:
+            order = [(c, True) for c in range(k, n)] + [(c, False) for c in range(k + 1)]
+        for c, bounded in order:
+            positions, lengths = self.chunk(c)
+            if backward:
+                i = (bisect_left(positions, position) if bounded else len(positions)) - 1
+                if i >= 0:
+                    return positions[i], lengths[i]
+            else:
+                i = bisect_left(positions, position) if bounded else 0
+                if i < len(positions):
+                    return positions[i], lengths[i]
+        return None
+
+    def between(self, start, end):
+        """
+        (position, length) of the matches starting in [start, end), at most
+        FIND_HIGHLIGHT_LIMIT of them.
+        """
+        found = []
+        if self.pattern is None:
+            return found
+        for k in range(self._chunk_at(start), self._chunk_at(end) + 1):
+            positions, lengths = self.chunk(k)
+            i, j = bisect_left(positions, start), bisect_left(positions, end)
+            found.extend(zip(positions[i:j], lengths[i:j]))
+            if len(found) >= FIND_HIGHLIGHT_LIMIT:
+                return found[:FIND_HIGHLIGHT_LIMIT]
+        return found
+
+    def rank(self, position):
+        """
+        1-based number of the match at position; only once all are found.
+        """
+        k = self._chunk_at(position)
+        before = sum(len(self._chunks[c][0]) for c in range(k))
+        return before + bisect_left(self.chunk(k)[0], position) + 1
+
+    def _on_change(self, _position, removed, added):
+        if self.pattern is None or not (removed or added):
+            return
+        self._chunks = {}
+        self.count = 0
+        self._timer.stop()
+        self._restart_timer.start()
+
+    def _restart(self):
+        self._chunks = {}
+        self.count = 0
+        n = self.chunk_count()
+        start = min(n, self._from_block // FIND_CHUNK_BLOCKS)
+        self._order = itertools.chain(range(start, n), range(start))
+        if self.pattern is None:
+            self._timer.stop()
+        else:
+            self._timer.start()
+        self.restarted.emit()
+
+    def _step(self):
+        clock = QElapsedTimer()
+        clock.start()
+        while clock.elapsed() < FIND_SLICE_MS:
+            k = next(self._order, None)
+            if k is None:
+                self._timer.stop()
+                break
+            self.chunk(k)
+        self.progress.emit()
+
+
+class FindBar(QWidget):
+    """
+    Find and replace over an editor's document, with case, whole-word and
+    regex options. Matches are counted in the background by
+    DocumentMatches; only those on screen are highlighted, as extra
+    selections, so the bar stays quick however many there are. Replace all
+    is a single undo step.
+    """
+
+    def __init__(self, editor, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.trans = TRANSLATIONS["en-US"]
+        self._message = None
+        self.matches = DocumentMatches(editor.document(), self)
+        self.matches.progress.connect(self._update_count)
+        self.matches.restarted.connect(self._on_restarted)
+
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+        self.find_input = QLineEdit()
+        self.find_input.textChanged.connect(self._update_pattern)
+        self.find_input.returnPressed.connect(self._find_from_input)
+        layout.addWidget(self.find_input, stretch=2)
+        self.replace_input = QLineEdit()
+        self.replace_input.returnPressed.connect(self.replace)
+        layout.addWidget(self.replace_input, stretch=2)
+        self.case_check = QCheckBox()
+        self.words_check = QCheckBox()
+        self.regex_check = QCheckBox()
+        for check in (self.case_check, self.words_check, self.regex_check):
+            check.toggled.connect(self._update_pattern)
+            layout.addWidget(check)
+        self.prev_btn = QPushButton()
+        self.prev_btn.clicked.connect(self.find_previous)
+        self.next_btn = QPushButton()
+        self.next_btn.clicked.connect(self.find_next)
+        self.replace_btn = QPushButton()
+        self.replace_btn.clicked.connect(self.replace)
+        self.replace_all_btn = QPushButton()
+        self.replace_all_btn.clicked.connect(self.replace_all)
+        for btn in (self.prev_btn, self.next_btn, self.replace_btn, self.replace_all_btn):
+            layout.addWidget(btn)
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+        self.close_btn = QPushButton("✕")
+        self.close_btn.setFlat(True)
+        self.close_btn.clicked.connect(self.close_bar)
+        layout.addWidget(self.close_btn)
+
+        editor.verticalScrollBar().valueChanged.connect(self.highlight)
+        editor.verticalScrollBar().rangeChanged.connect(self.highlight)
+        self.hide()
+
+    def retranslate(self, trans):
+        self.trans = trans
+        self.find_input.setPlaceholderText(trans["find"])
+        self.replace_input.setPlaceholderText(trans["replace_with"])
+        self.case_check.setText(trans["match_case"])
+        self.words_check.setText(trans["whole_words"])
+        self.regex_check.setText(trans["regex"])
+        self.prev_btn.setText(trans["find_previous"])
+        self.next_btn.setText(trans["find_next"])
+        self.replace_btn.setText(trans["replace"])
+        self.replace_all_btn.setText(trans["replace_all"])
+        self._update_count()
+
+    def open_bar(self):
+        selected = self.editor.textCursor().selectedText()
+        if selected and " " not in selected:
+            self.find_input.setText(selected)
+        self.show()
+        self.find_input.setFocus()
+        self.find_input.selectAll()
+        self._update_pattern()
+
+    def close_bar(self):
+        self.hide()
+        self.matches.set_pattern(None)
+        self.editor.setExtraSelections([])
+        self.editor.setFocus()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.close_bar()
+        else:
+            super().keyPressEvent(event)
+
+    def _update_pattern(self):
+        self._message = None
+        if not self.isVisible():
+            return
+        try:
+            pattern = find_pattern(self.find_input.text(), self.case_check.isChecked(),
+                                   self.words_check.isChecked(), self.regex_check.isChecked())
+        except re.error:
+            pattern = None
+            self._message = self.trans["find_bad_pattern"]
+        first, _last = self._visible_range()
+        self.matches.set_pattern(pattern, self.editor.document().findBlock(first).blockNumber())
+
+    def _visible_range(self):
+        # (first, last) document position on screen, by a binary search over
+        # where blocks were laid out. cursorForPosition walks the whole layout,
+        # and blockBoundingRect lays out everything up to the block it is asked about.
+        doc = self.editor.document()
+        top = self.editor.verticalScrollBar().value()
+        bottom = top + self.editor.viewport().height()
+
+        def block_at(y):
+            lo, hi = 0, doc.blockCount() - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                layout = doc.findBlockByNumber(mid).layout()
+                # blocks not laid out yet are past the view
+                if layout.lineCount() and layout.position().y() + layout.boundingRect().height() <= y:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return doc.findBlockByNumber(lo)
+        last = block_at(bottom)
+        return block_at(top).position(), last.position() + last.length() - 1
+
+    def highlight(self):
+        if not self.isVisible():
+            return
+        first, last = self._visible_range()
+        fmt = QTextCharFormat()
+        fmt.setBackground(FIND_HIGHLIGHT_COLOR)
+        selections = []
+        for position, length in self.matches.between(first, last + 1):
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = QTextCursor(self.editor.document())
+            selection.cursor.setPosition(position)
+            selection.cursor.setPosition(position + length, QTextCursor.KeepAnchor)
+            selection.format = fmt
+            selections.append(selection)
+        self.editor.setExtraSelections(selections)
+
+    def _on_restarted(self):
+        self.highlight()
+        self._update_count()
+
+    def _current_match(self):
+        # (position, length) of the match the editor has selected, if it has one
+        cursor = self.editor.textCursor()
+        if not cursor.hasSelection():
+            return None
+        found = self.matches.next_match(cursor.selectionStart())
+        if found == (cursor.selectionStart(), cursor.selectionEnd() - cursor.selectionStart()):
+            return found
+        return None
+
+    def _update_count(self):
+        if self._message is not None:
+            text = self._message
+        elif self.matches.pattern is None:
+            text = ""
+        elif not self.matches.done():
+            text = self.trans["find_count"].format(count=self.matches.count) + "…"
+        elif not self.matches.count:
+            text = self.trans["find_none"]
+        else:
+            current = self._current_match()
+            if current is not None:
+                text = self.trans["find_position"].format(current=self.matches.rank(current[0]),
+                                                         count=self.matches.count)
+            else:
+                text = self.trans["find_count"].format(count=self.matches.count)
+        self.count_label.setText(text)
+
+    def _find_from_input(self):
+        self.find_previous() if QApplication.keyboardModifiers() & Qt.ShiftModifier else self.find_next()
+
+    def find_next(self):
+        self._go(self.editor.textCursor().selectionEnd(), False)
+
+    def find_previous(self):
+        self._go(self.editor.textCursor().selectionStart(), True)
+
+    def _go(self, position, backward):
+        found = self.matches.next_match(position, backward)
+        if found is None:
+            self._update_count()
+            return
+        cursor = QTextCursor(self.editor.document())
+        cursor.setPosition(found[0])
+        cursor.setPosition(found[0] + found[1], QTextCursor.KeepAnchor)
+        self.editor.setTextCursor(cursor)
+        self.editor.ensureCursorVisible()
+        self._message = None
+        self.highlight()
+        self._update_count()
+
+    def _replacement(self, match):
+        text = self.replace_input.text()
+        return match.expand(text) if self.regex_check.isChecked() else text
+
+    def replace(self):
+        """
+        Replace the selected match, if there is one, and go to the next.
+        """
+        current = self._current_match()
+        m = self.matches.match_at(current[0]) if current is not None else None
+        if m is not None:
+            try:
+                replacement = self._replacement(m)
+            except (re.error, IndexError):
+                self._message = self.trans["find_bad_pattern"]
+                self._update_count()
+                return
+            cursor = self.editor.textCursor()
+            cursor.insertText(replacement)
+            self.editor.setTextCursor(cursor)
+        self.find_next()
+
+    def replace_all(self):
+        """
+        Replace every match, as one edit the user can undo in one step.
+        """
+        if self.matches.pattern is None:
+            return
+        text = self.replace_input.text()
+        found = []
+        try:
+            for k in range(self.matches.chunk_count()):
+                if self.regex_check.isChecked():
+                    found.extend((position, length, self._replacement(m))
+                                 for position, length, m in self.matches.iter_matches(k))
+                else:
+                    # the counted matches will do; no need to match again
+                    positions, lengths = self.matches.chunk(k)
+                    found.extend(zip(positions, lengths, itertools.repeat(text)))
+        except (re.error, IndexError):
+            self._message = self.trans["find_bad_pattern"]
+            self._update_count()
+            return
+        cursor = QTextCursor(self.editor.document())
+        cursor.beginEditBlock()
+        # from the end, so the positions still to replace stay put
+        for position, length, replacement in reversed(found):
+            cursor.setPosition(position)
+            cursor.setPosition(position + length, QTextCursor.KeepAnchor)
+            cursor.insertText(replacement)
+        cursor.endEditBlock()
+        self._message = self.trans["find_replaced"].format(count=len(found))
+        self._update_count()
+
+
+class MainWindow(QMainWindow):
+    def __init__(self, data_dir=None):
+        super().__init__()
+        # where the search indexes are kept; tests and benchmarks pass a scratch folder
+        self.data_dir = data_dir or get_app_data_path()
+        self.current_filepath = None
+        self.lang = "en-US"
+        self.trans = TRANSLATIONS[self.lang]
+
+        self.setWindowTitle(self.trans["app_title"])
+        self.resize(1200, 780)
+
+        central = QWidget()
+        central_layout = QVBoxLayout()
+        central.setLayout(central_layout)
+        self.setCentralWidget(central)
+
+        # Toolbar
+        self.toolbar = QToolBar("Formatting")
+        self.toolbar.setIconSize(QSize(18, 18))
+        self.toolbar.setStyleSheet("background: #FFFFFF; border-bottom: 1px solid #cfe8fb;")
+        self.addToolBar(self.toolbar)
+
+        # Editor
+        self.editor = VocTextEdit()
+        self.editor.setStyleSheet("background: #E7F0FA; padding: 10px;")
+        self.editor.setAcceptRichText(True)
+        self.editor.image_ingester = self._image_ingester
+        self.find_bar = FindBar(self.editor)
+        central_layout.addWidget(self.find_bar)
+        central_layout.addWidget(self.editor)
+        self.change_tracker = BlockChangeTracker(self.editor.document())
+
+        # Bottom: search and file list
+        bottom_widget = QWidget()
+        bottom_layout = QHBoxLayout()
+        bottom_widget.setLayout(bottom_layout)
+        central_layout.addWidget(bottom_widget, stretch=0)
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText(self.trans["search"])
+        self.search_input.textChanged.connect(self._search_names)
+        self.search_input.returnPressed.connect(self.search_voc_files)
+        bottom_layout.addWidget(self.search_input)
+
+        self.search_btn = QPushButton(self.trans["search"])
+        self.search_btn.clicked.connect(self.search_voc_files)
+        bottom_layout.addWidget(self.search_btn)
+
+        self.search_dir_combo = QComboBox()
+        self.search_dir_combo.addItem(self.trans["desktop_search"], get_desktop_path())
+        self.search_dir_combo.addItem("Home", os.path.expanduser("~"))
+        bottom_layout.addWidget(self.search_dir_combo)
+
+        self.search_content_check = QCheckBox(self.trans["search_contents"])
+        bottom_layout.addWidget(self.search_content_check)
+
+        self.search_depth_spin = QSpinBox()
+        self.search_depth_spin.setRange(0, 64)
+        self.search_depth_spin.setValue(SEARCH_MAX_DEPTH)
+        self.search_depth_spin.setToolTip(self.trans["search_depth"])
+        bottom_layout.addWidget(self.search_depth_spin)
+
+        self.search_count_label = QLabel()
+        bottom_layout.addWidget(self.search_count_label)
+
+        self.sort_combo = QComboBox()
+        for key in (None, "name", "modified", "size"):
+            self.sort_combo.addItem(self.trans[f"sort_{key or 'relevance'}"], key)
+        bottom_layout.addWidget(self.sort_combo)
+
+        # results live in a model and are drawn a page at a time; see ResultsModel
+        results_widget = QWidget()
+        results_widget.setMaximumHeight(160)
+        results_layout = QHBoxLayout()
+        results_layout.setContentsMargins(0, 0, 0, 0)
+        results_widget.setLayout(results_layout)
+        central_layout.addWidget(results_widget)
+        self.files_list = QListView()
+        self.files_list.setUniformItemSizes(True)
+        self.files_list.setIconSize(QSize(RESULT_ICON_SIZE, RESULT_ICON_SIZE))
+        self.files_list.doubleClicked.connect(self.open_voc_from_list)
+        self.files_list.setItemDelegate(ResultDelegate(self.files_list))
+        results_layout.addWidget(self.files_list, stretch=3)
+        # the selected result, read on its own worker so it never waits behind a search
+        self._preview_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="voc-preview")
+        self.preview = PreviewPane(self._preview_pool)
+        self.preview.setStyleSheet("background: #FFFFFF;")
+        results_layout.addWidget(self.preview, stretch=2)
+
+        self._loader = None
+
+        # Searches scan on a worker and stream their matches back; starting one cancels the last
+        self._search_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="voc-search")
+        self.results_model = ResultsModel(self._search_pool, self)
+        self.files_list.setModel(self.results_model)
+        self.files_list.selectionModel().currentChanged.connect(self._preview_result)
+        self.sort_combo.currentIndexChanged.connect(lambda: self.results_model.sort_by(self.sort_combo.currentData()))
+        self._search_generation = 0
+        self._search_cancelled = threading.Event()
+        self._search_count = None
+        self._search_running = False
+        self._search_query = None
+        self._content_index = None
+        # file names match as you type, from an index kept between sessions;
+        # each folder is walked again once a session, in the background
+        self.name_index = FilenameIndex(os.path.join(self.data_dir, NAMES_FILE))
+        self._names_loaded = False
+        self._name_query = None
+        self._cataloged = set()
+        self._catalog_cancelled = threading.Event()
+        # the index follows the search folders: a watcher queues changed folders for a refresh
+        self._index_watcher = None
+        self._changed_folders = set()
+        self._index_timer = QTimer(self)
+        self._index_timer.setSingleShot(True)
+        self._index_timer.setInterval(INDEX_WATCH_DELAY_MS)
+        self._index_timer.timeout.connect(self._refresh_changed_folders)
+        self.index_signals = IndexSignals()
+        self.index_signals.refreshed.connect(self._on_index_refreshed)
+        self.search_signals = SearchSignals()
+        self.search_signals.found.connect(self._on_search_found)
+        self.search_signals.indexed.connect(self._on_search_indexed)
+        self.search_signals.cataloged.connect(self._on_cataloged)
+        self.search_signals.finished.connect(self._on_search_finished)
+
+        # Saves are encoded and written on a single worker so they land in order
+        self._save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="voc-save")
+        self._pending_saves = 0
+        self.save_signals = SaveSignals()
+        self.save_signals.progress.connect(self._on_save_progress)
+        self.save_signals.finished.connect(self._on_save_finished)
+        self.save_signals.failed.connect(self._on_save_failed)
+        self.save_progress = QProgressBar()
+        self.save_progress.setRange(0, 100)
+        self.save_progress.setMaximumWidth(200)
+        self.save_progress.hide()
+        self.statusBar().addPermanentWidget(self.save_progress)
+
+        # Build actions and UI
+        self._create_actions()
+        self._create_format_toolbar()
+        self._create_menus()
+        self.retranslate_ui()
+
+        # catch up with whatever changed while the editor was closed
+        QTimer.singleShot(0, self._resume_index)
+        self._search_pool.submit(load_names_job, self.name_index, self.search_signals)
+
+    # ---------------------------
+    # Actions
+    # ---------------------------
+    def _create_actions(self):
+        # File actions
+        self.act_new = QAction("", self)
+        self.act_new.setShortcut("Ctrl+N")
+        self.act_new.triggered.connect(self.action_new)
+
+        self.act_open = QAction("", self)
+        self.act_open.setShortcut("Ctrl+O")
+        self.act_open.triggered.connect(self.action_open)
+
+        self.act_save = QAction("", self)
+        self.act_save.setShortcut("Ctrl+S")
+        self.act_save.triggered.connect(self.action_save)
+
+        self.act_save_as = QAction("", self)
+        self.act_save_as.triggered.connect(self.action_save_as)
+
+        self.act_incremental_save = QAction("", self)
+        self.act_incremental_save.setCheckable(True)
+        self.act_incremental_save.setChecked(True)
+
+        self.act_compact = QAction("", self)
+        self.act_compact.triggered.connect(self.action_compact)
+
+        # Compression used for the next full save (recorded per file in its header)
+        self.save_codec = VOC_DEFAULT_CODEC
+        self.codec_group = QActionGroup(self)
+        self.codec_actions = {}
+        for codec_id in sorted(VOC_CODECS):
+            name = VOC_CODECS[codec_id][0]
+            act = QAction(name, self)
+            act.setCheckable(True)
+            act.setChecked(name == self.save_codec)
+            act.triggered.connect(partial(self.set_save_codec, name))
+            self.codec_group.addAction(act)
+            self.codec_actions[name] = act
+
+        self.act_exit = QAction("", self)
+        self.act_exit.triggered.connect(self.close)
+
+        # Formatting actions
+        self.act_bold = QAction("B", self)
+        self.act_bold.setCheckable(True)
+        self.act_bold.setShortcut("Ctrl+B")
+        self.act_bold.triggered.connect(self.toggle_bold)
+
+        self.act_italic = QAction("I", self)
+        self.act_italic.setCheckable(True)
+        self.act_italic.setShortcut("Ctrl+I")
+        self.act_italic.triggered.connect(self.toggle_italic)
+
+        self.act_underline = QAction("U", self)
+        self.act_underline.setCheckable(True)
+        self.act_underline.setShortcut("Ctrl+U")
+        self.act_underline.triggered.connect(self.toggle_underline)
+
+        self.act_align_left = QAction("L", self)
+        self.act_align_left.triggered.connect(partial(self.set_alignment, Qt.AlignLeft))
+
+        self.act_align_center = QAction("C", self)
+        self.act_align_center.setShortcut("Ctrl+E")
+        self.act_align_center.triggered.connect(partial(self.set_alignment, Qt.AlignCenter))
+
+        self.act_align_right = QAction("R", self)
+        self.act_align_right.triggered.connect(partial(self.set_alignment, Qt.AlignRight))
+
+        # Undo/Redo
+        self.act_undo = QAction("", self)
+        self.act_undo.setShortcut("Ctrl+Z")
+        self.act_undo.triggered.connect(self.editor.undo)
+
+        self.act_redo = QAction("", self)
+        self.act_redo.setShortcut("Ctrl+Y")
+        self.act_redo.triggered.connect(self.editor.redo)
+
+        self.act_find = QAction("", self)
+        self.act_find.setShortcut("Ctrl+F")
+        self.act_find.triggered.connect(self.find_bar.open_bar)
+
+        # Insert image / table
+        self.act_insert_image = QAction("", self)
+        self.act_insert_image.triggered.connect(self.insert_image)
+
+        self.act_insert_images = QAction("", self)
+        self.act_insert_images.triggered.connect(self.insert_images)
+
+        # How inserted images are resampled before they go into the document
+        self.image_quality = IMAGE_DEFAULT_QUALITY
+        self.image_quality_group = QActionGroup(self)
+        self.image_quality_actions = {}
+        for name in IMAGE_QUALITY_PRESETS:
+            act = QAction("", self)
+            act.setCheckable(True)
+            act.setChecked(name == self.image_quality)
+            act.triggered.connect(partial(self.set_image_quality, name))
+            self.image_quality_group.addAction(act)
+            self.image_quality_actions[name] = act
+
+        self.act_keep_originals = QAction("", self)
+        self.act_keep_originals.setCheckable(True)
+
+        self.act_use_original_image = QAction("", self)
+        self.act_use_original_image.triggered.connect(self.use_original_image)
+
+        self.act_insert_table = QAction("", self)
+        self.act_insert_table.triggered.connect(self.insert_table)
+
+        # Styles
+        self.style_label = QLabel(self.trans.get("style_label", "Style:"))
+        self.style_combo = QComboBox()
+        self.style_combo.currentIndexChanged.connect(self.apply_style_from_combo)
+
+        # Color actions (use buttons)
+        self.text_color_btn = QPushButton("A")
+        self.text_color_btn.setToolTip(self.trans.get("text_color", "Text Color"))
+        self.text_color_btn.clicked.connect(self.choose_text_color)
+        self.text_color_btn.setFixedWidth(32)
+        self.text_color_btn.setStyleSheet("font-weight: bold;")
+
+        self.bg_color_btn = QPushButton("▯")
+        self.bg_color_btn.setToolTip(self.trans.get("bg_color", "Highlight Color"))
+        self.bg_color_btn.clicked.connect(self.choose_bg_color)
+        self.bg_color_btn.setFixedWidth(32)
+
+    def _create_format_toolbar(self):
+        # Font family
+        self.font_combo = QFontComboBox()
+        self.font_combo.currentFontChanged.connect(self.set_font_family)
+        self.toolbar.addWidget(self.font_combo)
+        try:
+            self.font_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+
+        # Font size
+        self.font_size = QSpinBox()
+        self.font_size.setRange(6, 96)
+        self.font_size.setValue(12)
+        self.font_size.valueChanged.connect(self.set_font_size)
+        self.toolbar.addWidget(self.font_size)
+
+        # Format buttons
+        self.toolbar.addAction(self.act_bold)
+        self.toolbar.addAction(self.act_italic)
+        self.toolbar.addAction(self.act_underline)
+
+        self.toolbar.addSeparator()
+        self.toolbar.addAction(self.act_align_left)
+        self.toolbar.addAction(self.act_align_center)
+        self.toolbar.addAction(self.act_align_right)
+
+        self.toolbar.addSeparator()
+        # Style label and combo
+        self.toolbar.addWidget(self.style_label)
+        self.toolbar.addWidget(self.style_combo)
+        try:
+            self.style_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+
+        self.toolbar.addSeparator()
+        self.toolbar.addAction(self.act_insert_image)
+        self.toolbar.addAction(self.act_insert_table)
+
+        self.toolbar.addSeparator()
+        self.toolbar.addAction(self.act_undo)
+        self.toolbar.addAction(self.act_redo)
+
+        self.toolbar.addSeparator()
+        # Color buttons
+        self.toolbar.addWidget(QLabel(" "))
+        self.toolbar.addWidget(self.text_color_btn)
+        self.toolbar.addWidget(self.bg_color_btn)
+
+        self.toolbar.addSeparator()
+        # Language combo
+        self.lang_combo = QComboBox()
+        for name, code in LANG_CHOICES:
+            self.lang_combo.addItem(name, code)
+        self.lang_combo.setCurrentIndex(0)
+        self.lang_combo.currentIndexChanged.connect(self.lang_changed)
+        self.toolbar.addWidget(QLabel(" "))
+        self.toolbar.addWidget(self.lang_combo)
+        try:
+            self.lang_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+
+        # Ensure search_dir_combo popup style
+        try:
+            self.search_dir_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+
+    def _create_menus(self):
+        menubar = self.menuBar()
+        # create menus but set titles in retranslate_ui for translation support
+        self.menu_file = menubar.addMenu("")
+        self.menu_file.addAction(self.act_new)
+        self.menu_file.addAction(self.act_open)
+        self.menu_file.addAction(self.act_save)
+        self.menu_file.addAction(self.act_save_as)
+        self.menu_file.addAction(self.act_incremental_save)
+        self.menu_file.addAction(self.act_compact)
+        self.menu_compression = self.menu_file.addMenu("")
+        for act in self.codec_group.actions():
+            self.menu_compression.addAction(act)
+        self.menu_file.addSeparator()
+        self.menu_file.addAction(self.act_exit)
+
+        self.menu_edit = menubar.addMenu("")
+        self.menu_edit.addAction(self.act_undo)
+        self.menu_edit.addAction(self.act_redo)
+        self.menu_edit.addSeparator()
+        self.menu_edit.addAction(self.act_find)
+
+        self.menu_insert = menubar.addMenu("")
+        self.menu_insert.addAction(self.act_insert_image)
+        self.menu_insert.addAction(self.act_insert_images)
+        self.menu_insert.addAction(self.act_insert_table)
+        self.menu_insert.addSeparator()
+        self.menu_image_quality = self.menu_insert.addMenu("")
+        for act in self.image_quality_group.actions():
+            self.menu_image_quality.addAction(act)
+        self.menu_insert.addAction(self.act_keep_originals)
+        self.menu_insert.addAction(self.act_use_original_image)
+
+    # ---------------------------
+    # Formatting helpers
+    # ---------------------------
+    def toggle_bold(self):
+        fmt = QTextCharFormat()
+        current_weight = self.editor.fontWeight()
+        if current_weight == QFont.Bold:
+            fmt.setFontWeight(QFont.Normal)
+            self.act_bold.setChecked(False)
+        else:
+            fmt.setFontWeight(QFont.Bold)
+            self.act_bold.setChecked(True)
+        cursor = self.editor.textCursor()
+        cursor.mergeCharFormat(fmt)
+        self.editor.mergeCurrentCharFormat(fmt)
+
+    def toggle_italic(self):
+        cursor = self.editor.textCursor()
+        fmt = QTextCharFormat()
+        fmt.setFontItalic(not self.editor.fontItalic())
+        self.act_italic.setChecked(fmt.fontItalic())
+        cursor.mergeCharFormat(fmt)
+        self.editor.mergeCurrentCharFormat(fmt)
+
+    def toggle_underline(self):
+        cursor = self.editor.textCursor()
+        fmt = QTextCharFormat()
+        fmt.setFontUnderline(not self.editor.fontUnderline())
+        self.act_underline.setChecked(fmt.fontUnderline())
+        cursor.mergeCharFormat(fmt)
+        self.editor.mergeCurrentCharFormat(fmt)
+
+    def set_alignment(self, alignment):
+        self.editor.setAlignment(alignment)
+
+    def set_font_family(self, qfont):
+        fmt = QTextCharFormat()
+        fmt.setFontFamily(qfont.family())
+        cursor = self.editor.textCursor()
+        cursor.mergeCharFormat(fmt)
+        self.editor.mergeCurrentCharFormat(fmt)
+
+    def set_font_size(self, size):
+        fmt = QTextCharFormat()
+        fmt.setFontPointSize(size)
+        cursor = self.editor.textCursor()
+        cursor.mergeCharFormat(fmt)
+        self.editor.mergeCurrentCharFormat(fmt)
+
+    # ---------------------------
+    # Styles (extended)
+    # ---------------------------
+    def apply_style_from_combo(self, index):
+        style = self.style_combo.itemText(index)
+        self.apply_style(style)
+
+    def apply_style(self, style_name):
+        cursor = self.editor.textCursor()
+        if not cursor:
+            return
+        block_fmt = QTextBlockFormat()
+        char_fmt = QTextCharFormat()
+
+        # Match against translated labels and common English names
+        title_names = (self.trans.get("style_title"), "Title", "标题", "タイトル")
+        subtitle_names = (self.trans.get("style_subtitle"), "Subtitle", "副标题", "サブタイトル")
+        subtitle2_names = (self.trans.get("style_subtitle2"), "Subtitle 2")
+        h1_names = (self.trans.get("style_h1"), "Heading 1")
+        h2_names = (self.trans.get("style_h2"), "Heading 2")
+        quote_names = (self.trans.get("style_quote"), "Quote")
+        code_names = (self.trans.get("style_code"), "Code", "代码")
+        mono_names = (self.trans.get("style_mono"), "Monospace", "等宽")
+        small_names = (self.trans.get("style_small"), "Small")
+        large_names = (self.trans.get("style_large"), "Large")
+        emphasis_names = (self.trans.get("style_emphasis"), "Emphasis", "强调")
+
+        if style_name in title_names:
+            block_fmt.setAlignment(Qt.AlignCenter)
+            char_fmt.setFontPointSize(28)
+            char_fmt.setFontWeight(QFont.Bold)
+        elif style_name in subtitle_names:
+            block_fmt.setAlignment(Qt.AlignCenter)
+            char_fmt.setFontPointSize(20)
+            char_fmt.setFontItalic(True)
+        elif style_name in subtitle2_names:
+            block_fmt.setAlignment(Qt.AlignCenter)
+            char_fmt.setFontPointSize(16)
+        elif style_name in h1_names:
+            block_fmt.setAlignment(Qt.AlignLeft)
+            char_fmt.setFontPointSize(24)
+            char_fmt.setFontWeight(QFont.Bold)
+        elif style_name in h2_names:
+            block_fmt.setAlignment(Qt.AlignLeft)
+            char_fmt.setFontPointSize(18)
+            char_fmt.setFontWeight(QFont.Bold)
+        elif style_name in quote_names:
+            block_fmt.setLeftMargin(24)
+            char_fmt.setFontItalic(True)
+            char_fmt.setFontPointSize(12)
+        elif style_name in code_names:
+            # monospace look with gray background
+            char_fmt.setFontFamily("Courier New")
+            char_fmt.setFontPointSize(11)
+            char_fmt.setFontFixedPitch(True)
+            char_fmt.setBackground(QBrush(QColor("#F5F5F5")))
+        elif style_name in mono_names:
+            char_fmt.setFontFamily("Courier New")
+            char_fmt.setFontPointSize(12)
+        elif style_name in small_names:
+            char_fmt.setFontPointSize(10)
+        elif style_name in large_names:
+            char_fmt.setFontPointSize(16)
+        elif style_name in emphasis_names:
+            char_fmt.setFontItalic(True)
+            char_fmt.setFontWeight(QFont.DemiBold)
+        else:
+            # Normal
+            block_fmt.setAlignment(Qt.AlignLeft)
+            char_fmt.setFontPointSize(12)
+            char_fmt.setFontWeight(QFont.Normal)
+            char_fmt.setFontItalic(False)
+
+        cursor.beginEditBlock()
+        cursor.setBlockFormat(block_fmt)
+        cursor.mergeCharFormat(char_fmt)
+        self.editor.mergeCurrentCharFormat(char_fmt)
+        cursor.endEditBlock()
+
+    # ---------------------------
+    # Color features
+    # ---------------------------
+    def choose_text_color(self):
+        color = QColorDialog.getColor(parent=self, title=self.trans.get("text_color", "Text Color"))
+        if not color.isValid():
+            return
+        fmt = QTextCharFormat()
+        fmt.setForeground(QBrush(color))
+        cursor = self.editor.textCursor()
+        if cursor.hasSelection():
+            cursor.mergeCharFormat(fmt)
+        else:
+            # apply for typing forward
+            self.editor.mergeCurrentCharFormat(fmt)
+        # update button background to indicate color
+        self.text_color_btn.setStyleSheet(f"background: {color.name()}; color: white; font-weight:bold;")
+
+    def choose_bg_color(self):
+        color = QColorDialog.getColor(parent=self, title=self.trans.get("bg_color", "Highlight Color"))
+        if not color.isValid():
+            return
+        fmt = QTextCharFormat()
+        fmt.setBackground(QBrush(color))
+        cursor = self.editor.textCursor()
+        if cursor.hasSelection():
+            cursor.mergeCharFormat(fmt)
+        else:
+            self.editor.mergeCurrentCharFormat(fmt)
+        self.bg_color_btn.setStyleSheet(f"background: {color.name()}; color: white;")
+
+    # ---------------------------
+    # Insert image / table (robust)
+    # ---------------------------
+    def insert_image(self):
+        path, _ = QFileDialog.getOpenFileName(self, self.trans["insert_image"], "", "Images (*.png *.jpg *.jpeg *.bmp *.gif);;All Files (*)")
+        if not path:
+            return
+        ingested = self._ingest_images([path])[0]
+        if ingested is None:
+            QMessageBox.warning(self, self.trans["insert_image"], f"{self.trans.get('insert_image_error', 'Cannot load image:')} {path}")
+            return
+        self._insert_ingested(self.editor.textCursor(), ingested)
+
+    def insert_images(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, self.trans["insert_images"], "", "Images (*.png *.jpg *.jpeg *.bmp *.gif);;All Files (*)")
+        if not paths:
+            return
+        self.statusBar().showMessage(self.trans["inserting_images"].format(count=len(paths)))
+        QApplication.processEvents()
+        # resampled side by side on the image pool, then inserted as one undo step
+        results = self._ingest_images(paths)
+        cursor = self.editor.textCursor()
+        cursor.beginEditBlock()
+        failed = []
+        first = True
+        for path, ingested in zip(paths, results):
+            if ingested is None:
+                failed.append(path)
+                continue
+            if not first:
+                cursor.insertBlock()
+            first = False
+            self._insert_ingested(cursor, ingested)
+        cursor.endEditBlock()
+        self.editor.setTextCursor(cursor)
+        self.statusBar().clearMessage()
+        if failed:
+            QMessageBox.warning(self, self.trans["insert_images"],
+                                self.trans.get('insert_image_error', 'Cannot load image:') + "\n" + "\n".join(failed))
+
+    def _image_ingester(self):
+        return partial(ingest_image_data, store=self.editor.image_store, quality=self.image_quality,
+                       keep_original=self.act_keep_originals.isChecked())
+
+    def _ingest_images(self, paths):
+        return _map_images(partial(ingest_image, store=self.editor.image_store, quality=self.image_quality,
+                                   keep_original=self.act_keep_originals.isChecked()), paths)
+
+    def _insert_ingested(self, cursor, ingested):
+        src, w, h = ingested
+        img_fmt = QTextImageFormat()
+        img_fmt.setName(src)
+        if w is not None:
+            img_fmt.setWidth(w)
+            img_fmt.setHeight(h)
+        cursor.insertImage(img_fmt)
+
+    def use_original_image(self):
+        """
+        Swap the image before the cursor (or the selected one) for the original it was downscaled from.
+        """
+        cursor = self.editor.textCursor()
+        if not cursor.hasSelection():
+            # select the character before the cursor; charFormat() reports the one before position()
+            cursor.movePosition(QTextCursor.Left)
+            cursor.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor)
+        fmt = cursor.charFormat()
+        keys = _voc_image_keys(fmt.toImageFormat().name()) if fmt.isImageFormat() else []
+        if len(keys) < 2:
+            self.statusBar().showMessage(self.trans["no_original_image"], 3000)
+            return
+        img_fmt = fmt.toImageFormat()
+        img_fmt.setName(f"{VOC_IMAGE_SCHEME}:{keys[1]}")
+        cursor.setCharFormat(img_fmt)
+
+    def insert_table(self):
+        # 获取行列，使用翻译文本
+        rows, ok1 = QInputDialog.getInt(self, self.trans.get("table_title", "Insert Table"), self.trans.get("rows_label", "Rows:"), 2, 1, 50)
+        if not ok1:
+            return
+        cols, ok2 = QInputDialog.getInt(self, self.trans.get("table_title", "Insert Table"), self.trans.get("cols_label", "Columns:"), 2, 1, 20)
+        if not ok2:
+            return
+        cursor = self.editor.textCursor()
+        # 使用 QTextTableFormat 避免游标问题
+        try:
+            table_fmt = QTextTableFormat()
+            table_fmt.setBorder(1)
+            table_fmt.setCellPadding(4)
+            table_fmt.setCellSpacing(2)
+            table = cursor.createTable(rows, cols, table_fmt)
+            # 将光标定位到第一个单元格的起始位置（更安全）
+            try:
+                cell = table.cellAt(0, 0)
+                new_cursor = cell.firstCursorPosition()
+                self.editor.setTextCursor(new_cursor)
+            except Exception:
+                pass
+        except Exception as e:
+            QMessageBox.warning(self, self.trans.get("table_title", "Insert Table"), f"Failed to insert table:\n{e}")
+
+    # ---------------------------
+    # File operations
+    # ---------------------------
+    def action_new(self):
+        reply = QMessageBox.question(self, self.trans["new"], self.trans["confirm_clear"],
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.current_filepath = None
+            self._cancel_loading()
+            self.editor.clear()
+            self.editor.image_store = VocImageStore()
+            self.change_tracker.reset()
+
+    def action_open(self):
+        desktop = get_desktop_path()
+        fname, _ = QFileDialog.getOpenFileName(self, self.trans["open"], desktop, "VOC files (*.voc);;All Files (*)")
+        if fname:
+            try:
+                self._load_voc_file(fname)
+            except Exception as e:
+                QMessageBox.warning(self, self.trans["open"], f"{self.trans['open_error']}\n{e}")
+
+    def _load_voc_file(self, path):
+        html, _meta, container = read_voc_file(path)
+        journal = container.journal() if container is not None else []
+        store = VocImageStore(container)
+        if container is None:
+            # v1 files inline their images as data: URIs; keep only the
+            # encoded bytes so they are decoded when first shown
+            html, _keys = _externalize_images(html, store)
+        self._cancel_loading()
+        self.editor.image_store = store
+        if container is not None:
+            self.set_save_codec(container.codec)
+        self.current_filepath = path
+        self.statusBar().showMessage(self.trans["loading"])
+        self._loader = ProgressiveLoader(self.editor, html, self)
+        self._loader.finished.connect(partial(self._on_load_finished, journal))
+        self._loader.start()
+
+    def _on_load_finished(self, journal):
+        if journal:
+            doc = self.editor.document()
+            doc.setUndoRedoEnabled(False)
+            apply_journal(doc, journal)
+            doc.setUndoRedoEnabled(True)
+        self.change_tracker.reset()
+        self._loader = None
+        self.statusBar().clearMessage()
+
+    def is_loading(self):
+        return self._loader is not None
+
+    def _finish_loading(self):
+        if self._loader is not None:
+            self._loader.finish_now()
+
+    def _cancel_loading(self):
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+            self.statusBar().clearMessage()
+
+    def action_save(self):
+        desktop = get_desktop_path()
+        if platform.system() != "Windows":
+            QMessageBox.information(self, "Info", self.trans["not_windows"])
+        if self.current_filepath:
+            try:
+                if os.path.commonpath([os.path.abspath(self.current_filepath), os.path.abspath(desktop)]) == os.path.abspath(desktop):
+                    target = self.current_filepath
+                else:
+                    name, ok = QInputDialog.getText(self, self.trans["save"], self.trans["filename_prompt"])
+                    if not ok or not name.strip():
+                        return
+                    filename = ensure_extension(name.strip())
+                    target = os.path.join(desktop, filename)
+            except Exception:
+                name, ok = QInputDialog.getText(self, self.trans["save"], self.trans["filename_prompt"])
+                if not ok or not name.strip():
+                    return
+                filename = ensure_extension(name.strip())
+                target = os.path.join(desktop, filename)
+        else:
+            name, ok = QInputDialog.getText(self, self.trans["save"], self.trans["filename_prompt"])
+            if not ok or not name.strip():
+                return
+            filename = ensure_extension(name.strip())
+            target = os.path.join(desktop, filename)
+
+        self._write_voc_file(target)
+        self.current_filepath = target
+
+    def action_save_as(self):
+        desktop = get_desktop_path()
+        if platform.system() != "Windows":
+            QMessageBox.information(self, "Info", self.trans["not_windows"])
+        name, ok = QInputDialog.getText(self, self.trans["save_as"], self.trans["filename_prompt"])
+        if not ok or not name.strip():
+            return
+        filename = ensure_extension(name.strip())
+        target = os.path.join(desktop, filename)
+        self._write_voc_file(target)
+        self.current_filepath = target
+
+    def action_compact(self):
+        if not self.current_filepath or not is_voc_container(self.current_filepath):
+            QMessageBox.warning(self, self.trans["compact"], self.trans["no_file_selected"])
+            return
+        self._write_voc_file(self.current_filepath, compact=True)
+
+    def set_image_quality(self, name):
+        self.image_quality = name
+        self.image_quality_actions[name].setChecked(True)
+
+    def set_save_codec(self, name):
+        self.save_codec = name
+        self.codec_actions[name].setChecked(True)
+
+    def _can_append_journal(self, path):
+        container = self.editor.image_store.container
+        if not self.act_incremental_save.isChecked() or container is None:
+            return False
+        if os.path.abspath(container.path) != os.path.abspath(path) or not is_voc_container(path):
+            return False
+        if container.codec != self.save_codec:
+            # switching codecs needs a full rewrite
+            return False
+        if self.change_tracker.saving:
+            # an entry is relative to what is on disk, which a queued save may still change
+            return False
+        journal = container.chunk_lengths(b"JRNL")
+        body = sum(container.chunk_lengths(b"BODY"))
+        if len(journal) >= VOC_JOURNAL_MAX_ENTRIES or sum(journal) > body * VOC_JOURNAL_MAX_RATIO:
+            return False
+        return not self.change_tracker.dirty or self.change_tracker.span() is not None
+
+    def _summary_source(self):
+        doc = self.editor.document()
+        return doc.toPlainText(), first_image_name(doc)
+
+    def _write_voc_file(self, path, compact=False):
+        """
+        Snapshot the document on the GUI thread; encoding and writing run on the save worker.
+        Returns the worker's future, or None if there was nothing to write.
+        """
+        self._finish_loading()
+        store = self.editor.image_store
+        if not compact and self._can_append_journal(path):
+            if not self.change_tracker.dirty:
+                self.statusBar().showMessage(self.trans["saved"], 3000)
+                return None
+            entry = make_journal_entry(self.editor.document(), *self.change_tracker.span())
+            job = partial(append_journal_job, path, entry, store, self._summary_source())
+        else:
+            meta = {
+                "saved_by": "Voc Editor (Python/PyQt5)",
+                "platform": platform.platform(),
+            }
+            job = partial(save_voc_job, path, serialize_document(self.editor.document()), meta, store,
+                          self.save_codec, self._summary_source())
+        token = self.change_tracker.begin_save()
+        self._pending_saves += 1
+        self.save_progress.setValue(0)
+        self.save_progress.show()
+        self.statusBar().showMessage(self.trans["saving"])
+        return self._save_pool.submit(self._run_save_job, path, store, job, token)
+
+    def _run_save_job(self, path, store, job, token):
+        # runs on the save worker: only talk back through signals
+        signals = self.save_signals
+        try:
+            keys = job(lambda done, total: signals.progress.emit(int(done * 100 / max(total, 1))))
+        except Exception as e:
+            signals.failed.emit(path, str(e), token)
+            return
+        signals.finished.emit(path, store, keys, token)
+
+    def _on_save_progress(self, percent):
+        self.save_progress.setValue(percent)
+
+    def _save_done(self):
+        self._pending_saves -= 1
+        if not self._pending_saves:
+            self.save_progress.hide()
+
+    def _on_save_finished(self, path, store, keys, token):
+        self._save_done()
+        self.change_tracker.commit(token)
+        store.rebase(VocContainer(path), keys)
+        self.statusBar().showMessage(self.trans["saved"], 3000)
+        if self._content_index is not None or os.path.exists(self._index_path()):
+            # the file just written is all that changed; no need to rescan its folder
+            self._search_pool.submit(self.content_index().index_file, path)
+        try:
+            # the same mtime the catalog walk would record for the file
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        self._search_pool.submit(self.name_index.update, [(path, mtime)])
+
+    def _on_save_failed(self, path, error, token):
+        self._save_done()
+        self.statusBar().clearMessage()
+        self.change_tracker.invalidate(token)
+        QMessageBox.warning(self, self.trans["save"], f"Save failed: {error}")
+
+    def closeEvent(self, event):
+        # let queued saves finish before the process goes away
+        self._cancel_loading()
+        self._search_cancelled.set()
+        self._catalog_cancelled.set()
+        self._save_pool.shutdown(wait=True)
+        # deliver the finished saves now: their slots queue index updates on the search pool
+        QApplication.sendPostedEvents(None, QEvent.MetaCall)
+        self._search_pool.shutdown(wait=False)
+        self._preview_pool.shutdown(wait=False)
+        super().closeEvent(event)
+
+    # ---------------------------
+    # Search & quick open
+    # ---------------------------
+    def search_voc_files(self):
+        self._search_cancelled.set()
+        self._search_cancelled = threading.Event()
+        self._search_generation += 1
+        self.results_model.clear()
+        search_term = self.search_input.text().strip().lower()
+        dirpath = self.search_dir_combo.currentData()
+        if not dirpath:
+            dirpath = get_desktop_path()
+        self._search_count = 0
+        self._search_running = True
+        self._search_query = None
+        self._name_query = None
+        if self.search_content_check.isChecked() and search_term:
+            # answer from the index at once; refresh it for this folder in the background
+            index = self.content_index()
+            self._search_query = (search_term, dirpath)
+            self._show_content_results(index.search(search_term, dirpath))
+            self._search_pool.submit(refresh_index_job, self._search_generation, index, dirpath,
+                                     self.search_depth_spin.value(), self._search_cancelled, self.search_signals)
+            return
+        self._update_search_count()
+        self._search_pool.submit(search_voc_job, self._search_generation, dirpath, search_term,
+                                 self.search_depth_spin.value(), self._search_cancelled, self.search_signals,
+                                 self.name_index)
+
+    def _search_names(self, text):
+        # as you type: ranked file name matches straight from the name index,
+        # without touching the disk
+        text = text.strip()
+        if not text or self.search_content_check.isChecked():
+            return
+        self._search_cancelled.set()
+        self._search_generation += 1
+        self._search_running = False
+        self._search_query = None
+        self._name_query = text
+        dirpath = self.search_dir_combo.currentData() or get_desktop_path()
+        results = self.name_index.search(text, dirpath)
+        self.results_model.clear()
+        self.results_model.extend((path, None, None) for path in results)
+        self._search_count = len(results)
+        self._update_search_count()
+        if self._names_loaded and dirpath not in self._cataloged:
+            self._cataloged.add(dirpath)
+            self._search_pool.submit(catalog_voc_job, self.name_index, dirpath, self.search_depth_spin.value(),
+                                     self._catalog_cancelled, self.search_signals)
+
+    def _on_cataloged(self, root):
+        # root is empty once the saved index has loaded
+        if not root:
+            self._names_loaded = True
+        if self._name_query and self._name_query == self.search_input.text().strip():
+            self._search_names(self._name_query)
+
+    def _on_search_found(self, generation, batch):
+        if generation != self._search_generation:
+            return
+        self.results_model.extend((path, info, None) for path, info in batch)
+        self._search_count += len(batch)
+        self._update_search_count()
+
+    def _index_path(self):
+        return os.path.join(self.data_dir, INDEX_FILE)
+
+    def content_index(self):
+        if self._content_index is None:
+            self._content_index = VocIndex(self._index_path())
+            self._index_watcher = QFileSystemWatcher(self)
+            self._index_watcher.directoryChanged.connect(self._on_folder_changed)
+        return self._content_index
+
+    def _index_roots(self):
+        roots = (self.search_dir_combo.itemData(i) for i in range(self.search_dir_combo.count()))
+        return list(dict.fromkeys(os.path.abspath(r) for r in roots if r))
+
+    def _resume_index(self):
+        # only once content search has been used: never build an index unasked
+        if self._content_index is None and not os.path.exists(self._index_path()):
+            return
+        index = self.content_index()
+        roots = self._index_roots()
+        folders = [root for root in roots if index.directories(root)]
+        self._search_pool.submit(update_index_job, index, folders, self.search_depth_spin.value(),
+                                 roots, self.index_signals)
+
+    def _on_folder_changed(self, folder):
+        self._changed_folders.add(folder)
+        self._index_timer.start()
+
+    def _refresh_changed_folders(self):
+        folders, self._changed_folders = sorted(self._changed_folders), set()
+        # one level down as well, so a folder moved in whole is picked up
+        self._search_pool.submit(update_index_job, self.content_index(), folders, 1,
+                                 self._index_roots(), self.index_signals)
+
+    def _on_index_refreshed(self, folders, changed):
+        watched = set(self._index_watcher.directories())
+        wanted = [f for f in folders if f not in watched and os.path.isdir(f)]
+        if wanted:
+            self._index_watcher.addPaths(wanted)
+        if changed and self._search_query:
+            self._show_content_results(self.content_index().search(*self._search_query))
+
+    def _show_content_results(self, results):
+        self.results_model.clear()
+        self.results_model.extend((path, None, snippet) for path, _title, snippet in results)
+        self._search_count = len(results)
+        self._update_search_count()
+
+    def _on_search_indexed(self, generation, changed):
+        if generation == self._search_generation and changed and self._search_query:
+            self._show_content_results(self.content_index().search(*self._search_query))
+        # newly indexed folders are worth watching
+        self._search_pool.submit(update_index_job, self.content_index(), [], 0, self._index_roots(), self.index_signals)
+
+    def _on_search_finished(self, generation, _total):
+        if generation == self._search_generation:
+            self._search_running = False
+            self._update_search_count()
+
+    def _update_search_count(self):
+        if self._search_count is None:
+            self.search_count_label.clear()
+            return
+        key = "searching_count" if self._search_running else "search_count"
+        self.search_count_label.setText(self.trans[key].format(count=self._search_count))
+
+    def _preview_result(self, index):
+        path = index.data(Qt.UserRole)
+        if not path:
+            self.preview.clear_preview()
+            return
+        summary = "\n\n".join(text for text in (index.data(Qt.DisplayRole), index.data(PREVIEW_ROLE)) if text)
+        self.preview.show_file(path, summary)
+
+    def open_voc_from_list(self, index):
+        path = index.data(Qt.UserRole)
+        if not path:
+            QMessageBox.warning(self, self.trans["open"], self.trans["no_file_selected"])
+            return
+        try:
+            self._load_voc_file(path)
+        except Exception as e:
+            QMessageBox.warning(self, self.trans["open"], f"{self.trans['open_error']}\n{e}")
+
+    # ---------------------------
+    # Language
+    # ---------------------------
+    def lang_changed(self, index):
+        code = self.lang_combo.itemData(index)
+        if not code:
+            return
+        self.lang = code
+        self.trans = TRANSLATIONS.get(self.lang, TRANSLATIONS["en-US"])
+        self.retranslate_ui()
+
+    def retranslate_ui(self):
+        # Window title and menus/actions
+        self.setWindowTitle(self.trans["app_title"])
+        self.act_new.setText(self.trans["new"])
+        self.act_open.setText(self.trans["open"])
+        self.act_save.setText(self.trans["save"])
+        self.act_save_as.setText(self.trans["save_as"])
+        self.act_incremental_save.setText(self.trans["incremental_save"])
+        self.act_compact.setText(self.trans["compact"])
+        self.act_exit.setText(self.trans["exit"])
+
+        # Update menu titles
+        self.menu_file.setTitle(self.trans.get("menu_file", "File"))
+        self.menu_edit.setTitle(self.trans.get("menu_edit", "Edit"))
+        self.menu_insert.setTitle(self.trans.get("menu_insert", "Insert"))
+        self.menu_compression.setTitle(self.trans["compression"])
+        self.codec_actions["none"].setText(self.trans["compression_none"])
+
+        # Tooltips and buttons
+        self.act_bold.setToolTip(self.trans["bold"])
+        self.act_italic.setToolTip(self.trans["italic"])
+        self.act_underline.setToolTip(self.trans["underline"])
+        self.act_align_left.setToolTip(self.trans["align_left"])
+        self.act_align_center.setToolTip(self.trans["align_center"])
+        self.act_align_right.setToolTip(self.trans["align_right"])
+
+        self.search_input.setPlaceholderText(self.trans["search"])
+        self.search_btn.setText(self.trans["search"])
+        self.search_dir_combo.setItemText(0, self.trans["desktop_search"])
+        self.search_depth_spin.setToolTip(self.trans["search_depth"])
+        self.search_content_check.setText(self.trans["search_contents"])
+        for i in range(self.sort_combo.count()):
+            self.sort_combo.setItemText(i, self.trans[f"sort_{self.sort_combo.itemData(i) or 'relevance'}"])
+        self.results_model.summary_format = self.trans["file_summary"]
+        self._update_search_count()
+
+        self.act_insert_image.setText(self.trans["insert_image"])
+        self.act_insert_images.setText(self.trans["insert_images"])
+        self.menu_image_quality.setTitle(self.trans["image_quality"])
+        for name, act in self.image_quality_actions.items():
+            act.setText(self.trans[f"image_quality_{name}"])
+        self.act_keep_originals.setText(self.trans["keep_originals"])
+        self.act_use_original_image.setText(self.trans["use_original_image"])
+        self.act_insert_table.setText(self.trans["insert_table"])
+
+        self.act_undo.setText(self.trans["undo"])
+        self.act_redo.setText(self.trans["redo"])
+        self.act_find.setText(self.trans["find_replace"])
+        self.find_bar.retranslate(self.trans)
+
+        # Style label and combo items
+        self.style_label.setText(self.trans.get("style_label", "Style:"))
+        current_index = self.style_combo.currentIndex()
+        self.style_combo.blockSignals(True)
+        self.style_combo.clear()
+        self.style_combo.addItem(self.trans.get("style_normal", "Normal"))
+        self.style_combo.addItem(self.trans.get("style_title", "Title"))
+        self.style_combo.addItem(self.trans.get("style_subtitle", "Subtitle"))
+        self.style_combo.addItem(self.trans.get("style_subtitle2", "Subtitle 2"))
+        self.style_combo.addItem(self.trans.get("style_h1", "Heading 1"))
+        self.style_combo.addItem(self.trans.get("style_h2", "Heading 2"))
+        self.style_combo.addItem(self.trans.get("style_quote", "Quote"))
+        self.style_combo.addItem(self.trans.get("style_code", "Code"))
+        self.style_combo.addItem(self.trans.get("style_mono", "Monospace"))
+        self.style_combo.addItem(self.trans.get("style_small", "Small"))
+        self.style_combo.addItem(self.trans.get("style_large", "Large"))
+        self.style_combo.addItem(self.trans.get("style_emphasis", "Emphasis"))
+        if 0 <= current_index < self.style_combo.count():
+            self.style_combo.setCurrentIndex(current_index)
+        self.style_combo.blockSignals(False)
+
+        # Update color button tooltips
+        self.text_color_btn.setToolTip(self.trans.get("text_color", "Text Color"))
+        self.bg_color_btn.setToolTip(self.trans.get("bg_color", "Highlight Color"))
+
+        # Reapply popup styles
+        try:
+            self.style_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+        try:
+            self.font_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+        try:
+            self.lang_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+        try:
+            self.search_dir_combo.view().setStyleSheet(COMBO_POPUP_QSS)
+        except Exception:
+            pass
+
+
+# ---------------------------
+# Batch conversion (run with: --convert [options] path ...)
+# ---------------------------
+CONVERT_FORMATS = {"html": ".html", "txt": ".txt", "md": ".md"}
+
+
+_headless = None
+
+
+def _headless_app():
+    global _headless
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if QApplication.instance() is None:
+        # held at module level: a QApplication nobody references is destroyed at once
+        _headless = QApplication(sys.argv[:1])
+    return QApplication.instance()
+
+
+def _image_extension(data):
+    return _IMAGE_EXTENSIONS.get(_sniff_image_mime(data), ".bin")
+
+
+def _write_out_images(html, store, images_dir):
+    """
+    Write every image html references into images_dir and point the srcs at the
+    written files, relative to the directory images_dir sits in.
+    """
+    html, keys = _externalize_images(html, store)
+    if not keys:
+        return html
+    rel_dir = quote(os.path.basename(images_dir))
+    files = {}
+    for key in keys:
+        data = store.get(key)
+        if data is None:
+            continue
+        if not files:
+            os.makedirs(images_dir, exist_ok=True)
+        # kept originals are written too, next to the downscaled copies that are linked
+        name = key[:16] + _image_extension(data)
+        with open(os.path.join(images_dir, name), "wb") as f:
+            f.write(data)
+        files[key] = f"{rel_dir}/{name}"
+
+    def repl(m):
+        target = files.get(_voc_image_keys(m.group(2))[0])
+        return f'src={m.group(1)}{target}{m.group(1)}' if target else m.group(0)
+
+    return _IMG_SRC_RE.sub(repl, html)
+
+
+def convert_voc_file(src, dst, fmt):
+    """
+    Convert one .voc file to html, txt or md at dst. Images go to <dst stem>_files.
+    Runs in a worker process; Qt is only started when a QTextDocument is needed
+    (plain text, Markdown, or a body with journal entries to replay).
+    """
+    html, meta, container = read_voc_file(src)
+    journal = container.journal() if container is not None else []
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    if fmt != "txt":
+        store = VocImageStore(container)
+        images_dir = os.path.splitext(dst)[0] + "_files"
+        html = _write_out_images(html, store, images_dir)
+        # journal entries carry their own voc-img srcs; rewrite them the same way
+        journal = [dict(entry, html=_write_out_images(entry["html"], store, images_dir)) for entry in journal]
+    if fmt == "html" and not journal:
+        text = html
+    else:
+        _headless_app()
+        doc = QTextDocument()
+        doc.setHtml(html)
+        apply_journal(doc, journal)
+        if fmt == "html":
+            text = serialize_document(doc)
+        elif fmt == "md":
+            text = doc.toMarkdown()
+        else:
+            # images become U+FFFC object characters in plain text
+            text = doc.toPlainText().replace("\ufffc", "")
+    with open(dst, "w", encoding="utf-8") as f:
+        f.write(text)
+    return dst
+
+
+def iter_voc_paths(paths):
+    """
+    (source, path relative to its root) for each .voc file in paths, walking directories.
+    """
+    for root in paths:
+        if os.path.isdir(root):
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(".voc"):
+                        path = os.path.join(dirpath, name)
+                        yield path, os.path.relpath(path, root)
+        else:
+            yield root, os.path.basename(root)
+
+
+def convert_paths(paths, fmt="html", out_dir=None, jobs=None, report=print):
+    """
+    Convert every .voc file under paths with a pool of jobs processes.
+    Output goes next to each source, or mirrors the tree under out_dir.
+    Returns (converted, failed) counts.
+    """
+    tasks = []
+    for src, rel in iter_voc_paths(paths):
+        target = os.path.join(out_dir, rel) if out_dir else src
+        tasks.append((src, os.path.splitext(target)[0] + CONVERT_FORMATS[fmt]))
+    jobs = jobs or os.cpu_count() or 1
+    converted = failed = 0
+    t0 = time.perf_counter()
+    # spawn, not fork: a forked worker would inherit whatever Qt state the parent has
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(convert_voc_file, src, dst, fmt): src for src, dst in tasks}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                converted += 1
+            except Exception as e:
+                failed += 1
+                report(f"failed: {futures[future]}: {e}")
+    elapsed = time.perf_counter() - t0
+    rate = converted / elapsed if elapsed > 0 else 0.0
+    report(f"converted {converted} file(s), {failed} failed, in {elapsed:.2f}s "
+           f"({rate:.1f} files/s, {jobs} worker(s))")
+    return converted, failed
+
+
+def convert_main(argv):
+    parser = argparse.ArgumentParser(prog="--convert", description="Convert .voc files without opening the editor.")
+    parser.add_argument("paths", nargs="+", help=".voc files or directories to walk")
+    parser.add_argument("--to", choices=sorted(CONVERT_FORMATS), default="html", help="output format")
+    parser.add_argument("--out", help="output directory (default: next to each source)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    converted, failed = convert_paths(args.paths, args.to, args.out, args.jobs)
+    return 1 if failed else 0
+
+
+# ---------------------------
+# Main
+# ---------------------------
+def main():
+    if sys.argv[1:2] == ["--convert"]:
+        sys.exit(convert_main(sys.argv[2:]))
+    app = QApplication(sys.argv)
+    # App-wide style (light blue + white) + menus/combo style
+    style = """
+    QMainWindow { background: #E7F0FA; }
+    QMenuBar { background: #FFFFFF; }
+    QMenu { background: #FFFFFF; }
+    QToolBar { background: #FFFFFF; }
+    QPushButton { background: #FFFFFF; border: 1px solid #cfe8fb; padding: 4px; }
+    QListView { background: #FFFFFF; }
+    QLineEdit { background: #FFFFFF; padding: 4px; border: 1px solid #cfe8fb; }
+    """ + GLOBAL_QSS_MENU
+    app.setStyleSheet(style)
+
+    window = MainWindow()
+    window.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1165 @@
+"""
+Benchmarks for the .voc editor, run headless:
+
+    python bench_editor.py [name ...]
+
+With no names every benchmark runs. The editor module is loaded from its
+file next to this script and registered as voc_editor, so worker processes
+started with spawn can find it again.
+"""
+import sys
+import os
+import json
+import base64
+import tempfile
+import time
+import random
+import zlib
+import sqlite3
+import threading
+import multiprocessing
+import importlib.util
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+EDITOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Text 文档编辑器 请勿修改!!!v1.0.py")
+
+
+def load_editor():
+    module = sys.modules.get("voc_editor")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("voc_editor", EDITOR_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["voc_editor"] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+load_editor()
+
+from PyQt5.QtWidgets import QApplication, QTextEdit, QWidget, QVBoxLayout, QListView  # noqa: E402
+from PyQt5.QtGui import (  # noqa: E402
+    QImage, QColor, QBrush, QPainter, QLinearGradient, QTextDocument, QTextCursor,
+    QTextCharFormat, QTextImageFormat, QTextTableFormat, QTextListFormat
+)
+from PyQt5.QtCore import Qt, QSize, QEvent, QMimeData  # noqa: E402
+from voc_editor import (  # noqa: E402
+    CONVERT_FORMATS, FILE_IMAGE_CACHE, FilenameIndex, FindBar, IMAGE_CACHE_BYTES,
+    IMAGE_DEFAULT_QUALITY, IMAGE_QUALITY_PRESETS, IMAGE_WORKERS, MainWindow, PreviewPane,
+    RESULT_ICON_SIZE, ResultDelegate, ResultsModel, SEARCH_BATCH, SEARCH_EXCLUDES, SEARCH_WORKERS,
+    VOC_CODECS, VOC_IMAGE_SCHEME, VocDocument, VocImageStore, VocIndex, VocTextEdit, _CJK_RUN_RE,
+    _QUERY_TERM_RE, _externalize_images, _headless_app, _replace_file_src_with_data_uris,
+    convert_paths, html_to_text, ingest_image, read_voc_file, save_voc_job, serialize_document,
+    voc_index_text, walk_voc_files, write_voc_container
+)
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def run_benchmarks(names):
+    app = _headless_app()  # noqa: F841 (must outlive the benchmarks)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"unknown benchmark(s): {', '.join(unknown)}; available: {', '.join(sorted(BENCHMARKS))}")
+        return 2
+    for name in names or sorted(BENCHMARKS):
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+    return 0
+
+
+def _bench_image(path, size=256):
+    # noisy-ish gradient so the PNG does not compress to nothing
+    img = QImage(size, size, QImage.Format_RGB32)
+    for y in range(size):
+        for x in range(size):
+            img.setPixel(x, y, QColor((x * 7) % 256, (y * 13) % 256, (x * y) % 256).rgb())
+    img.save(path)
+    return path
+
+
+# the windows' search indexes go here rather than into the user's own data folder
+BENCH_DATA_DIR = tempfile.TemporaryDirectory(prefix="voc-bench-")
+
+
+def _window():
+    return MainWindow(data_dir=BENCH_DATA_DIR.name)
+
+
+def _discard_window(window):
+    # delete a window through Qt; left to Python's cycle collector, its
+    # widgets can be torn down while Qt is still calling into them
+    window.close()
+    window.deleteLater()
+    QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+@benchmark("images")
+def bench_image_repetition():
+    """File size and save/open time against how often one image repeats."""
+    with tempfile.TemporaryDirectory() as tmp:
+        logo = _bench_image(os.path.join(tmp, "logo.png"))
+        url = 'file:///' + logo.replace('\\', '/')
+        print(f"{'repeats':>8} {'v1 size':>12} {'v2 size':>12} {'v1 save':>9} {'v2 save':>9} {'v1 open':>9} {'v2 open':>9} {'decodes':>8}")
+        for repeats in (1, 10, 40, 200):
+            window = _window()
+            window.editor.setHtml("".join(f'<p>row {i} <img src="{url}" /></p>' for i in range(repeats)))
+            html = window.editor.toHtml()
+
+            v1_path = os.path.join(tmp, f"v1_{repeats}.voc")
+            t0 = time.perf_counter()
+            with open(v1_path, "w", encoding="utf-8") as f:
+                json.dump({"content": _replace_file_src_with_data_uris(html), "meta": {}}, f, ensure_ascii=False, indent=2)
+            v1_save = time.perf_counter() - t0
+
+            v2_path = os.path.join(tmp, f"v2_{repeats}.voc")
+            t0 = time.perf_counter()
+            window._write_voc_file(v2_path).result()
+            v2_save = time.perf_counter() - t0
+            QApplication.processEvents()
+
+            opened = []
+            decodes = [0]
+            get = VocImageStore.get
+
+            def counting_get(store, key):
+                decodes[0] += 1
+                return get(store, key)
+            VocImageStore.get = counting_get
+            try:
+                for path in (v1_path, v2_path):
+                    reader = _window()
+                    reader.resize(900, 700)
+                    decodes[0] = 0
+                    t0 = time.perf_counter()
+                    reader._load_voc_file(path)
+                    reader.show()
+                    while reader.is_loading():
+                        QApplication.processEvents()
+                    QApplication.processEvents()
+                    opened.append((time.perf_counter() - t0, decodes[0]))
+                    _discard_window(reader)
+            finally:
+                VocImageStore.get = get
+            _discard_window(window)
+            print(f"{repeats:>8} {os.path.getsize(v1_path):>12,} {os.path.getsize(v2_path):>12,} "
+                  f"{v1_save * 1000:>7.1f}ms {v2_save * 1000:>7.1f}ms "
+                  f"{opened[0][0] * 1000:>7.1f}ms {opened[1][0] * 1000:>7.1f}ms {opened[1][1]:>8}")
+
+
+def _bench_paragraphs(count, seed=0):
+    rng = random.Random(seed)
+    letters = "etaoinshrdlucmfwypvbgkqjxz"
+    vocab = ["".join(rng.choice(letters) for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+    styles = ('<b>{}</b>', '<i>{}</i>', '<span style="color:#2E8BFF;">{}</span>', '{}')
+    paragraphs = []
+    for i in range(count):
+        words = rng.choices(vocab, k=rng.randint(8, 40))
+        words[rng.randrange(len(words))] = rng.choice(styles).format(rng.choice(vocab))
+        paragraphs.append(f"<p>{i}. {' '.join(words)}.</p>")
+    return "".join(paragraphs)
+
+
+@benchmark("load")
+def bench_progressive_load():
+    """Time to first paint and total load time, blocking setHtml against ProgressiveLoader."""
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'paragraphs':>10} {'setHtml first paint':>20} {'progressive first paint':>24} {'progressive total':>18}")
+        for count in (1000, 10000, 100000):
+            doc = QTextDocument()
+            doc.setHtml(_bench_paragraphs(count))
+            path = os.path.join(tmp, f"load_{count}.voc")
+            write_voc_container(path, doc.toHtml(), {}, {})
+
+            window = _window()
+            window.show()
+            t0 = time.perf_counter()
+            window.editor.setHtml(read_voc_file(path)[0])
+            QApplication.processEvents()
+            blocking = time.perf_counter() - t0
+            _discard_window(window)
+
+            window = _window()
+            window.show()
+            t0 = time.perf_counter()
+            window._load_voc_file(path)
+            QApplication.processEvents()
+            first_paint = time.perf_counter() - t0
+            while window.is_loading():
+                QApplication.processEvents()
+            total = time.perf_counter() - t0
+            assert window.editor.document().blockCount() == doc.blockCount()
+            _discard_window(window)
+            print(f"{count:>10} {blocking * 1000:>18.1f}ms {first_paint * 1000:>22.1f}ms {total * 1000:>16.1f}ms")
+
+
+@benchmark("codecs")
+def bench_codecs():
+    """Compressed size, save time and open time per codec on a synthetic corpus."""
+    corpus = {}
+    for count in (1000, 20000):
+        doc = QTextDocument()
+        doc.setHtml(_bench_paragraphs(count))
+        corpus[f"{count} paragraphs"] = doc.toHtml()
+    doc = QTextDocument()
+    doc.setHtml("".join(f"<h2>Section {i}</h2>" + _bench_paragraphs(12) +
+                        "<table border=\"1\">" + "<tr><td>cell</td><td>1.5</td><td>x</td></tr>" * 6 + "</table>"
+                        for i in range(400)))
+    corpus["mixed report"] = doc.toHtml()
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'document':<18} {'codec':<6} {'size':>12} {'ratio':>7} {'save':>9} {'open':>9}")
+        for label, html in corpus.items():
+            v1_path = os.path.join(tmp, "v1.voc")
+            with open(v1_path, "w", encoding="utf-8") as f:
+                json.dump({"content": html, "meta": {}}, f, ensure_ascii=False, indent=2)
+            baseline = os.path.getsize(v1_path)
+            print(f"{label:<18} {'v1':<6} {baseline:>12,} {1.0:>6.2f}x")
+            for codec_id in sorted(VOC_CODECS):
+                codec = VOC_CODECS[codec_id][0]
+                path = os.path.join(tmp, f"{codec}.voc")
+                t0 = time.perf_counter()
+                write_voc_container(path, html, {}, {}, codec)
+                save = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                assert read_voc_file(path)[0] == html
+                load = time.perf_counter() - t0
+                size = os.path.getsize(path)
+                print(f"{'':<18} {codec:<6} {size:>12,} {baseline / size:>6.2f}x {save * 1000:>7.1f}ms {load * 1000:>7.1f}ms")
+
+
+def _bench_styled_window():
+    # what the editor itself produces: toolbar styles, colours, an image, a table
+    window = _window()
+    editor = window.editor
+    for name in ("Title", "Subtitle", "Subtitle 2", "Heading 1", "Heading 2", "Quote", "Code",
+                 "Monospace", "Small", "Large", "Emphasis", "Normal"):
+        editor.insertPlainText(f"{name}: 样式 スタイル estilo <&> \t  two spaces")
+        window.apply_style(name)
+        editor.textCursor().insertBlock()
+    cursor = editor.textCursor()
+    fmt = QTextCharFormat()
+    fmt.setForeground(QBrush(QColor("#2E8BFF")))
+    fmt.setBackground(QBrush(QColor("#FFF59D")))
+    fmt.setFontUnderline(True)
+    cursor.insertText("highlighted", fmt)
+    cursor.insertBlock()
+    cursor.insertBlock()
+    image = QTextImageFormat()
+    image.setName("voc-img:" + "0" * 64)
+    image.setWidth(320)
+    cursor.insertImage(image)
+    table_fmt = QTextTableFormat()
+    table_fmt.setBorder(1)
+    table_fmt.setCellPadding(4)
+    table = cursor.insertTable(3, 3, table_fmt)
+    table.cellAt(0, 0).firstCursorPosition().insertText("cell")
+    table.mergeCells(1, 1, 2, 2)
+    cursor.movePosition(QTextCursor.End)
+    cursor.insertList(QTextListFormat.ListDecimal)
+    cursor.insertText("first")
+    cursor.insertBlock()
+    cursor.insertText("second")
+    return window
+
+
+@benchmark("html")
+def bench_html_serializer():
+    """Size and time of serialize_document() against toHtml(); tests/test_html_serializer.py checks the round trip."""
+    corpus = {}
+    for count in (1000, 20000):
+        doc = QTextDocument()
+        doc.setHtml(_bench_paragraphs(count))
+        corpus[f"{count} paragraphs"] = doc
+    doc = QTextDocument()
+    doc.setHtml("".join(f"<h2>Section {i}</h2>" + _bench_paragraphs(12) +
+                        "<table border=\"1\">" + "<tr><td>cell</td><td>1.5</td><td>x</td></tr>" * 6 + "</table>"
+                        "<ul><li>one</li><li><b>two</b></li></ul><pre>code  block</pre>"
+                        for i in range(400)))
+    corpus["mixed report"] = doc
+    window = _bench_styled_window()
+    corpus["editor styles"] = window.editor.document()
+    print(f"{'document':<18} {'toHtml':>12} {'canonical':>12} {'zlib':>7} {'toHtml':>9} {'canonical':>10}")
+    for label, doc in corpus.items():
+        t0 = time.perf_counter()
+        qt_html = doc.toHtml()
+        qt_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        html = serialize_document(doc)
+        own_time = time.perf_counter() - t0
+        packed = len(zlib.compress(html.encode("utf-8"))) / len(zlib.compress(qt_html.encode("utf-8")))
+        print(f"{label:<18} {len(qt_html):>12,} {len(html):>12,} {packed:>6.2f}x "
+              f"{qt_time * 1000:>7.1f}ms {own_time * 1000:>8.1f}ms")
+    _discard_window(window)
+
+
+@benchmark("convert")
+def bench_convert():
+    """Files/s of the batch converter per output format and worker count."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "in")
+        os.makedirs(source)
+        logo = _bench_image(os.path.join(tmp, "logo.png"), 64)
+        doc = QTextDocument()
+        doc.setHtml(_bench_paragraphs(300) + f'<p><img src="file:///{logo}" /></p>')
+        store = VocImageStore()
+        html, keys = _externalize_images(serialize_document(doc), store)
+        for i in range(120):
+            write_voc_container(os.path.join(source, f"doc{i:03}.voc"), html, {}, {k: store.get(k) for k in keys})
+        counts = sorted({1, 2, 4, os.cpu_count() or 1})
+        print(f"{'format':<6} " + " ".join(f"{f'{n} worker(s)':>13}" for n in counts))
+        for fmt in sorted(CONVERT_FORMATS):
+            rates = []
+            for jobs in counts:
+                out = os.path.join(tmp, f"{fmt}_{jobs}")
+                t0 = time.perf_counter()
+                converted, failed = convert_paths([source], fmt, out, jobs, report=lambda line: None)
+                assert failed == 0
+                rates.append(converted / (time.perf_counter() - t0))
+            print(f"{fmt:<6} " + " ".join(f"{rate:>9.1f}/s  " for rate in rates))
+
+
+@benchmark("imagecache")
+def bench_image_cache():
+    """Repeated saves of a document with many linked image files, cold and warm FILE_IMAGE_CACHE."""
+    with tempfile.TemporaryDirectory() as tmp:
+        urls = []
+        for i in range(60):
+            path = _bench_image(os.path.join(tmp, f"photo{i}.png"), 256 + i)
+            urls.append('file:///' + path.replace('\\', '/'))
+        window = _window()
+        window.editor.setHtml("".join(f'<p>photo {i} <img src="{url}" /></p>' for i, url in enumerate(urls)))
+        html = window.editor.toHtml()
+        _discard_window(window)
+        FILE_IMAGE_CACHE.clear()
+        print(f"{'save':<10} {'v1 data URIs':>13} {'v2 container':>13} {'hits':>6} {'misses':>7}")
+        for attempt in range(4):
+            t0 = time.perf_counter()
+            _replace_file_src_with_data_uris(html)
+            v1 = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            save_voc_job(os.path.join(tmp, "doc.voc"), html, {}, VocImageStore(), "none", ("", None))
+            v2 = time.perf_counter() - t0
+            stats = FILE_IMAGE_CACHE.stats()
+            print(f"{'cold' if attempt == 0 else f'warm {attempt}':<10} {v1 * 1000:>11.1f}ms {v2 * 1000:>11.1f}ms "
+                  f"{stats['hits']:>6} {stats['misses']:>7}")
+        print(f"cached: {stats['entries']} entries, {stats['bytes']:,} bytes")
+
+
+@benchmark("parallel")
+def bench_parallel_images():
+    """Serial against pooled reading/hashing/encoding of 200 distinct image files on save, cold cache."""
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(_bench_image(os.path.join(tmp, "base.png"), 512), "rb") as f:
+            base = f.read()
+        urls = []
+        for i in range(200):
+            path = os.path.join(tmp, f"photo{i:03}.png")
+            with open(path, "wb") as f:
+                # trailing bytes keep the PNG valid and make each file distinct
+                f.write(base + i.to_bytes(4, "little"))
+            urls.append('file:///' + path.replace('\\', '/'))
+        html = "".join(f'<p>photo {i} <img src="{url}" /></p>' for i, url in enumerate(urls))
+        print(f"{IMAGE_WORKERS} image worker(s), {len(base) * 200 / 1e6:.0f} MB of images")
+        print(f"{'path':<14} {'serial':>9} {'parallel':>9}")
+        for label, run in (("v2 externalize", lambda parallel: _externalize_images(html, VocImageStore(), parallel)),
+                           ("v1 data URIs", lambda parallel: _replace_file_src_with_data_uris(html, parallel))):
+            times = []
+            for parallel in (False, True):
+                FILE_IMAGE_CACHE.clear()
+                t0 = time.perf_counter()
+                run(parallel)
+                times.append(time.perf_counter() - t0)
+            print(f"{label:<14} {times[0] * 1000:>7.1f}ms {times[1] * 1000:>7.1f}ms")
+
+
+def _bench_photo(path, width=4032, height=3024, seed=0):
+    # a phone-camera sized JPEG with enough detail that it does not compress to nothing
+    rng = random.Random(seed)
+    image = QImage(width, height, QImage.Format_RGB32)
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QColor(rng.randrange(256), 120, 200))
+    gradient.setColorAt(1, QColor(30, rng.randrange(256), 60))
+    painter.fillRect(0, 0, width, height, QBrush(gradient))
+    for _ in range(3000):
+        painter.setBrush(QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256), 160))
+        painter.drawEllipse(rng.randrange(width), rng.randrange(height), rng.randrange(20, 400), rng.randrange(20, 400))
+    painter.end()
+    image.save(path, "JPEG", 92)
+    return path
+
+
+@benchmark("ingest")
+def bench_image_ingest():
+    """File size, save and open time of a document of phone photos per inserted-image quality preset."""
+    with tempfile.TemporaryDirectory() as tmp:
+        photos = [_bench_photo(os.path.join(tmp, f"photo{i}.jpg"), seed=i) for i in range(8)]
+        print(f"{sum(os.path.getsize(p) for p in photos):,} bytes of photos")
+        print(f"{'preset':<18} {'insert':>9} {'file size':>12} {'save':>9} {'open':>9}")
+        for quality, keep in [(name, False) for name in IMAGE_QUALITY_PRESETS] + [(IMAGE_DEFAULT_QUALITY, True)]:
+            FILE_IMAGE_CACHE.clear()
+            window = _window()
+            window.set_image_quality(quality)
+            window.act_keep_originals.setChecked(keep)
+            t0 = time.perf_counter()
+            for photo in photos:
+                window.editor.insertPlainText(f"{os.path.basename(photo)} ")
+                src, w, h = ingest_image(photo, window.editor.image_store, quality, keep)
+                fmt = QTextImageFormat()
+                fmt.setName(src)
+                if w is not None:
+                    fmt.setWidth(w)
+                    fmt.setHeight(h)
+                window.editor.textCursor().insertImage(fmt)
+                window.editor.textCursor().insertBlock()
+            insert = time.perf_counter() - t0
+            path = os.path.join(tmp, f"{quality}{'_kept' if keep else ''}.voc")
+            t0 = time.perf_counter()
+            window._write_voc_file(path).result()
+            save = time.perf_counter() - t0
+            QApplication.processEvents()
+            _discard_window(window)
+
+            reader = _window()
+            reader.resize(900, 700)
+            t0 = time.perf_counter()
+            reader._load_voc_file(path)
+            reader.show()
+            while reader.is_loading():
+                QApplication.processEvents()
+            QApplication.processEvents()
+            opened = time.perf_counter() - t0
+            _discard_window(reader)
+            label = quality + (" + originals" if keep else "")
+            print(f"{label:<18} {insert * 1000:>7.1f}ms {os.path.getsize(path):>12,} {save * 1000:>7.1f}ms {opened * 1000:>7.1f}ms")
+
+
+
+class _EagerTextEdit(QTextEdit):
+    # how VocTextEdit resolved images before VocDocument: decoded on first
+    # layout and kept in Qt's resource cache for the life of the document
+    def __init__(self, store):
+        super().__init__()
+        self.image_store = store
+
+    def loadResource(self, type, name):
+        if type == QTextDocument.ImageResource and name.scheme() == VOC_IMAGE_SCHEME:
+            data = self.image_store.get(name.path())
+            if data:
+                return QImage.fromData(data)
+        return super().loadResource(type, name)
+
+
+def _peak_rss_kb():
+    # VmHWM rather than ru_maxrss where we can: a spawned child inherits its
+    # parent's ru_maxrss on Linux, which would hide the child's own peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _bench_open_images(path, lazy):
+    # runs in a fresh process so the peak RSS is this document's alone
+    app = _headless_app()
+    t0 = time.perf_counter()
+    if lazy:
+        window = _window()
+        window.resize(900, 700)
+        window._load_voc_file(path)
+        window.show()
+        while window.is_loading():
+            app.processEvents()
+        editor = window.editor
+    else:
+        html, _meta, container = read_voc_file(path)
+        editor = _EagerTextEdit(VocImageStore(container))
+        editor.resize(900, 700)
+        editor.setHtml(html)
+        editor.show()
+    app.processEvents()
+    opened = time.perf_counter() - t0
+    rss_open = _peak_rss_kb()
+    # page through the whole document, waiting until every visible image is drawn
+    bar = editor.verticalScrollBar()
+    t0 = time.perf_counter()
+    for value in range(0, bar.maximum() + editor.viewport().height(), editor.viewport().height()):
+        bar.setValue(value)
+        editor.viewport().repaint()
+        while isinstance(editor.document(), VocDocument) and editor.document().decoding():
+            app.processEvents()
+        editor.viewport().repaint()
+    scrolled = time.perf_counter() - t0
+    rss_peak = _peak_rss_kb()
+    return opened, rss_open, scrolled, rss_peak
+
+
+@benchmark("lazyimages")
+def bench_lazy_images():
+    """Open time and peak RSS of an image-heavy document, eager vs. decoded on demand."""
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        print("peak RSS needs the resource module (not available on this platform)")
+        return
+    count = 80
+    with tempfile.TemporaryDirectory() as tmp:
+        parts = []
+        for i in range(count):
+            photo = _bench_photo(os.path.join(tmp, "photo.jpg"), 1200, 900, seed=i)
+            with open(photo, "rb") as f:
+                uri = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+            parts.append(f'<p>Photo {i}</p><p><img src="{uri}" width="600" height="450" /></p>')
+        v1 = os.path.join(tmp, "v1.voc")
+        with open(v1, "w", encoding="utf-8") as f:
+            json.dump({"content": "<html><body>" + "".join(parts) + "</body></html>", "meta": {}}, f)
+        window = _window()
+        window._load_voc_file(v1)
+        while window.is_loading():
+            QApplication.processEvents()
+        v2 = os.path.join(tmp, "v2.voc")
+        window._write_voc_file(v2).result()
+        QApplication.processEvents()
+        _discard_window(window)
+        print(f"{count} photos 1200x900 shown at 600x450, image cache {IMAGE_CACHE_BYTES // 2 ** 20} MB")
+        print(f"{'file':<5} {'images':<8} {'open':>9} {'RSS open':>10} {'scroll all':>11} {'peak RSS':>10}")
+        for label, path in (("v1", v1), ("v2", v2)):
+            for lazy in (False, True):
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    opened, rss_open, scrolled, rss_peak = pool.submit(_bench_open_images, path, lazy).result()
+                print(f"{label:<5} {'lazy' if lazy else 'eager':<8} {opened * 1000:>7.1f}ms {rss_open / 1024:>8.0f}MB"
+                          f" {scrolled * 1000:>9.1f}ms {rss_peak / 1024:>8.0f}MB")
+
+
+@benchmark("scroll")
+def bench_scroll_images():
+    """Frame times scrolling a 300-image document: full-size pixmaps vs. pre-scaled ones."""
+    count, distinct = 300, 60
+    with tempfile.TemporaryDirectory() as tmp:
+        photos = []
+        for i in range(distinct):
+            with open(_bench_photo(os.path.join(tmp, "photo.jpg"), 1600, 1200, seed=i), "rb") as f:
+                photos.append(f.read())
+        print(f"{count} images of {distinct} distinct 1600x1200 photos shown at 600x450, 900x700 window")
+        print(f"{'images':<12} {'pass':<5} {'frames':>6} {'p50':>8} {'p95':>8} {'max':>8} {'>16.7ms':>8} {'cached':>8}")
+        for label in ("full-size", "pre-scaled"):
+            if label == "pre-scaled":
+                editor = VocTextEdit()
+            else:
+                # VocDocument with Qt's own image handler: decoded at natural size, scaled on every paint
+                editor = QTextEdit()
+                editor.setDocument(VocDocument(editor))
+                editor.document().imagesDecoded.connect(editor.viewport().update)
+            doc = editor.document()
+            keys = [doc.image_store.add(data) for data in photos]
+            cursor = editor.textCursor()
+            for i in range(count):
+                cursor.insertText(f"Photo {i}")
+                cursor.insertBlock()
+                fmt = QTextImageFormat()
+                fmt.setName(f"{VOC_IMAGE_SCHEME}:{keys[i % distinct]}")
+                fmt.setWidth(600)
+                fmt.setHeight(450)
+                cursor.insertImage(fmt)
+                cursor.insertBlock()
+            editor.resize(900, 700)
+            editor.show()
+            QApplication.processEvents()
+            bar = editor.verticalScrollBar()
+            for run in ("cold", "warm"):
+                frames = []
+                for value in range(0, bar.maximum() + 1, 60):
+                    t0 = time.perf_counter()
+                    bar.setValue(value)
+                    editor.viewport().repaint()
+                    QApplication.processEvents()
+                    frames.append((time.perf_counter() - t0) * 1000)
+                bar.setValue(0)
+                frames.sort()
+                p50, p95 = frames[len(frames) // 2], frames[int(len(frames) * 0.95)]
+                janky = sum(1 for t in frames if t > 1000 / 60)
+                print(f"{label:<12} {run:<5} {len(frames):>6} {p50:>6.1f}ms {p95:>6.1f}ms {frames[-1]:>6.1f}ms {janky:>8}"
+                      f" {doc.pixmaps.size / 2 ** 20:>6.0f}MB")
+            editor.close()
+
+
+@benchmark("paste")
+def bench_paste_images():
+    """Pasting HTML with inline data: images: pasted as-is vs. moved into the image store."""
+    with tempfile.TemporaryDirectory() as tmp:
+        uris = []
+        for i in range(20):
+            with open(_bench_photo(os.path.join(tmp, "photo.jpg"), 800, 600, seed=i), "rb") as f:
+                uris.append("data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii"))
+        html = "".join(f'<p>Photo {i}</p><p><img src="{uris[i % len(uris)]}" /></p>' for i in range(60))
+        print(f"60 images, 20 distinct, {len(html):,} chars of HTML")
+        print(f"{'paste':<10} {'paste':>9} {'document':>12} {'save prep':>10}")
+        for label in ("as-is", "store"):
+            editor = VocTextEdit()
+            mime = QMimeData()
+            mime.setHtml(html)
+            t0 = time.perf_counter()
+            if label == "as-is":
+                QTextEdit.insertFromMimeData(editor, mime)
+            else:
+                editor.insertFromMimeData(mime)
+            pasted = time.perf_counter() - t0
+            # what every save does before encoding: serialize, then pull the images out
+            t0 = time.perf_counter()
+            _body, _keys = _externalize_images(serialize_document(editor.document()), editor.image_store)
+            prep = time.perf_counter() - t0
+            print(f"{label:<10} {pasted * 1000:>7.1f}ms {len(editor.toHtml()):>12,} {prep * 1000:>8.1f}ms")
+
+
+def _bench_tree(root, entries, fanout=10, per_dir=100):
+    # nested project folders of empty files, 1% of them .voc, plus an
+    # excluded node_modules and a symlink back to the root
+    dirs = [root]
+    made = 0
+    while made < entries:
+        parent = dirs[len(dirs) // fanout] if len(dirs) > 1 else root
+        path = os.path.join(parent, f"d{len(dirs)}")
+        os.mkdir(path)
+        dirs.append(path)
+        for i in range(per_dir):
+            with open(os.path.join(path, f"doc{made + i}.voc" if i == 0 else f"file{made + i}.txt"), "w"):
+                pass
+        made += per_dir + 1
+    modules = os.path.join(root, "node_modules")
+    os.mkdir(modules)
+    for i in range(per_dir):
+        with open(os.path.join(modules, f"junk{i}.voc"), "w"):
+            pass
+    try:
+        os.symlink(root, os.path.join(dirs[-1], "loop"))
+    except (OSError, NotImplementedError):
+        pass
+    return made
+
+
+@benchmark("walk")
+def bench_walk():
+    """Recursive .voc search over a 500k-entry tree: os.walk vs. the parallel walker."""
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        entries = _bench_tree(tmp, 500_000)
+        print(f"{entries:,} entries built in {time.perf_counter() - t0:.1f}s; {SEARCH_WORKERS} walker threads")
+        print(f"{'walker':<24} {'time':>8} {'found':>8}")
+        t0 = time.perf_counter()
+        found = 0
+        for dirpath, dirnames, filenames in os.walk(tmp):
+            dirnames[:] = [d for d in dirnames if d not in SEARCH_EXCLUDES]
+            found += sum(1 for name in filenames if name.lower().endswith(".voc"))
+        print(f"{'os.walk':<24} {time.perf_counter() - t0:>7.2f}s {found:>8,}")
+        for workers in (1, SEARCH_WORKERS):
+            t0 = time.perf_counter()
+            found = sum(1 for _path in walk_voc_files(tmp, "", threading.Event(), 64, workers=workers))
+            print(f"{f'walk_voc_files x{workers}':<24} {time.perf_counter() - t0:>7.2f}s {found:>8,}")
+
+
+@benchmark("fts")
+def bench_content_index():
+    """Content search over 5,000 documents: reading every file vs. the FTS5 index."""
+    count = 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = os.path.join(tmp, "docs")
+        os.mkdir(docs)
+        for i in range(count):
+            with open(os.path.join(docs, f"doc{i}.voc"), "w", encoding="utf-8") as f:
+                json.dump({"content": f"<html><body>{_bench_paragraphs(40, seed=i)}</body></html>", "meta": {}}, f)
+        index = VocIndex(os.path.join(tmp, "index.sqlite3"))
+        t0 = time.perf_counter()
+        index.refresh(docs, threading.Event())
+        print(f"{count:,} documents of 40 paragraphs; indexed in {time.perf_counter() - t0:.1f}s, "
+              f"{os.path.getsize(index.path):,} bytes")
+        rng = random.Random(1)
+        vocab = _QUERY_TERM_RE.findall(html_to_text(_bench_paragraphs(200)))
+        queries = [" ".join(rng.sample(vocab, rng.randint(1, 2))) for _ in range(20)]
+        # the file scan matches substrings, the index whole words (last one as a prefix), capped at INDEX_RESULTS
+        print(f"{'search':<12} {'p50':>9} {'max':>9} {'avg hits':>9}")
+        times, hits = [], 0
+        for query in queries[:3]:
+            t0 = time.perf_counter()
+            words = query.lower().split()
+            for name in os.listdir(docs):
+                text = html_to_text(read_voc_file(os.path.join(docs, name))[0]).lower()
+                hits += all(w in text for w in words)
+            times.append(time.perf_counter() - t0)
+        times.sort()
+        print(f"{'file scan':<12} {times[len(times) // 2] * 1000:>7.1f}ms {times[-1] * 1000:>7.1f}ms {hits // 3:>9}")
+        times, hits = [], 0
+        for query in queries:
+            t0 = time.perf_counter()
+            hits += len(index.search(query, docs))
+            times.append(time.perf_counter() - t0)
+        times.sort()
+        print(f"{'index':<12} {times[len(times) // 2] * 1000:>7.1f}ms {times[-1] * 1000:>7.1f}ms {hits // 20:>9}")
+
+
+_BENCH_WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu".split()
+
+
+@benchmark("reindex")
+def bench_reindex():
+    """Refreshing the content index over 100,000 files: cold, warm, touched and edited."""
+    count, per_dir = 100_000, 100
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = os.path.join(tmp, "docs")
+        paths = []
+        for i in range(count):
+            folder = os.path.join(docs, f"p{i // (per_dir * 10)}", f"d{i // per_dir}")
+            if i % per_dir == 0:
+                os.makedirs(folder)
+            paths.append(os.path.join(folder, f"doc{i}.voc"))
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                json.dump({"content": f"<p>Note {i}</p><p>{' '.join(random.Random(i).sample(_BENCH_WORDS, 12))}</p>",
+                           "meta": {}}, f)
+        index = VocIndex(os.path.join(tmp, "index.sqlite3"))
+        print(f"{count:,} documents in {count // per_dir:,} folders")
+        print(f"{'refresh':<28} {'time':>8} {'changed':>8}")
+
+        def run(label):
+            t0 = time.perf_counter()
+            changed = index.refresh(docs, threading.Event())
+            print(f"{label:<28} {time.perf_counter() - t0:>7.2f}s {changed:>8,}")
+        run("cold (index everything)")
+        run("warm (nothing changed)")
+        for path in paths[::100]:
+            os.utime(path, None)
+        run("1% touched, same bytes")
+        for path in paths[1::100]:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"content": "<p>edited</p>", "meta": {}}, f)
+        run("1% edited")
+
+
+# (document, queries that should find it) in each shipped language; the
+# queries mix words, phrases, accents left off and scripts run together
+_BENCH_CORPUS = {
+    "en-US": [
+        ("The quarterly budget meeting moved to Thursday. Bring the revised spreadsheet and the color-coded forecast.",
+         ["budget meeting", "forecast", "color coded"]),
+        ("Our hiking trip to Yosemite starts at dawn; pack water, sunscreen and a flashlight.",
+         ["hiking yosemite", "flashlight", "sunscr"]),
+        ("Grandma's recipe: bake the apple pie at 350 degrees for forty-five minutes.",
+         ["apple pie", "recipe bake"]),
+        ("The Python 3 migration guide covers unicode strings, type hints and asyncio.",
+         ["python migration", "asyncio", "type hints"]),
+    ],
+    "en-GB": [
+        ("The colour scheme for the new theatre programme was approved by the committee.",
+         ["colour theatre", "programme"]),
+        ("Remember to renew the car's MOT before the bank holiday weekend.",
+         ["MOT renew", "bank holiday"]),
+        ("Fish and chips by the seaside, followed by a cup of tea and a biscuit.",
+         ["fish chips", "biscuit"]),
+        ("The neighbour's flat has a lovely garden, but the lift is out of order again.",
+         ["neighbour flat", "lift order"]),
+    ],
+    "zh-CN": [
+        ("明天上午十点在会议室召开季度预算会议，请带上修改后的表格。",
+         ["预算会议", "会议室", "表格"]),
+        ("我们计划下个月去北京旅游，参观故宫和长城。",
+         ["北京旅游", "长城", "故宫"]),
+        ("红烧肉的做法：先把五花肉切块，再加冰糖和酱油慢炖。",
+         ["红烧肉", "酱油", "五花肉 冰糖"]),
+        ("这份Python教程介绍了异步编程和类型注解。",
+         ["Python教程", "python 异步", "类型注解"]),
+    ],
+    "zh-TW": [
+        ("颱風即將登陸臺灣，氣象局發布陸上警報，請民眾做好防颱準備。",
+         ["颱風", "氣象局", "防颱準備"]),
+        ("這家咖啡廳的珍珠奶茶很受歡迎，週末常常大排長龍。",
+         ["珍珠奶茶", "咖啡廳", "排長龍"]),
+        ("請於本週五前提交年度報告，並寄送電子郵件給經理。",
+         ["年度報告", "電子郵件"]),
+        ("我們用Excel整理客戶名單，下週寄出邀請函。",
+         ["excel 客戶", "客戶名單", "邀請函"]),
+    ],
+    "ja-JP": [
+        ("明日の会議は午後三時から第二会議室で行います。資料を印刷してください。",
+         ["会議室", "資料 印刷"]),
+        ("京都の紅葉はとても美しく、多くの観光客が訪れます。",
+         ["京都", "紅葉", "観光客"]),
+        ("カレーライスの作り方：玉ねぎを炒めてから、ルーを入れて煮込みます。",
+         ["カレー", "玉ねぎ", "煮込み"]),
+        ("iPhoneの新しいアプリでメールを送信できます。",
+         ["iphone アプリ", "メール 送信"]),
+    ],
+    "es-ES": [
+        ("La reunión del presupuesto trimestral será el jueves por la mañana.",
+         ["reunion presupuesto", "jueves"]),
+        ("Este verano viajaremos a Andalucía para visitar la Alhambra de Granada.",
+         ["alhambra", "andalucia granada"]),
+        ("Receta de paella: sofríe el pollo, añade el arroz y el azafrán.",
+         ["paella", "azafran", "añade arroz"]),
+        ("El médico recomendó caminar treinta minutos al día.",
+         ["medico", "caminar"]),
+    ],
+}
+
+
+def _write_search_corpus(folder, fillers, seed=5):
+    """
+    Write the _BENCH_CORPUS documents and as many filler documents into folder.
+    Returns ([(language, query, path of the document it should find)], the
+    CJK characters the filler is made of).
+    """
+    rng = random.Random(seed)
+    # filler text in the corpus' own CJK characters, so stray bigrams collide with the queries
+    cjk = sorted(set("".join(_CJK_RUN_RE.findall(" ".join(d for docs in _BENCH_CORPUS.values() for d, _q in docs)))))
+    targets = []
+    for lang, docs in _BENCH_CORPUS.items():
+        for n, (text, queries) in enumerate(docs):
+            path = os.path.join(folder, f"{lang}-{n}.voc")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"content": f"<p>{text}</p>", "meta": {}}, f)
+            targets.extend((lang, query, path) for query in queries)
+    for i in range(fillers):
+        runs = ["".join(rng.choices(cjk, k=rng.randint(4, 30))) + "。" for _ in range(10)]
+        with open(os.path.join(folder, f"filler{i}.voc"), "w", encoding="utf-8") as f:
+            json.dump({"content": _bench_paragraphs(5, seed=i) + f"<p>{''.join(runs)}</p>", "meta": {}}, f)
+    return targets, cjk
+
+
+@benchmark("cjk")
+def bench_cjk():
+    """Content search in all six shipped languages: relevance and latency, words only vs. CJK bigrams."""
+    fillers = 3000
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "docs")
+        os.mkdir(folder)
+        targets, cjk = _write_search_corpus(folder, fillers)
+        count = fillers + sum(len(docs) for docs in _BENCH_CORPUS.values())
+        index = VocIndex(os.path.join(tmp, "index.sqlite3"))
+        t0 = time.perf_counter()
+        index.refresh(folder, threading.Event())
+        print(f"{count:,} documents; indexed in {time.perf_counter() - t0:.1f}s")
+        # the same documents tokenized on words alone, as the index was before
+        words = sqlite3.connect(":memory:")
+        words.execute("CREATE VIRTUAL TABLE docs USING fts5(path UNINDEXED, body, tokenize='unicode61 remove_diacritics 2')")
+        words.executemany("INSERT INTO docs VALUES (?, ?)", (
+            (os.path.join(folder, name), voc_index_text(os.path.join(folder, name))[1]) for name in os.listdir(folder)))
+
+        def words_search(query):
+            terms = _QUERY_TERM_RE.findall(query)
+            match = " ".join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+            return [path for (path,) in words.execute(
+                "SELECT path FROM docs WHERE docs MATCH ? ORDER BY bm25(docs) LIMIT 3", (match,))]
+
+        print(f"{'language':<10} {'queries':>8} {'top 3, words':>13} {'top 3, bigrams':>15}")
+        times = []
+        for lang in _BENCH_CORPUS:
+            cases = [(query, path) for name, query, path in targets if name == lang]
+            before = sum(path in words_search(query) for query, path in cases)
+            after = 0
+            for query, path in cases:
+                t0 = time.perf_counter()
+                after += path in [hit for hit, _title, _snippet in index.search(query, folder, limit=3)]
+                times.append(time.perf_counter() - t0)
+            print(f"{lang:<10} {len(cases):>8} {before:>13} {after:>15}")
+        times.sort()
+        print(f"{len(times)} queries: p50 {times[len(times) // 2] * 1000:.1f}ms, "
+              f"p95 {times[len(times) * 95 // 100] * 1000:.1f}ms, max {times[-1] * 1000:.1f}ms")
+        # a single character is a prefix of every bigram it starts; the filler has them all
+        times = []
+        for char in rng.sample(cjk, 20):
+            t0 = time.perf_counter()
+            hits = len(index.search(char, folder))
+            times.append(time.perf_counter() - t0)
+        times.sort()
+        print(f"single characters: p50 {times[len(times) // 2] * 1000:.1f}ms, max {times[-1] * 1000:.1f}ms "
+              f"({hits} hits each, ranked among every filler document)")
+        index.close()
+
+
+def _bench_result_hits(count):
+    rng = random.Random(3)
+    now = time.time()
+    return [(f"/home/user/notes/project{i % 500}/note{i}.voc",
+             {"title": f"Note {i} " + " ".join(rng.sample(_BENCH_WORDS, 3)), "preview": " ".join(rng.sample(_BENCH_WORDS, 12)),
+              "words": rng.randint(10, 5000), "images": rng.randint(0, 5), "thumbnail": False,
+              "modified": now - rng.random() * 400 * 86400, "size": rng.randint(500, 5_000_000)}, None)
+            for i in range(count)]
+
+
+def _bench_fill_results(kind, count):
+    # runs in a fresh process so the peak RSS is this list's alone
+    app = _headless_app()
+    hits = _bench_result_hits(count)
+    rss_before = _peak_rss_kb()
+    if kind == "QListWidget":
+        from PyQt5.QtWidgets import QListWidget, QListWidgetItem
+        view = QListWidget()
+        view.setIconSize(QSize(RESULT_ICON_SIZE, RESULT_ICON_SIZE))
+    else:
+        view = QListView()
+        view.setUniformItemSizes(True)
+        view.setItemDelegate(ResultDelegate(view))
+        model = ResultsModel(ThreadPoolExecutor(max_workers=1), view)
+        view.setModel(model)
+    view.resize(900, 160)
+    view.show()
+    app.processEvents()
+    t0 = time.perf_counter()
+    for start in range(0, count, SEARCH_BATCH):
+        batch = hits[start:start + SEARCH_BATCH]
+        if kind == "QListWidget":
+            view.setUpdatesEnabled(False)
+            for path, info, _snippet in batch:
+                # what the list built per hit before the model
+                modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["modified"]))
+                item = QListWidgetItem(f"{info['title']}\n{info['words']} words · {modified}  {path}")
+                item.setData(Qt.UserRole, path)
+                item.setToolTip(info["preview"])
+                view.addItem(item)
+            view.setUpdatesEnabled(True)
+        else:
+            model.extend(batch)
+        app.processEvents()
+    filled = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    view.scrollToBottom()
+    app.processEvents()
+    view.repaint()
+    scrolled = time.perf_counter() - t0
+    return filled, scrolled, (_peak_rss_kb() - rss_before) / 1024
+
+
+@benchmark("results")
+def bench_results():
+    """Search results: QListWidget items vs. the paged model, and sorting 100,000 of them."""
+    count = 100_000
+    print(f"results streamed in batches of {SEARCH_BATCH}")
+    print(f"{'view':<12} {'results':>8} {'fill':>9} {'to end':>9} {'RSS grew':>9}")
+    # QListWidget relayouts grow quadratically, so it only gets the smaller list
+    for kind, size in (("QListWidget", 20_000), ("model", 20_000), ("model", count)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            filled, scrolled, grew = pool.submit(_bench_fill_results, kind, size).result()
+        print(f"{kind:<12} {size:>8,} {filled * 1000:>7.0f}ms {scrolled * 1000:>7.1f}ms {grew:>7.0f}MB")
+    app = _headless_app()
+    view = QListView()
+    model = ResultsModel(ThreadPoolExecutor(max_workers=1), view)
+    view.setModel(model)
+    view.setItemDelegate(ResultDelegate(view))
+    view.setUniformItemSizes(True)
+    view.resize(900, 160)
+    view.show()
+    model.extend(_bench_result_hits(count))
+    app.processEvents()
+    print(f"{'sort':<12} {'done':>9} {'UI max gap':>11}")
+    for key in ("modified", "name", "size", None):
+        t0 = last = time.perf_counter()
+        gap = 0
+        model.sort_by(key)
+        while model._sorting:
+            app.processEvents()
+            now = time.perf_counter()
+            gap = max(gap, now - last)
+            last = now
+        print(f"{key or 'found':<12} {(time.perf_counter() - t0) * 1000:>7.0f}ms {gap * 1000:>9.1f}ms")
+
+
+@benchmark("preview")
+def bench_preview():
+    """Previewing ~20 MB search results: a full read vs. the preview pane, cold and cached."""
+    app = _headless_app()
+    html = f"<html><head></head><body>{_bench_paragraphs(130_000)}</body></html>"
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {}
+        for codec in ("none", "zlib"):
+            files[f"v2 {codec}"] = os.path.join(tmp, f"{codec}.voc")
+            write_voc_container(files[f"v2 {codec}"], html, {}, {}, codec=codec)
+        files["v1 json"] = os.path.join(tmp, "v1.voc")
+        with open(files["v1 json"], "w", encoding="utf-8") as f:
+            json.dump({"content": html, "meta": {}}, f)
+        pool = ThreadPoolExecutor(max_workers=1)
+        pane = PreviewPane(pool)
+        pane.resize(480, 160)
+        pane.show()
+        app.processEvents()
+        print(f"{len(html) / 2**20:.0f}MB of HTML per file")
+        print(f"{'file':<8} {'on disk':>8} {'full read':>10} {'cold':>8} {'UI gap':>8} {'cached':>8}")
+
+        def shown(path):
+            # ms until the pane shows path, and the longest the UI went without events meanwhile
+            t0 = last = time.perf_counter()
+            gap = 0
+            pane.show_file(path, "…")
+            while pane.toPlainText() == "…":
+                app.processEvents()
+                now = time.perf_counter()
+                gap = max(gap, now - last)
+                last = now
+            app.processEvents()
+            return (time.perf_counter() - t0) * 1000, gap * 1000
+        for label, path in files.items():
+            t0 = time.perf_counter()
+            read_voc_file(path)
+            full = (time.perf_counter() - t0) * 1000
+            cold, gap = shown(path)
+            pane.clear_preview()
+            cached, _gap = shown(path)
+            pane.clear_preview()
+            print(f"{label:<8} {os.path.getsize(path) / 2**20:>6.1f}MB {full:>8.0f}ms {cold:>6.1f}ms "
+                  f"{gap:>6.1f}ms {cached:>6.1f}ms")
+        pool.shutdown()
+
+
+@benchmark("find")
+def bench_find():
+    """Find and replace in a 200,000-paragraph document: highlighting, counting, stepping, replacing."""
+    app = _headless_app()
+    editor = VocTextEdit()
+    bar = FindBar(editor)
+    window = QWidget()
+    layout = QVBoxLayout()
+    window.setLayout(layout)
+    layout.addWidget(bar)
+    layout.addWidget(editor)
+    window.resize(1000, 700)
+    window.show()
+    editor.setHtml(_bench_paragraphs(200_000))
+    doc = editor.document()
+    bar.open_bar()
+    # let Qt finish laying the document out first (a second with no slow event), so only the bar is measured
+    settled = time.perf_counter()
+    while time.perf_counter() - settled < 1:
+        t0 = time.perf_counter()
+        app.processEvents()
+        if time.perf_counter() - t0 > 0.03:
+            settled = time.perf_counter()
+    # a word the generator uses often, one it uses rarely, and a pattern nearly every paragraph has
+    words = Counter(doc.findBlockByNumber(n).text().split()[1] for n in range(0, 200_000, 97))
+    common, rare = words.most_common()[0][0], words.most_common()[-1][0]
+    print(f"{doc.blockCount():,} paragraphs, {doc.characterCount() / 2**20:.0f}M characters")
+    print(f"{'pattern':<24} {'shown':>8} {'counted':>9} {'UI gap':>8} {'matches':>9}")
+    cases = [(common, {}), (rare, {"words": True}), (common[:2], {}), (r"^\d+7\. \w+", {"regex": True}),
+             (common.upper(), {"case": True})]
+    for text, options in cases:
+        bar.case_check.setChecked(options.get("case", False))
+        bar.words_check.setChecked(options.get("words", False))
+        bar.regex_check.setChecked(options.get("regex", False))
+        t0 = time.perf_counter()
+        bar.find_input.setText(text)
+        shown = time.perf_counter() - t0
+        last = time.perf_counter()
+        gap = 0
+        while not bar.matches.done():
+            app.processEvents()
+            now = time.perf_counter()
+            gap = max(gap, now - last)
+            last = now
+        label = text + "".join(f" [{name}]" for name in options)
+        print(f"{label:<24} {shown * 1000:>6.1f}ms {(time.perf_counter() - t0) * 1000:>7.0f}ms "
+              f"{gap * 1000:>6.1f}ms {bar.matches.count:>9,}")
+    bar.case_check.setChecked(False)
+    bar.regex_check.setChecked(False)
+    bar.words_check.setChecked(True)
+    bar.find_input.setText(common)
+    while not bar.matches.done():
+        app.processEvents()
+    # the obvious alternative: walking QTextDocument.find from match to match
+    t0 = time.perf_counter()
+    cursor, found = QTextCursor(doc), 0
+    while True:
+        cursor = doc.find(common, cursor, QTextDocument.FindWholeWords)
+        if cursor.isNull():
+            break
+        found += 1
+    print(f"{'QTextDocument.find loop':<24} {'':>8} {(time.perf_counter() - t0) * 1000:>7.0f}ms {'':>8} {found:>9,}")
+    steps = []
+    for _ in range(200):
+        t0 = time.perf_counter()
+        bar.find_next()
+        app.processEvents()
+        steps.append(time.perf_counter() - t0)
+    steps.sort()
+    print(f"next match: p50 {steps[100] * 1000:.1f}ms, p95 {steps[190] * 1000:.1f}ms")
+    before = doc.toPlainText()
+    bar.replace_input.setText(common.upper())
+    t0 = time.perf_counter()
+    bar.replace_all()
+    replaced = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    editor.undo()
+    undone = time.perf_counter() - t0
+    print(f"replace all {found:,}: {replaced * 1000:.0f}ms; one undo {undone * 1000:.0f}ms, "
+          f"text restored: {doc.toPlainText() == before}")
+
+
+@benchmark("names")
+def bench_names():
+    """As-you-type file name search over 200,000 paths: keystroke to filled list."""
+    count = 200_000
+    app = _headless_app()
+    rng = random.Random(7)
+    vocab = sorted(set(_QUERY_TERM_RE.findall(html_to_text(_bench_paragraphs(400)).lower())))
+    now = time.time()
+    root = os.path.abspath(os.path.join(tempfile.gettempdir(), "voc-bench-names"))
+    entries = []
+    for i in range(count):
+        name = " ".join(rng.sample(vocab, rng.randint(1, 4))) + f" {2000 + i % 25}-{i % 12 + 1:02d}"
+        entries.append((os.path.join(root, f"project{i % 300}", f"{name}.voc"), now - rng.random() * 400 * 86400))
+    with tempfile.TemporaryDirectory() as tmp:
+        index = FilenameIndex(os.path.join(tmp, "names.sqlite3"))
+        t0 = time.perf_counter()
+        index.update(entries, root)
+        print(f"{count:,} paths, {len(vocab):,} distinct words; indexed and saved in {time.perf_counter() - t0:.1f}s")
+        index = FilenameIndex(index.path)
+        t0 = time.perf_counter()
+        index.load()
+        print(f"next session: loaded in {time.perf_counter() - t0:.2f}s")
+        window = _window()
+        window.name_index = index
+        window.search_dir_combo.addItem("bench", root)
+        window.search_dir_combo.setCurrentIndex(window.search_dir_combo.count() - 1)
+        window._cataloged.add(root)
+        # type out the names of 20 files, every other one with a typo
+        targets = rng.sample(entries, 20)
+        times, found, typed = [], 0, 0
+        for n, (path, _mtime) in enumerate(targets):
+            name = os.path.basename(path)[:-4]
+            if n % 2:
+                at = rng.randrange(len(name))
+                name = name[:at] + "x" + name[at + 1:]
+            window.search_input.clear()
+            for k in range(1, len(name) + 1):
+                t0 = time.perf_counter()
+                window.search_input.setText(name[:k])
+                times.append(time.perf_counter() - t0)
+            typed += 1
+            model = window.results_model
+            shown = [model.index(i).data(Qt.UserRole) for i in range(min(5, model.rowCount()))]
+            found += path in shown
+        times.sort()
+        print(f"{len(times):,} keystrokes: p50 {times[len(times) // 2] * 1000:.1f}ms, "
+              f"p95 {times[len(times) * 95 // 100] * 1000:.1f}ms, max {times[-1] * 1000:.1f}ms")
+        print(f"typed file in the top 5: {found}/{typed} (half of the names typed with a typo)")
+        lowered = [os.path.basename(path).lower() for path, _mtime in entries]
+        t0 = time.perf_counter()
+        query = os.path.basename(targets[0][0])[:6].lower()
+        hits = [path for path in lowered if query in path]
+        print(f"for comparison, one substring scan of the names: {(time.perf_counter() - t0) * 1000:.1f}ms, "
+              f"{len(hits):,} unranked hits")
+        window.close()
+        del window
+        app.processEvents()
+
+
+if __name__ == "__main__":
+    sys.exit(run_benchmarks(sys.argv[1:]))
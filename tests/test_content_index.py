@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import voc_editor
+from voc_editor import VocIndex, write_voc_container
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = VocIndex(str(tmp_path / "data" / "index.sqlite3"))
+    yield index
+    index.close()
+
+
+def write_doc(folder, name, text):
+    path = os.path.join(folder, name)
+    write_voc_container(path, f"<p>{text}</p>", {"summary": {"title": name}}, {}, "zlib")
+    return path
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "docs"
+    (folder / "sub").mkdir(parents=True)
+    write_doc(str(folder), "a.voc", "apples and pears")
+    write_doc(str(folder), "b.voc", "bananas")
+    write_doc(str(folder / "sub"), "c.voc", "cherries and apples")
+    return str(folder)
+
+
+def hits(index, query, root=None):
+    return sorted(os.path.basename(path) for path, _title, _snippet in index.search(query, root))
+
+
+def test_search_finds_words_with_snippets(index, folder):
+    assert index.refresh(folder, threading.Event()) == 3
+    assert hits(index, "apples") == ["a.voc", "c.voc"]
+    assert hits(index, "apples", os.path.join(folder, "sub")) == ["c.voc"]
+    [(_path, title, snippet)] = index.search("bananas")
+    assert title == "b.voc" and "<b>bananas</b>" in snippet
+    assert index.search("") == []
+
+
+def test_refresh_reads_only_changed_files(index, folder, monkeypatch):
+    index.refresh(folder, threading.Event())
+    parsed = []
+    real = voc_editor.voc_index_text
+    monkeypatch.setattr(voc_editor, "voc_index_text", lambda path, *args: parsed.append(path) or real(path, *args))
+    assert index.refresh(folder, threading.Event()) == 0
+    assert parsed == []
+
+    path = write_doc(folder, "b.voc", "blueberries")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    # touched but not edited: hashed, not parsed again
+    os.utime(os.path.join(folder, "a.voc"), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert index.refresh(folder, threading.Event()) == 2
+    assert parsed == [path]
+    assert hits(index, "bananas") == [] and hits(index, "blueberries") == ["b.voc"]
+    assert hits(index, "pears") == ["a.voc"]
+
+
+def test_each_file_is_read_once(index, folder, monkeypatch):
+    opened = []
+    real_open = open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(voc_editor, "open", counting_open, raising=False)
+    assert index.index_file(os.path.join(folder, "a.voc"))
+    assert opened == [os.path.join(folder, "a.voc")]
+
+
+def test_refresh_drops_deleted_files(index, folder):
+    index.refresh(folder, threading.Event())
+    os.remove(os.path.join(folder, "sub", "c.voc"))
+    assert index.refresh(folder, threading.Event()) == 1
+    assert hits(index, "cherries") == []
+    assert index.directories(folder) == {folder}
+
+
+def test_cancelled_refresh_keeps_unseen_files(index, folder):
+    index.refresh(folder, threading.Event())
+    cancelled = threading.Event()
+    cancelled.set()
+    assert index.refresh(folder, cancelled) == 0
+    assert hits(index, "apples") == ["a.voc", "c.voc"]
+
+
+def test_files_past_the_depth_limit_are_kept(index, folder):
+    index.refresh(folder, threading.Event())
+    index.refresh(folder, threading.Event(), max_depth=0)
+    assert hits(index, "cherries") == ["c.voc"]
+
+
+def test_unreadable_files_are_skipped(index, folder):
+    with open(os.path.join(folder, "broken.voc"), "wb") as f:
+        f.write(b"\x00garbage")
+    assert index.refresh(folder, threading.Event()) == 3
+    assert not index.index_file(os.path.join(folder, "broken.voc"))
+
+
+def test_old_index_is_migrated(tmp_path, folder):
+    path = str(tmp_path / "old.sqlite3")
+    db = sqlite3.connect(path)
+    # the first schema: no content hash
+    db.executescript("""
+        CREATE TABLE files(id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL,
+                           mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL);
+        CREATE VIRTUAL TABLE docs USING fts5(title, body, tokenize='unicode61 remove_diacritics 2');
+    """)
+    db.execute("INSERT INTO files VALUES (1, ?, 0, 0)", (os.path.join(folder, "a.voc"),))
+    db.execute("INSERT INTO docs(rowid, title, body) VALUES (1, 'a.voc', 'stale')")
+    db.commit()
+    db.close()
+
+    index = VocIndex(path)
+    (version,) = index._db().execute("PRAGMA user_version").fetchone()
+    assert version == max(VocIndex.MIGRATIONS)
+    columns = [row[1] for row in index._db().execute("PRAGMA table_info(files)")]
+    assert "hash" in columns
+    index.refresh(folder, threading.Event())
+    assert hits(index, "apples") == ["a.voc", "c.voc"]
+    assert hits(index, "stale") == []
+    index.close()
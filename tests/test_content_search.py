@@ -0,0 +1,30 @@
+import os
+import threading
+
+import pytest
+
+from bench_editor import _BENCH_CORPUS, _write_search_corpus
+from voc_editor import VocIndex
+
+# enough filler that stray CJK bigrams compete with the documents searched for
+FILLERS = 300
+
+CASES = [(lang, n, query) for lang, docs in _BENCH_CORPUS.items()
+         for n, (_text, queries) in enumerate(docs) for query in queries]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    folder = str(tmp_path_factory.mktemp("docs"))
+    _write_search_corpus(folder, FILLERS)
+    index = VocIndex(str(tmp_path_factory.mktemp("index") / "index.sqlite3"))
+    index.refresh(folder, threading.Event())
+    yield index, folder
+    index.close()
+
+
+@pytest.mark.parametrize("lang, n, query", CASES, ids=[f"{lang}-{n}-{query}" for lang, n, query in CASES])
+def test_query_finds_its_document_in_top_3(corpus, lang, n, query):
+    index, folder = corpus
+    hits = [path for path, _title, _snippet in index.search(query, folder, limit=3)]
+    assert os.path.join(folder, f"{lang}-{n}.voc") in hits
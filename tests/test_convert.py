@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from conftest import EDITOR
+from voc_editor import VocImageStore, write_voc_container
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+def test_convert_a_folder(tmp_path):
+    source = tmp_path / "docs"
+    (source / "sub").mkdir(parents=True)
+    key = VocImageStore().add(PNG)
+    write_voc_container(str(source / "a.voc"), f'<p>alpha <img src="voc-img:{key}" /></p>', {}, {key: PNG}, "zlib")
+    write_voc_container(str(source / "sub" / "b.voc"), "<p>beta</p>", {}, {}, "lzma")
+    (source / "broken.voc").write_bytes(b"not a voc file")
+    out = tmp_path / "out"
+
+    # through the script itself: the spawned workers import it by its file name
+    done = subprocess.run([sys.executable, EDITOR, "--convert", str(source), "--out", str(out), "--jobs", "2"],
+                          capture_output=True, text=True, timeout=120,
+                          env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+    assert done.returncode == 1
+    assert "converted 2 file(s), 1 failed" in done.stdout
+    assert "broken.voc" in done.stdout
+    html = (out / "a.html").read_text(encoding="utf-8")
+    assert "alpha" in html and f'src="a_files/{key[:16]}.png"' in html
+    assert (out / "a_files" / f"{key[:16]}.png").read_bytes() == PNG
+    assert "beta" in (out / "sub" / "b.html").read_text(encoding="utf-8")
+    # no images, no images folder
+    assert not (out / "sub" / "b_files").exists()
+
+
+def test_convert_to_text(tmp_path):
+    path = tmp_path / "a.voc"
+    write_voc_container(str(path), "<p>one</p><p>two</p>", {}, {})
+    done = subprocess.run([sys.executable, EDITOR, "--convert", "--to", "txt", str(path)],
+                          capture_output=True, text=True, timeout=120,
+                          env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+    assert done.returncode == 0, done.stderr
+    assert (tmp_path / "a.txt").read_text(encoding="utf-8") == "one\ntwo"
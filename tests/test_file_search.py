@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import voc_editor
+from voc_editor import (FilenameIndex, PreviewPane, ResultsModel, SearchSignals, read_voc_preview, search_voc_job,
+                        walk_voc_files, write_voc_container)
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb"):
+        pass
+    return path
+
+
+def found(root, term="", **kwargs):
+    return sorted(os.path.relpath(path, root) for path in walk_voc_files(str(root), term, threading.Event(), **kwargs))
+
+
+def test_walk_finds_matching_names(tmp_path):
+    touch(tmp_path / "Notes.VOC")
+    touch(tmp_path / "a" / "notes-2.voc")
+    touch(tmp_path / "a" / "other.voc")
+    touch(tmp_path / "a" / "notes.txt")
+    assert found(tmp_path, "notes") == ["Notes.VOC", os.path.join("a", "notes-2.voc")]
+
+
+def test_walk_stops_at_the_depth_limit(tmp_path):
+    for depth in range(4):
+        touch(os.path.join(tmp_path, *["d"] * depth, f"{depth}.voc"))
+    assert found(tmp_path, max_depth=0) == ["0.voc"]
+    assert len(found(tmp_path, max_depth=2)) == 3
+    assert len(found(tmp_path, max_depth=8)) == 4
+
+
+def test_walk_skips_excluded_folders(tmp_path):
+    touch(tmp_path / "node_modules" / "a.voc")
+    touch(tmp_path / "pkg.egg-info" / "b.voc")
+    touch(tmp_path / "src" / "c.voc")
+    assert found(tmp_path) == [os.path.join("src", "c.voc")]
+    assert len(found(tmp_path, excludes=())) == 3
+
+
+def test_walk_enters_a_symlink_loop_once(tmp_path):
+    touch(tmp_path / "a" / "x.voc")
+    os.symlink(tmp_path, tmp_path / "a" / "up")
+    os.symlink(tmp_path / "a", tmp_path / "also-a")
+    # through whichever of the two ways in is listed first
+    assert [os.path.basename(path) for path in found(tmp_path)] == ["x.voc"]
+
+
+def test_walk_in_parallel_finds_the_same(tmp_path):
+    for n in range(300):
+        touch(tmp_path / f"d{n % 30}" / f"s{n % 7}" / f"{n}.voc")
+    assert found(tmp_path, workers=8) == found(tmp_path, workers=1)
+    assert len(found(tmp_path, workers=8)) == 300
+
+
+def test_cancelled_search_emits_no_more_batches(qapp, tmp_path, monkeypatch):
+    monkeypatch.setattr(voc_editor, "SEARCH_BATCH", 1)
+    for n in range(20):
+        touch(tmp_path / f"{n}.voc")
+    cancelled = threading.Event()
+    signals = SearchSignals()
+    batches, finished = [], []
+
+    def on_found(generation, batch):
+        batches.append(batch)
+        cancelled.set()
+
+    signals.found.connect(on_found)
+    signals.finished.connect(lambda generation, total: finished.append(total))
+    search_voc_job(1, str(tmp_path), "", 8, cancelled, signals)
+    assert len(batches) == 1
+    assert finished == [1]
+
+
+def test_search_streams_every_match(qapp, tmp_path, monkeypatch):
+    monkeypatch.setattr(voc_editor, "SEARCH_BATCH", 7)
+    for n in range(20):
+        touch(tmp_path / f"{n}.voc")
+    signals = SearchSignals()
+    batches, finished = [], []
+    signals.found.connect(lambda generation, batch: batches.append(batch))
+    signals.finished.connect(lambda generation, total: finished.append(total))
+    search_voc_job(1, str(tmp_path), "", 8, threading.Event(), signals)
+    assert sum(len(batch) for batch in batches) == 20 == finished[0]
+
+
+def test_names_match_despite_typos_and_word_order(tmp_path):
+    index = FilenameIndex(str(tmp_path / "names.sqlite3"))
+    now = time.time()
+    index.update([("/docs/quarterly budget report.voc", now), ("/docs/holiday photos.voc", now),
+                  ("/docs/old/budget 2019.voc", now - 400 * 86400)])
+    assert index.search("budgte report")[0] == "/docs/quarterly budget report.voc"
+    assert index.search("report quarterly")[0] == "/docs/quarterly budget report.voc"
+    # the newer of two equally good matches first
+    assert index.search("budget") == ["/docs/quarterly budget report.voc", "/docs/old/budget 2019.voc"]
+    assert index.search("budget", root="/docs/old") == ["/docs/old/budget 2019.voc"]
+
+
+def test_names_are_kept_across_sessions(tmp_path):
+    path = str(tmp_path / "names.sqlite3")
+    index = FilenameIndex(path)
+    index.update([("/docs/a/alpha.voc", 1.0), ("/docs/a/beta.voc", 2.0)])
+    index.update([("/docs/a/alpha.voc", 1.0)], root="/docs/a")
+    reloaded = FilenameIndex(path)
+    reloaded.load()
+    assert len(reloaded) == 1
+    assert reloaded.search("alpha") == ["/docs/a/alpha.voc"]
+    assert reloaded.search("beta") == []
+
+
+def test_saved_file_is_recorded_with_its_mtime(window, settle, tmp_path):
+    path = str(tmp_path / "quarterly report.voc")
+    window.editor.setPlainText("hello")
+    window._write_voc_file(path)
+    settle(window)
+    window._search_pool.submit(lambda: None).result()
+    index = window.name_index
+    assert index.search("quarterly") == [path]
+    assert index._mtimes[index._ids[path]] == os.stat(path).st_mtime
+    # the window keeps its indexes where it was told to
+    assert os.path.dirname(index.path) == window.data_dir
+
+
+def make_model(qapp, count):
+    model = ResultsModel(ThreadPoolExecutor(max_workers=1))
+    model.extend([(f"/r/{n:04d}.voc", {"modified": n % 10, "size": n, "title": ""}, None) for n in range(count)])
+    return model
+
+
+def test_results_are_fetched_a_page_at_a_time(qapp, monkeypatch):
+    monkeypatch.setattr(voc_editor, "RESULT_PAGE", 50)
+    model = make_model(qapp, 120)
+    assert model.rowCount() == 50 and model.total() == 120
+    assert model.canFetchMore()
+    model.fetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 120 and not model.canFetchMore()
+
+
+def test_results_sort_on_a_worker(qapp):
+    model = make_model(qapp, 30)
+    rows = model._rows
+    model.sort_by("size")
+    while model._sorting:
+        qapp.processEvents()
+    sizes = [model.data(model.index(n), voc_editor.SIZE_ROLE) for n in range(model.rowCount())]
+    assert sizes == sorted(sizes, reverse=True)
+    # the rows the view was drawing were never touched
+    assert [row[0] for row in rows] == [f"/r/{n:04d}.voc" for n in range(30)]
+    assert all(model._row_of[model._rows[n][0]] == n for n in range(30))
+    model.sort_by("name")
+    while model._sorting:
+        qapp.processEvents()
+    assert model.data(model.index(0), voc_editor.Qt.UserRole) == "/r/0000.voc"
+
+
+class Emitted:
+    """Stands in for a signal; keeps what was emitted."""
+    def __init__(self):
+        self.calls = []
+
+    def emit(self, *args):
+        self.calls.append(args)
+
+
+def test_sort_fills_in_copies_of_the_rows(tmp_path):
+    path = str(tmp_path / "a.voc")
+    write_voc_container(path, "<p>x</p>", {"summary": {"title": "alpha"}}, {})
+    rows = [[path, None, None, 0]]
+    signal = Emitted()
+    voc_editor._sort_results_job(1, rows, "modified", signal)
+    assert rows == [[path, None, None, 0]]
+    [(generation, (sorted_rows, row_of))] = signal.calls
+    assert sorted_rows[0][1]["title"] == "alpha"
+    assert row_of == {path: 0}
+
+
+def write_v1(path, html):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"content": html, "meta": {}}, f)
+    return str(path)
+
+
+BODY = "".join(f"<p>paragraph {n}</p>" for n in range(200))
+
+
+@pytest.mark.parametrize("size", [100_000, 256])
+def test_preview_of_a_v1_file(tmp_path, size):
+    path = write_v1(tmp_path / "old.voc", f"<html><body>{BODY}</body></html>")
+    html, store, journal, cost = read_voc_preview(path, blocks=5, size=size)
+    assert "paragraph 4" in html and "paragraph 5" not in html
+    assert journal == [] and cost > 0
+
+
+def test_preview_of_a_v2_file_applies_its_journal(tmp_path):
+    path = str(tmp_path / "new.voc")
+    write_voc_container(path, f"<html><body>{BODY}</body></html>", {}, {}, "zlib")
+    voc_editor.append_voc_journal(path, {"start": 1, "removed": 1, "html": "<p>edited</p>"}, {}, "zlib")
+    html, _store, journal, _cost = read_voc_preview(path, blocks=5, size=300)
+    assert "paragraph 0" in html and "paragraph 199" not in html
+    assert journal == [{"start": 1, "removed": 1, "html": journal[0]["html"]}]
+    assert "edited" in journal[0]["html"]
+
+
+def test_preview_of_a_corrupt_file(tmp_path):
+    path = tmp_path / "bad.voc"
+    path.write_bytes(voc_editor.VOC_MAGIC + b"\xff" * 40)
+    with pytest.raises(Exception):
+        read_voc_preview(str(path))
+    signal = Emitted()
+    voc_editor.preview_voc_job(1, (str(path), 0, 0), lambda: False, signal)
+    assert signal.calls == [(1, (str(path), 0, 0), None)]
+
+
+def test_preview_pane_shows_files(qapp, tmp_path):
+    v1 = write_v1(tmp_path / "old.voc", BODY)
+    v2 = str(tmp_path / "new.voc")
+    write_voc_container(v2, BODY.replace("paragraph", "line"), {}, {}, "bz2")
+    voc_editor.append_voc_journal(v2, {"start": 0, "removed": 1, "html": "<p>first line</p>"}, {}, "bz2")
+    bad = tmp_path / "bad.voc"
+    bad.write_bytes(b"{not json")
+    pool = ThreadPoolExecutor(max_workers=1)
+    pane = PreviewPane(pool)
+
+    def show(path, summary=""):
+        pane.show_file(path, summary)
+        pool.submit(lambda: None).result()
+        qapp.processEvents()
+        return pane.toPlainText()
+
+    assert show(v1).startswith("paragraph 0\nparagraph 1")
+    assert show(v2).startswith("first line\nline 1")
+    # unreadable: the summary stays
+    assert show(str(bad), "a summary") == "a summary"
+    # back to one already read: from the cache, at once
+    pane.show_file(v1)
+    assert pane.toPlainText().startswith("paragraph 0")
+    pool.shutdown()
@@ -0,0 +1,79 @@
+import pytest
+
+from voc_editor import FIND_CHUNK_BLOCKS, FindBar, VocTextEdit, find_pattern
+
+
+@pytest.fixture
+def bar(qapp):
+    editor = VocTextEdit()
+    bar = FindBar(editor)
+    yield bar
+    bar.close()
+    editor.close()
+
+
+def search(bar, text, replacement="", regex=False, case=False, words=False):
+    bar.regex_check.setChecked(regex)
+    bar.case_check.setChecked(case)
+    bar.words_check.setChecked(words)
+    bar.replace_input.setText(replacement)
+    bar.find_input.setText(text)
+    bar.open_bar()
+    while not bar.matches.done():
+        bar.matches._step()
+
+
+def test_find_pattern_options():
+    assert find_pattern("") is None
+    assert find_pattern("a.b").search("axb") is None
+    assert find_pattern("a.b", regex=True).search("axb")
+    assert find_pattern("Cat").search("cat")
+    assert find_pattern("Cat", case=True).search("cat") is None
+    assert find_pattern("cat", words=True).search("concat") is None
+
+
+def test_matches_are_counted_across_chunks(bar):
+    bar.editor.setPlainText("\n".join(["one cat", "no"] * FIND_CHUNK_BLOCKS))
+    search(bar, "cat")
+    assert bar.matches.count == FIND_CHUNK_BLOCKS
+    assert bar.matches.chunk_count() == 2
+    position, length = bar.matches.next_match(0)
+    assert (position, length) == (4, 3)
+    assert bar.matches.next_match(position, backward=True) == bar.matches.next_match(
+        bar.editor.document().characterCount(), backward=True)
+
+
+def test_replace_goes_to_the_next_match(bar):
+    bar.editor.setPlainText("cat dog cat")
+    search(bar, "cat", "cow")
+    bar.find_next()
+    bar.replace()
+    assert bar.editor.toPlainText() == "cow dog cat"
+    assert bar.editor.textCursor().selectedText() == "cat"
+
+
+def test_regex_replace_expands_groups(bar):
+    bar.editor.setPlainText("2024-01 and 2025-12")
+    search(bar, r"(\d+)-(\d+)", r"\2/\1", regex=True)
+    bar.replace_all()
+    assert bar.editor.toPlainText() == "01/2024 and 12/2025"
+    bar.editor.document().undo()
+    assert bar.editor.toPlainText() == "2024-01 and 2025-12"
+
+
+def test_replace_with_a_lookahead_past_the_paragraph(bar):
+    bar.editor.setPlainText("ab\ncd\nab")
+    search(bar, r"b(?=\nc)", "X", regex=True)
+    assert bar.matches.count == 1
+    bar.find_next()
+    bar.replace()
+    assert bar.editor.toPlainText() == "aX\ncd\nab"
+
+
+def test_bad_replacement_template_is_reported(bar):
+    bar.editor.setPlainText("abc")
+    search(bar, "b", r"\9", regex=True)
+    bar.find_next()
+    bar.replace()
+    assert bar.editor.toPlainText() == "abc"
+    assert bar.count_label.text() == bar.trans["find_bad_pattern"]
@@ -0,0 +1,95 @@
+import itertools
+
+import pytest
+from PyQt5.QtGui import QTextCursor, QTextDocument, QTextFrameFormat, QTextTableFormat
+
+from bench_editor import _bench_paragraphs, _bench_styled_window, _discard_window
+from voc_editor import serialize_document
+
+
+def round_trip_diff(document):
+    """First line where setHtml(serialize_document()) and setHtml(toHtml()) disagree, or None."""
+    rebuilt = []
+    for html in (document.toHtml(), serialize_document(document)):
+        doc = QTextDocument()
+        doc.setDefaultFont(document.defaultFont())
+        doc.setHtml(html)
+        # the font toHtml() puts on <body> comes back as an empty style on each list item
+        rebuilt.append(doc.toHtml().replace(' style=""', "").splitlines())
+    for expected, got in itertools.zip_longest(*rebuilt, fillvalue=""):
+        if expected != got:
+            return f"expected {expected!r}\n     got {got!r}"
+    return None
+
+
+def document(html):
+    doc = QTextDocument()
+    doc.setHtml(html)
+    return doc
+
+
+DOCUMENTS = {
+    "paragraphs": _bench_paragraphs(200),
+    "mixed report": "".join(f"<h2>Section {i}</h2>" + _bench_paragraphs(12, seed=i) +
+                            "<table border=\"1\">" + "<tr><td>cell</td><td>1.5</td><td>x</td></tr>" * 6 + "</table>"
+                            "<ul><li>one</li><li><b>two</b></li></ul><pre>code  block</pre>"
+                            for i in range(10)),
+    "nested lists": "<ul><li>a</li><ul><li>b</li><li>c</li></ul><li>d</li></ul><p>after</p>"
+                    "<ol><li>x</li><ol type=\"a\"><li>y</li><ul><li>z</li></ul></ol><li>w</li></ol>",
+    "nested tables": "<table border=\"1\"><tr><td>outer<table border=\"1\"><tr><td>inner</td><td>2</td></tr></table>"
+                     "tail</td><td>o2</td></tr></table>",
+    "list in a cell": "<table><tr><td><ul><li>a</li><ul><li>b</li></ul></ul></td></tr></table>",
+    "horizontal rules": "<p>before</p><hr /><p>after</p><hr width=\"50%\" />",
+    "anchors": "<p><a name=\"top\"></a>Hello <a name=\"x\">named</a> and <a href=\"#top\" name=\"y\">link</a></p>",
+    "table formats": "<table border=\"2\" bgcolor=\"#ffff00\" style=\"border-color:#ff0000; border-style:dashed; "
+                     "float:right; border-collapse:collapse\"><thead><tr><td width=\"30%\">h</td><td>h2</td></tr>"
+                     "</thead><tr><td>a</td><td>b</td></tr></table>",
+    "block formats": "<p dir=\"rtl\" style=\"page-break-before:always\">rtl</p>"
+                     "<p style=\"line-height:20; -qt-line-height-type: fixed\">fixed</p>"
+                     "<p><span style=\"font-variant:small-caps\">caps</span> <span style=\"font-family:'A','B'\">"
+                     "families</span></p>",
+}
+
+
+@pytest.mark.parametrize("html", list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+def test_round_trip(qapp, html):
+    assert round_trip_diff(document(html)) is None
+
+
+def test_editor_styles_round_trip(qapp):
+    window = _bench_styled_window()
+    try:
+        assert round_trip_diff(window.editor.document()) is None
+    finally:
+        _discard_window(window)
+
+
+def test_smaller_than_to_html(qapp):
+    doc = document(DOCUMENTS["mixed report"])
+    assert len(serialize_document(doc)) < len(doc.toHtml())
+
+
+def test_anchor_names_kept(qapp):
+    doc = document(DOCUMENTS["anchors"])
+    html = serialize_document(doc)
+    assert all(f'<a name="{name}"></a>' in html for name in ("top", "x", "y"))
+
+
+def test_unsupported_construct_falls_back_to_to_html(qapp):
+    doc = QTextDocument()
+    cursor = QTextCursor(doc)
+    cursor.insertText("before")
+    frame_format = QTextFrameFormat()
+    frame_format.setBorder(1)
+    cursor.insertFrame(frame_format).firstCursorPosition().insertText("framed")
+    assert serialize_document(doc) == doc.toHtml()
+
+    doc = QTextDocument()
+    table_format = QTextTableFormat()
+    table_format.setBorder(1)
+    table = QTextCursor(doc).insertTable(1, 2, table_format)
+    cell = table.cellAt(0, 1)
+    cell_format = cell.format().toTableCellFormat()
+    cell_format.setPadding(7)
+    cell.setFormat(cell_format)
+    assert serialize_document(doc) == doc.toHtml()
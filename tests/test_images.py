@@ -0,0 +1,231 @@
+import io
+import os
+import struct
+
+import pytest
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QMimeData, QUrl
+from PyQt5.QtGui import QColor, QImage, QPixmap, QTextDocument
+
+import voc_editor
+from voc_editor import (FileImageCache, PixmapCache, VocDocument, VocImageStore, VocTextEdit, image_data_size,
+                        ingest_image, ingest_image_data, probe_image_size)
+
+
+def encoded(width, height, fmt="PNG", color="red"):
+    if fmt == "GIF":
+        # Qt reads GIF but cannot write it; the header is all these tests look at
+        return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00\x00\x00;"
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(color))
+    buf = QBuffer()
+    buf.open(QIODevice.WriteOnly)
+    image.save(buf, fmt)
+    return bytes(buf.data())
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_file_cache_evicts_the_least_recently_used(tmp_path):
+    paths = [write(tmp_path / f"{n}.bin", bytes([n]) * 100) for n in range(3)]
+    cache = FileImageCache(budget=250)
+    cache.read(paths[0])
+    cache.read(paths[1])
+    cache.read(paths[0])
+    cache.read(paths[2])
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 2, "bytes": 200}
+    cache.read(paths[0])
+    cache.read(paths[1])
+    assert cache.stats()["hits"] == 2
+
+
+def test_file_cache_rereads_a_changed_file(tmp_path):
+    path = write(tmp_path / "a.png", encoded(4, 4))
+    cache = FileImageCache()
+    key, _data = cache.key(path)
+    uri = cache.data_uri(path)
+    assert uri.startswith("data:image/png;base64,")
+    assert cache.stats()["misses"] == 1
+    write(path, encoded(4, 4, color="blue") + b"more")
+    new_key, data = cache.key(path)
+    assert new_key != key and data.endswith(b"more")
+    assert cache.stats()["misses"] == 2
+    # same size, new mtime
+    write(path, data[::-1])
+    os.utime(path, ns=(0, 0))
+    assert cache.read(path) == data[::-1]
+
+
+def test_file_cache_does_not_keep_files_over_budget(tmp_path):
+    path = write(tmp_path / "big.bin", b"x" * 1000)
+    cache = FileImageCache(budget=100)
+    assert cache.read(path) == b"x" * 1000
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("fmt, mime", [("PNG", "image/png"), ("JPEG", "image/jpeg"), ("GIF", "image/gif"),
+                                       ("BMP", "image/bmp")])
+def test_mime_is_sniffed_from_the_data(tmp_path, fmt, mime):
+    # the extension is wrong on purpose
+    path = write(tmp_path / "image.dat", encoded(3, 3, fmt))
+    assert voc_editor._detect_image_mime(path) == mime
+
+
+def test_mime_falls_back_to_the_extension(tmp_path):
+    assert voc_editor._detect_image_mime(write(tmp_path / "x.jpeg", b"????")) == "image/jpeg"
+    assert voc_editor._detect_image_mime(write(tmp_path / "x.dat", b"????")) == "application/octet-stream"
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "JPEG", "GIF", "BMP"])
+def test_sizes_come_from_the_header(tmp_path, fmt):
+    data = encoded(123, 45, fmt)
+    assert voc_editor._header_image_size(io.BytesIO(data)) == (123, 45)
+    assert image_data_size(data) == (123, 45)
+    assert probe_image_size(write(tmp_path / "image", data)) == (123, 45)
+
+
+def test_unknown_headers_ask_qt(tmp_path):
+    assert probe_image_size(write(tmp_path / "x.xpm", _xpm(7, 5))) == (7, 5)
+    assert probe_image_size(write(tmp_path / "x.png", b"not an image")) is None
+
+
+def _xpm(width, height):
+    rows = "".join(f'"{"." * width}",\n' for _ in range(height))
+    return f'/* XPM */\nstatic char *x[] = {{\n"{width} {height} 1 1",\n". c #ff0000",\n{rows}}};\n'.encode()
+
+
+def test_large_images_are_downscaled_on_insert():
+    store = VocImageStore()
+    original = encoded(2400, 1200, "JPEG")
+    src, width, height = ingest_image_data(original, store, quality="standard", keep_original=True)
+    assert (width, height) == (600, 300)
+    key, original_key = voc_editor._voc_image_keys(src)
+    assert image_data_size(store.get(key)) == (600, 300)
+    assert store.get(original_key) == original
+    src, _w, _h = ingest_image_data(original, store, quality="high")
+    assert image_data_size(store.get(voc_editor._voc_image_keys(src)[0])) == (1200, 600)
+
+
+def test_pixel_budget_caps_resampled_images(monkeypatch):
+    monkeypatch.setattr(voc_editor, "IMAGE_PIXEL_BUDGET", 10_000)
+    store = VocImageStore()
+    src, _w, _h = ingest_image_data(encoded(400, 400, "JPEG"), store, quality="high")
+    w, h = image_data_size(store.get(voc_editor._voc_image_keys(src)[0]))
+    assert w * h <= 10_000
+    original = encoded(400, 400, "JPEG")
+    src, _w, _h = ingest_image_data(original, store, quality="original")
+    assert store.get(voc_editor._voc_image_keys(src)[0]) == original
+
+
+def test_small_images_are_stored_untouched(tmp_path):
+    store = VocImageStore()
+    original = encoded(50, 40)
+    src, width, height = ingest_image(write(tmp_path / "a.png", original), store)
+    assert (width, height) == (None, None)
+    assert store.get(voc_editor._voc_image_keys(src)[0]) == original
+    assert ingest_image(write(tmp_path / "b.png", b"not an image"), store) is None
+
+
+def test_pixmap_cache_stays_within_budget(qapp):
+    pixmaps = [QPixmap(10, 10) for _ in range(4)]
+    cost = PixmapCache.cost(pixmaps[0])
+    cache = PixmapCache(budget=cost * 2)
+    cache.put("a", pixmaps[0])
+    cache.put("b", pixmaps[1])
+    assert cache.get("a") is pixmaps[0]
+    cache.put("c", pixmaps[2])
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.size == cost * 2
+    # one that does not fit on its own is still kept
+    cache.put("big", QPixmap(100, 100))
+    assert len(cache) == 1 and "big" in cache
+
+
+def wait_decoded(qapp, doc):
+    while doc.decoding():
+        qapp.processEvents()
+
+
+def test_images_are_decoded_when_first_needed(qapp, monkeypatch):
+    decoded = []
+    monkeypatch.setattr(VocDocument, "_decode", lambda self, entry, data: decoded.append(entry))
+    doc = VocDocument()
+    key = doc.image_store.add(encoded(30, 20))
+    url = QUrl(f"voc-img:{key}")
+    doc.setHtml(f'<p><img src="voc-img:{key}" /></p>')
+    assert decoded == []
+    placeholder = doc.loadResource(QTextDocument.ImageResource, url)
+    assert (placeholder.width(), placeholder.height()) == (30, 20)
+    assert decoded == [(key, None)]
+    # only once while it is pending
+    doc.loadResource(QTextDocument.ImageResource, url)
+    assert decoded == [(key, None)]
+
+
+def test_decoded_images_replace_the_placeholder(qapp):
+    doc = VocDocument()
+    key = doc.image_store.add(encoded(30, 20, color="blue"))
+    assert doc.image(key, (15, 10)) is None
+    wait_decoded(qapp, doc)
+    pixmap = doc.image(key, (15, 10))
+    assert (pixmap.width(), pixmap.height()) == (15, 10)
+    assert pixmap.toImage().pixelColor(5, 5) == QColor("blue")
+    assert doc.image("missing") is None and not doc.decoding()
+    assert doc.loadResource(QTextDocument.ImageResource, QUrl("voc-img:missing")) is None
+
+
+def test_image_handler_sizes_voc_images_from_their_header(qapp):
+    edit = VocTextEdit()
+    doc = edit.document()
+    key = doc.image_store.add(encoded(80, 40))
+    edit.setHtml(f'<p><img src="voc-img:{key}" width="40" /><img src="voc-img:{key}" /></p>')
+    formats = [fragment.charFormat() for fragment in _fragments(doc)]
+    sizes = [edit.image_handler.intrinsicSize(doc, 0, fmt) for fmt in formats]
+    assert [(s.width(), s.height()) for s in sizes] == [(40, 20), (80, 40)]
+    assert not doc.decoding()
+
+
+def _fragments(doc):
+    it = doc.firstBlock().begin()
+    while not it.atEnd():
+        if it.fragment().charFormat().isImageFormat():
+            yield it.fragment()
+        it += 1
+
+
+def test_pasted_image_goes_into_the_store(qapp):
+    edit = VocTextEdit()
+    data = encoded(20, 10)
+    source = QMimeData()
+    source.setData("image/png", QByteArray(data))
+    source.setImageData(QImage.fromData(data))
+    assert edit.canInsertFromMimeData(source)
+    edit.insertFromMimeData(source)
+    name = voc_editor.first_image_name(edit.document())
+    assert name.startswith("voc-img:")
+    assert edit.image_store.get(voc_editor._voc_image_keys(name)[0]) == data
+    assert "data:" not in edit.toHtml()
+
+
+def test_pasted_html_images_are_externalized(qapp):
+    edit = VocTextEdit()
+    data = encoded(20, 10)
+    source = QMimeData()
+    source.setHtml('<p>caption <img src="data:image/png;base64,' + voc_editor.base64.b64encode(data).decode() + '" /></p>')
+    edit.insertFromMimeData(source)
+    assert "caption" in edit.toPlainText()
+    assert "data:" not in edit.toHtml()
+    assert edit.image_store.held_bytes() == len(data)
+
+
+def test_dropped_image_files_go_into_the_store(qapp, tmp_path):
+    edit = VocTextEdit()
+    paths = [write(tmp_path / f"{n}.png", encoded(10 + n, 10)) for n in range(2)]
+    source = QMimeData()
+    source.setUrls([QUrl.fromLocalFile(path) for path in paths])
+    edit.insertFromMimeData(source)
+    assert edit.toPlainText() == "\ufffc\ufffc"
+    assert edit.image_store.held_bytes() == sum(os.path.getsize(path) for path in paths)
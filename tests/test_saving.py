@@ -0,0 +1,183 @@
+import threading
+
+from PyQt5.QtGui import QColor, QImage, QTextCursor, QTextListFormat
+
+import voc_editor
+from voc_editor import VocContainer
+
+
+def reopen(window, path, settle):
+    window._load_voc_file(path)
+    settle(window)
+    return window.editor.document()
+
+
+def type_paragraphs(window, count):
+    cursor = window.editor.textCursor()
+    for n in range(count):
+        cursor.insertText(f"paragraph {n}\n")
+
+
+def test_undo_brings_back_an_image_deleted_before_a_full_save(window, settle, tmp_path):
+    image = QImage(40, 30, QImage.Format_RGB32)
+    image.fill(QColor("red"))
+    image.save(str(tmp_path / "a.png"))
+    path = str(tmp_path / "doc.voc")
+    window.act_incremental_save.setChecked(False)
+    cursor = window.editor.textCursor()
+    cursor.insertText("hello ")
+    window._insert_ingested(cursor, voc_editor.ingest_image(str(tmp_path / "a.png"), window.editor.image_store))
+    window._write_voc_file(path)
+    settle(window)
+    doc = reopen(window, path, settle)
+    key = voc_editor._voc_image_keys(voc_editor.first_image_name(doc))[0]
+
+    cursor = QTextCursor(doc)
+    cursor.movePosition(QTextCursor.End)
+    cursor.deletePreviousChar()
+    window._write_voc_file(path)
+    settle(window)
+    assert key not in VocContainer(path).image_keys()
+    doc.undo()
+    window._write_voc_file(path)
+    settle(window)
+    assert key in VocContainer(path).image_keys()
+
+
+def test_journal_save_of_a_list_edit_reopens_the_same(window, settle, tmp_path):
+    path = str(tmp_path / "doc.voc")
+    type_paragraphs(window, 100)
+    cursor = window.editor.textCursor()
+    cursor.insertText("intro\n")
+    cursor.insertList(QTextListFormat.ListDisc)
+    for n, item in enumerate(("one", "two", "three")):
+        if n:
+            cursor.insertBlock()
+        cursor.insertText(item)
+    window._write_voc_file(path)
+    settle(window)
+    doc = window.editor.document()
+
+    cursor = QTextCursor(doc.findBlockByNumber(102))
+    cursor.movePosition(QTextCursor.EndOfBlock)
+    cursor.insertText(" more")
+    window._write_voc_file(path)
+    settle(window)
+    assert len(VocContainer(path).journal()) == 1
+    edited = doc.toHtml()
+    assert 'style=""' not in edited
+    assert reopen(window, path, settle).toHtml() == edited
+
+
+def test_failed_journal_save_makes_the_next_save_full(window, settle, tmp_path, monkeypatch):
+    path = str(tmp_path / "doc.voc")
+    type_paragraphs(window, 300)
+    window._write_voc_file(path)
+    settle(window)
+    doc = window.editor.document()
+
+    def disk_full(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(voc_editor, "append_journal_job", disk_full)
+    QTextCursor(doc.findBlockByNumber(3)).insertText("first ")
+    window._write_voc_file(path)
+    settle(window)
+    assert window.warnings and not window.change_tracker.valid
+    monkeypatch.undo()
+
+    QTextCursor(doc.findBlockByNumber(20)).insertText("second ")
+    window._write_voc_file(path)
+    settle(window)
+    assert VocContainer(path).journal() == []
+    assert reopen(window, path, settle).toPlainText().count("first ") == 1
+
+
+def test_edits_made_while_a_save_is_queued_are_saved_next(window, settle, tmp_path):
+    path = str(tmp_path / "doc.voc")
+    type_paragraphs(window, 300)
+    window._write_voc_file(path)
+    settle(window)
+    doc = window.editor.document()
+
+    gate = threading.Event()
+    window._save_pool.submit(gate.wait)
+    QTextCursor(doc.findBlockByNumber(5)).insertText("queued ")
+    window._write_voc_file(path)
+    # no second journal entry while that one is still in flight
+    assert window.change_tracker.saving
+    assert not window._can_append_journal(path)
+    QTextCursor(doc.findBlockByNumber(30)).insertText("later ")
+    gate.set()
+    settle(window)
+    assert window.change_tracker.dirty
+
+    window._write_voc_file(path)
+    settle(window)
+    assert len(VocContainer(path).journal()) == 2
+    text = doc.toPlainText()
+    assert reopen(window, path, settle).toPlainText() == text
+
+
+def test_save_job_returns_the_keys_written(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    store = voc_editor.VocImageStore()
+    key = store.add(b"\x89PNG\r\n\x1a\nimage")
+    html = f'<p>hi <img src="voc-img:{key}" /></p>'
+    assert voc_editor.save_voc_job(path, html, {}, store, "zlib", ("hi", None)) == [key]
+    container = VocContainer(path)
+    assert container.meta()["summary"]["title"] == "hi"
+    assert container.image(key) == b"\x89PNG\r\n\x1a\nimage"
+
+
+def test_progressive_load_matches_a_synchronous_load(window, qapp, monkeypatch):
+    monkeypatch.setattr(voc_editor, "LOAD_BATCH_BLOCKS", 20)
+    monkeypatch.setattr(voc_editor, "LOAD_SLICE_MS", 1)
+    html = voc_editor.serialize_document(_long_document(qapp))
+    sync = voc_editor.QTextDocument()
+    sync.setHtml(html)
+
+    window.editor.setHtml("")
+    loader = voc_editor.ProgressiveLoader(window.editor, html)
+    loader.start()
+    assert window.editor.isReadOnly()
+    assert window.editor.document().blockCount() < sync.blockCount()
+    batches = 0
+    while loader.active:
+        qapp.processEvents()
+        batches += 1
+    assert batches > 2
+    assert not window.editor.isReadOnly()
+    assert window.editor.document().toHtml() == sync.toHtml()
+
+
+def test_cancelled_load_stops_appending(window, qapp, monkeypatch):
+    monkeypatch.setattr(voc_editor, "LOAD_BATCH_BLOCKS", 20)
+    monkeypatch.setattr(voc_editor, "LOAD_SLICE_MS", 1)
+    html = voc_editor.serialize_document(_long_document(qapp))
+    loader = voc_editor.ProgressiveLoader(window.editor, html)
+    loader.start()
+    qapp.processEvents()
+    loader.cancel()
+    blocks = window.editor.document().blockCount()
+    for _ in range(20):
+        qapp.processEvents()
+    assert not loader.active
+    assert not window.editor.isReadOnly()
+    assert window.editor.document().blockCount() == blocks
+
+
+def _long_document(qapp):
+    doc = voc_editor.QTextDocument()
+    cursor = QTextCursor(doc)
+    for n in range(1500):
+        cursor.insertText(f"line {n}")
+        cursor.insertBlock()
+        if n % 300 == 0:
+            cursor.insertTable(2, 2)
+            cursor.movePosition(QTextCursor.End)
+        if n % 400 == 0:
+            cursor.insertList(QTextListFormat.ListDecimal)
+            cursor.insertText("item")
+            cursor.insertBlock(voc_editor.QTextBlockFormat())
+    return doc
@@ -0,0 +1,166 @@
+import json
+import os
+import stat
+
+import pytest
+
+import voc_editor
+from voc_editor import (VOC_CODECS, VocContainer, VocImageStore, append_voc_journal, atomic_write,
+                        read_voc_file, read_voc_header, rewrite_voc_meta, write_voc_container)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+HTML = "<p>hello</p>" * 50
+
+
+def test_container_round_trip(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {"saved_by": "test"}, {"k1": PNG, "k2": b"gif"})
+    container = VocContainer(path)
+    assert container.body() == HTML
+    assert container.meta() == {"saved_by": "test"}
+    assert sorted(container.image_keys()) == ["k1", "k2"]
+    assert container.image("k1") == PNG
+    assert container.image("missing") is None
+    html, meta, container = read_voc_file(path)
+    assert (html, meta) == (HTML, {"saved_by": "test"})
+    assert container.image("k2") == b"gif"
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {"k1": PNG})
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+    container = VocContainer(path)
+    assert container.body() == HTML
+    assert container.image_keys() == []
+
+
+def test_identical_images_are_stored_once(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    src = "data:image/png;base64," + voc_editor.base64.b64encode(PNG).decode("ascii")
+    store = VocImageStore()
+    html, keys = voc_editor._externalize_images(f'<p><img src="{src}" /><img src="{src}" /></p>' * 3, store)
+    assert len(keys) == 1
+    assert html.count(f"voc-img:{keys[0]}") == 6
+    write_voc_container(path, html, {}, voc_editor._collect_images(keys, store))
+    assert VocContainer(path).chunk_lengths(b"IMAG") == [2 + len(keys[0]) + len(PNG)]
+
+
+def test_store_does_not_copy_blobs_already_in_the_file(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    key = VocImageStore().add(PNG)
+    write_voc_container(path, "", {}, {key: PNG})
+    store = VocImageStore(VocContainer(path))
+    assert store.add(PNG) == key
+    assert store.held_bytes() == 0
+    assert store.get(key) == PNG
+
+
+def test_v1_files_still_load(tmp_path):
+    path = str(tmp_path / "old.voc")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"content": HTML, "meta": {"saved_by": "v1"}}, f)
+    assert read_voc_file(path) == (HTML, {"saved_by": "v1"}, None)
+
+
+def test_journal_entries_are_read_in_order(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {}, "zlib")
+    for n in range(3):
+        append_voc_journal(path, {"start": 0, "removed": 1, "html": f"<p>{n}</p>"}, {}, "zlib")
+    assert [entry["html"] for entry in VocContainer(path).journal()] == ["<p>0</p>", "<p>1</p>", "<p>2</p>"]
+
+
+@pytest.mark.parametrize("cut", [3, 20])
+def test_append_after_a_torn_journal_entry(tmp_path, cut):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {}, "zlib")
+    entry = {"start": 0, "removed": 1, "html": "<p>one</p>"}
+    append_voc_journal(path, entry, {}, "zlib")
+    append_voc_journal(path, dict(entry, html="<p>two</p>"), {}, "zlib")
+    # a crash partway through the second append
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - cut)
+    container = VocContainer(path)
+    append_voc_journal(path, dict(entry, html="<p>three</p>"), {}, "zlib", end=container.end)
+    assert [entry["html"] for entry in VocContainer(path).journal()] == ["<p>one</p>", "<p>three</p>"]
+
+
+def test_failed_atomic_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {})
+
+    def disk_full(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "fsync", disk_full)
+    with pytest.raises(OSError, match="disk full"):
+        atomic_write(path, [b"new contents"])
+    assert VocContainer(path).body() == HTML
+    assert os.listdir(tmp_path) == ["doc.voc"]
+
+
+def test_atomic_write_keeps_the_file_mode(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o666 & ~voc_editor._UMASK
+    os.chmod(path, 0o640)
+    write_voc_container(path, "<p>again</p>", {}, {})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+@pytest.mark.parametrize("codec", [name for name, _c, _d in VOC_CODECS.values()])
+def test_codecs_round_trip_body_and_journal(tmp_path, codec):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {"k1": PNG}, codec)
+    append_voc_journal(path, {"start": 0, "removed": 1, "html": "<p>edit</p>"}, {"k2": PNG}, codec)
+    container = VocContainer(path)
+    assert container.codec == codec
+    assert container.body() == HTML
+    assert container.body_head(20) == HTML[:20]
+    assert container.journal() == [{"start": 0, "removed": 1, "html": "<p>edit</p>"}]
+    # images are stored as they are, whatever the codec
+    assert container.image("k2") == PNG
+
+
+def test_unknown_codec_id_is_rejected(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {}, {})
+    with open(path, "r+b") as f:
+        f.write(voc_editor._VOC_HEADER.pack(voc_editor.VOC_MAGIC, voc_editor.VOC_VERSION, 99))
+    with pytest.raises(ValueError, match="codec 99"):
+        VocContainer(path)
+
+
+def test_header_is_read_without_the_body(tmp_path, monkeypatch):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {"summary": {"title": "hello"}}, {}, "zlib")
+
+    def no_body(*args):
+        raise AssertionError("BODY decoded")
+
+    monkeypatch.setitem(VOC_CODECS, 1, ("zlib", no_body, no_body))
+    monkeypatch.setattr(VocContainer, "_index", no_body)
+    assert read_voc_header(path) == {"summary": {"title": "hello"}}
+
+
+def test_meta_is_rewritten_in_place(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {"summary": {"title": "old"}}, {})
+    size = os.path.getsize(path)
+    assert rewrite_voc_meta(path, {"summary": {"title": "new"}})
+    assert os.path.getsize(path) == size
+    assert read_voc_header(path) == {"summary": {"title": "new"}}
+    assert not rewrite_voc_meta(path, {"summary": {"title": "x" * 5000}})
+
+
+def test_torn_meta_reads_as_empty(tmp_path):
+    path = str(tmp_path / "doc.voc")
+    write_voc_container(path, HTML, {"summary": {"title": "hello"}}, {})
+    # only the start of an in-place META rewrite reached the disk
+    with open(path, "r+b") as f:
+        voc_editor._meta_chunk_length(f)
+        f.write(b'{"summary": [1, 2')
+    assert read_voc_header(path) == {}
+    assert read_voc_file(path)[:2] == (HTML, {})